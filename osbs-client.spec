@@ -163,6 +163,8 @@ ln -s  %{_bindir}/osbs-%{python3_version} %{buildroot}%{_bindir}/osbs-3
 %endif # with_python3
 
 %py2_install
+# asyncio client needs Python 3.6+, build directory may have it from py3 build
+rm -f %{buildroot}%{python2_sitelib}/osbs/aio.py*
 mv %{buildroot}%{_bindir}/osbs %{buildroot}%{_bindir}/osbs-%{python2_version}
 ln -s  %{_bindir}/osbs-%{python2_version} %{buildroot}%{_bindir}/osbs-2
 ln -s  %{_bindir}/osbs-%{binaries_py_version} %{buildroot}%{_bindir}/osbs
@@ -0,0 +1,512 @@
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+asyncio client for OpenShift, so that a single event loop can follow many
+builds without a thread (and a blocking connection) per build
+
+Requires Python 3.6+ and aiohttp (install osbs-client[asyncio]). The osbs
+package does not import this module, and it is not installed for older
+Pythons, so the rest of the client keeps working there.
+"""
+import asyncio
+import json
+import logging
+import ssl
+import time
+from functools import wraps
+
+from six.moves import http_client
+
+from osbs.build.build_response import BuildResponse
+from osbs.constants import (BUILD_FINISHED_STATES, LIST_PAGE_SIZE, WATCH_DELETED,
+                            WATCH_MODIFIED)
+from osbs.core import LogPosition, Openshift, WatchState, check_response
+from osbs.exceptions import (OsbsException, OsbsNetworkException, OsbsResponseException,
+                             OsbsWatchBuildNotFound)
+from osbs.http import HttpResponse
+from osbs.utils import graceful_chain_get
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def async_osbsapi(func):
+    """
+    osbsapi for coroutines, converts unexpected exceptions to OsbsException
+    """
+    @wraps(func)
+    async def catch_exceptions(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except (OsbsException, asyncio.CancelledError):
+            raise
+        except Exception as ex:
+            # Propogate flexmock errors immediately (used in test cases)
+            if getattr(ex, '__module__', None) == 'flexmock':
+                raise
+
+            raise OsbsException(cause=ex) from ex
+
+    return catch_exceptions
+
+
+class AsyncOpenshift(object):
+    """
+    asyncio counterpart of osbs.core.Openshift
+
+    URLs, credentials and TLS settings all come from the Openshift instance
+    given, so both clients talk to the server in the same way. Responses are
+    osbs.http.HttpResponse instances, as for the synchronous client.
+    """
+
+    def __init__(self, openshift, pool_maxsize=None):
+        """
+        :param openshift: Openshift instance
+        :param pool_maxsize: int, maximum number of connections open at once,
+                             default is aiohttp's limit
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for asyncio support")
+
+        self.os = openshift
+        self.pool_maxsize = pool_maxsize
+        # number of times a watch had to be re-established
+        self.watch_reconnects = 0
+        self._session = None
+        self._token_lock = None
+
+    async def close(self):
+        """
+        close pooled connections to the server
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _ssl_context(self, client_cert=None, client_key=None, ca=None):
+        if not self.os.verify_ssl:
+            return False
+
+        context = ssl.create_default_context(cafile=ca)
+        if client_cert:
+            context.load_cert_chain(client_cert, client_key)
+        return context
+
+    def _get_session(self, **ssl_args):
+        if self._session is None:
+            connector_args = {'ssl': self._ssl_context(**ssl_args)}
+            if self.pool_maxsize:
+                connector_args['limit'] = self.pool_maxsize
+            # no overall timeout, watches and logs are streamed for hours
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**connector_args),
+                timeout=aiohttp.ClientTimeout(total=None))
+        return self._session
+
+    async def _ensure_token(self):
+        # Getting the token blocks (and may run kinit), so it is fetched
+        # in an executor, and only once for all requests waiting for it.
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if self.os._token_needs_refresh():
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(None, self.os.ensure_token)
+
+    async def _send(self, method, url, with_auth=True, data=None, headers=None):
+        """
+        :return: aiohttp.ClientResponse, body not read yet
+        """
+        with_token = with_auth and self.os.use_auth
+        response, token = await self._send_once(method, url, with_auth, data, headers)
+        if (with_token and self.os.can_fetch_token() and
+                response.status == http_client.UNAUTHORIZED):
+            # token was revoked or expired sooner than expected, try once more
+            # with new one
+            logger.debug("token rejected, fetching new one")
+            response.release()
+            self.os.invalidate_token(token)
+            response, token = await self._send_once(method, url, with_auth, data, headers)
+        return response
+
+    async def _send_once(self, method, url, with_auth, data, headers):
+        """
+        :return: tuple, aiohttp.ClientResponse and token sent with request
+        """
+        if with_auth and self.os.use_auth and self.os._token_needs_refresh():
+            await self._ensure_token()
+        headers, kwargs = self.os._request_args(with_auth, headers=dict(headers or {}))
+        token = self.os.token
+        session = self._get_session(**kwargs)
+        logger.debug("%s %s", method, url)
+        try:
+            response = await session.request(method, url, data=data, headers=headers)
+        except aiohttp.ClientError as ex:
+            raise OsbsNetworkException(url, str(ex), 0, cause=ex)
+        return response, token
+
+    async def _request(self, method, url, **kwargs):
+        response = await self._send(method, url, **kwargs)
+        try:
+            content = await response.read()
+        except aiohttp.ClientError as ex:
+            raise OsbsNetworkException(url, str(ex), response.status, cause=ex)
+        finally:
+            response.release()
+        return HttpResponse(response.status, response.headers, content)
+
+    @staticmethod
+    async def _check_stream(response):
+        if response.status not in (http_client.OK, http_client.CREATED):
+            content = await response.read()
+            check_response(HttpResponse(response.status, response.headers, content))
+
+    @staticmethod
+    async def _iter_lines(response):
+        """
+        lines of streamed response, ending quietly when the connection is closed
+
+        :param response: aiohttp.ClientResponse
+        :return: async generator of bytes
+        """
+        parts = []
+        try:
+            async for chunk in response.content.iter_any():
+                lines = chunk.split(b'\n')
+                parts.append(lines.pop())
+                if not lines:
+                    continue
+
+                lines[0] = b''.join(parts[:-1]) + lines[0]
+                del parts[:-1]
+                for line in lines:
+                    yield line.rstrip(b'\r')
+        except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError):
+            pass
+
+        rest = b''.join(parts)
+        if rest:
+            yield rest
+
+    async def get_build(self, build_id):
+        url = self.os._build_url("builds/%s/" % build_id)
+        response = await self._request('GET', url)
+        check_response(response)
+        return response
+
+    async def list_builds(self, build_config_id=None, koji_task_id=None,
+                          field_selector=None, labels=None, limit=None,
+                          continue_token=None):
+        """
+        List builds matching criteria, see Openshift.list_builds
+
+        :return: HttpResponse
+        """
+        query = self.os._list_builds_query(build_config_id=build_config_id,
+                                           koji_task_id=koji_task_id,
+                                           field_selector=field_selector, labels=labels)
+        if limit is not None:
+            query['limit'] = limit
+
+        if continue_token is not None:
+            query['continue'] = continue_token
+        return await self._request('GET', self.os._build_url("builds/", **query))
+
+    async def iter_builds(self, build_config_id=None, koji_task_id=None,
+                          field_selector=None, labels=None, page_size=LIST_PAGE_SIZE):
+        """
+        Iterate over builds matching criteria, fetching them in chunks
+
+        :return: async generator of dicts, Build objects
+        """
+        continue_token = None
+        while True:
+            response = await self.list_builds(build_config_id=build_config_id,
+                                              koji_task_id=koji_task_id,
+                                              field_selector=field_selector,
+                                              labels=labels, limit=page_size,
+                                              continue_token=continue_token)
+            check_response(response)
+            page = response.json()
+            for build in page.get('items') or []:
+                yield build
+
+            continue_token = graceful_chain_get(page, 'metadata', 'continue')
+            if not continue_token:
+                break
+
+    async def create_build(self, build_json):
+        url = self.os._build_url("builds/")
+        logger.debug(build_json)
+        return await self._request('POST', url, data=json.dumps(build_json),
+                                   headers={"Content-Type": "application/json"})
+
+    async def cancel_build(self, build_id):
+        response = await self.get_build(build_id)
+        br = BuildResponse(response.json())
+        br.cancelled = True
+        url = self.os._build_url("builds/%s/" % build_id)
+        return await self._request('PUT', url, data=json.dumps(br.json),
+                                   headers={"Content-Type": "application/json"})
+
+    async def _list_resource(self, resource_type, resource_name=None, **request_args):
+        """
+        get current state of watched resource(s)
+
+        :return: tuple, resourceVersion to resume watching from and list of objects
+        """
+        if resource_name is None:
+            url = self.os._build_url("%s/" % resource_type, **request_args)
+        else:
+            url = self.os._build_url("%s/%s/" % (resource_type, resource_name))
+        response = await self._request('GET', url)
+        try:
+            check_response(response, log_level=logging.DEBUG)
+        except OsbsResponseException as ex:
+            if resource_name is None or ex.status_code != http_client.NOT_FOUND:
+                raise
+            return None, []
+
+        obj = response.json()
+        items = obj.get('items', []) if resource_name is None else [obj]
+        return graceful_chain_get(obj, 'metadata', 'resourceVersion'), items
+
+    async def watch_resource(self, resource_type, resource_name=None, deadline=None,
+                             **request_args):
+        """
+        watch resource(s), reconnecting whenever the server closes the stream
+
+        Behaves as Openshift.watch_resource, see WatchState.
+
+        :param resource_type: str, e.g. "builds"
+        :param resource_name: str, watch single resource only
+        :param deadline: float, time (as returned by time.time()) to stop watching at
+        :param request_args: query parameters, e.g. fieldSelector
+        :return: async generator of (changetype, object) tuples
+        """
+        path = Openshift._watch_path(self.os.namespace, resource_type, resource_name)
+        state = WatchState(request_args.pop('resourceVersion', None), deadline=deadline)
+        while True:
+            query = state.connect(request_args)
+            if query is None:
+                return
+            url = self.os._build_url(path, _prepend_namespace=False, **query)
+
+            try:
+                response = await self._send('GET', url, headers={'Connection': 'close'})
+                try:
+                    await self._check_stream(response)
+                    async for line in self._iter_lines(response):
+                        event = Openshift._decode_watch_event(line)
+                        if event is None:
+                            continue
+                        if not state.event(*event):
+                            break
+                        yield event
+                finally:
+                    response.close()
+            except OsbsException as ex:
+                if not state.failed(ex):
+                    raise
+
+            self.watch_reconnects += 1
+            if state.gone:
+                resource_version, items = await self._list_resource(resource_type,
+                                                                    resource_name,
+                                                                    **request_args)
+                state.relisted(resource_version, items)
+                for obj in items:
+                    yield (WATCH_MODIFIED, obj)
+
+            delay = state.reconnect_delay()
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def wait_for_build_to_finish(self, build_id):
+        """
+        :return: dict, Build object once the build is finished
+        """
+        async for changetype, obj in self.watch_resource("builds", build_id):
+            if changetype == WATCH_DELETED:
+                break
+
+            phase = graceful_chain_get(obj, 'status', 'phase')
+            if phase and phase.lower() in BUILD_FINISHED_STATES:
+                return obj
+
+        raise OsbsWatchBuildNotFound("build '%s' was not found and response stream ended" %
+                                     build_id)
+
+    async def stream_logs(self, build_id):
+        """
+        stream logs from build, resuming after idle connections are closed
+
+        :param build_id: str
+        :return: async generator of bytes
+        """
+        # If connection is closed within this many seconds, give up:
+        min_idle_timeout = 60
+
+        position = LogPosition()
+        last_activity = time.time()
+        while True:
+            query = {'follow': 1, 'timestamps': 'true'}
+            since_time = position.since_time()
+            if since_time:
+                query['sinceTime'] = since_time
+            url = self.os._build_url("builds/%s/log/" % build_id, **query)
+            try:
+                response = await self._send('GET', url)
+            except OsbsNetworkException as exc:
+                if not isinstance(exc.cause, aiohttp.ClientConnectionError):
+                    raise
+            else:
+                try:
+                    await self._check_stream(response)
+                    accept = position.line_filter()
+                    async for line in self._iter_lines(response):
+                        line = accept(line)
+                        if line is not None:
+                            last_activity = time.time()
+                            yield line
+                finally:
+                    response.close()
+
+            idle = time.time() - last_activity
+            logger.debug("connection closed after %ds", idle)
+            if idle < min_idle_timeout:
+                # Finish output
+                return
+
+            logger.debug("resuming logs from %s", position.since_time() or "the start")
+
+    async def get_image_stream(self, stream_id):
+        url = self.os._build_url("imagestreams/%s" % stream_id)
+        response = await self._request('GET', url)
+        check_response(response, log_level=logging.DEBUG)
+        return response
+
+    async def create_image_stream(self, stream_json):
+        url = self.os._build_url("imagestreams/")
+        response = await self._request('POST', url, data=stream_json,
+                                       headers={"Content-Type": "application/json"})
+        check_response(response)
+        return response
+
+    async def get_image_stream_tag(self, tag_id):
+        url = self.os._build_url("imagestreamtags/%s" % tag_id)
+        response = await self._request('GET', url)
+        check_response(response, log_level=logging.DEBUG)
+        return response
+
+    async def put_image_stream_tag(self, tag_id, tag):
+        url = self.os._build_url("imagestreamtags/%s" % tag_id)
+        response = await self._request('PUT', url, data=json.dumps(tag),
+                                       headers={"Content-Type": "application/json"})
+        check_response(response)
+        return response
+
+
+class AsyncOSBS(object):
+    """
+    asyncio counterpart of osbs.api.OSBS for calls talking to the server
+
+    Anything not doing network I/O (build requests, configuration) is
+    still done by the OSBS instance given.
+    """
+
+    def __init__(self, osbs):
+        """
+        :param osbs: OSBS instance
+        """
+        self.osbs = osbs
+        self.os = AsyncOpenshift(osbs.os, pool_maxsize=osbs.os_conf.get_http_pool_maxsize())
+
+    async def close(self):
+        await self.os.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @async_osbsapi
+    async def get_build(self, build_id):
+        response = await self.os.get_build(build_id)
+        return BuildResponse(response.json())
+
+    @async_osbsapi
+    async def list_builds(self, field_selector=None, koji_task_id=None, running=None,
+                          labels=None):
+        """
+        List builds with matching fields
+
+        :return: BuildResponse list
+        """
+        field_selector = self.osbs._builds_field_selector(field_selector, running)
+        builds = self.os.iter_builds(field_selector=field_selector,
+                                     koji_task_id=koji_task_id, labels=labels)
+        return [BuildResponse(build) async for build in builds]
+
+    @async_osbsapi
+    async def cancel_build(self, build_id):
+        response = await self.os.cancel_build(build_id)
+        return BuildResponse(response.json())
+
+    async def watch_builds(self, field_selector=None):
+        kwargs = {}
+        if field_selector is not None:
+            kwargs['fieldSelector'] = field_selector
+
+        async for changetype, obj in self.os.watch_resource("builds", **kwargs):
+            yield changetype, obj
+
+    @async_osbsapi
+    async def wait_for_build_to_finish(self, build_id):
+        build_json = await self.os.wait_for_build_to_finish(build_id)
+        return BuildResponse(build_json)
+
+    async def get_build_logs(self, build_id, decode=False):
+        """
+        follow logs from build
+
+        :param build_id: str
+        :param decode: bool, whether or not to decode logs as utf-8
+        :return: async generator of bytes, or str if decode is True
+        """
+        async for line in self.os.stream_logs(build_id):
+            if decode:
+                line = line.decode("utf-8").rstrip()
+            yield line
+
+    @async_osbsapi
+    async def get_image_stream(self, stream_id):
+        return await self.os.get_image_stream(stream_id)
+
+    @async_osbsapi
+    async def create_image_stream(self, name, docker_image_repository,
+                                  insecure_registry=False):
+        stream = self.osbs._get_image_stream_json(name, docker_image_repository,
+                                                  insecure_registry)
+        return await self.os.create_image_stream(json.dumps(stream))
+
+    @async_osbsapi
+    async def get_image_stream_tag(self, tag_id):
+        return await self.os.get_image_stream_tag(tag_id)
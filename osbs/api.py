@@ -7,18 +7,23 @@ of the BSD license. See the LICENSE file for details.
 """
 from __future__ import print_function, unicode_literals, absolute_import
 
-from collections import namedtuple
+from collections import namedtuple, defaultdict
 import json
 import logging
 import os
 import os.path
-import stat
 import sys
+import time
 import warnings
 import getpass
+import heapq
+import itertools
+import re
 from functools import wraps
 from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from types import GeneratorType
+import threading
 
 from osbs.build.build_request import BuildRequest
 from osbs.build.build_response import BuildResponse
@@ -28,13 +33,18 @@ from osbs.constants import (BUILD_RUNNING_STATES, WORKER_OUTER_TEMPLATE,
                             WORKER_INNER_TEMPLATE, WORKER_CUSTOMIZE_CONF,
                             ORCHESTRATOR_OUTER_TEMPLATE, ORCHESTRATOR_INNER_TEMPLATE,
                             ORCHESTRATOR_CUSTOMIZE_CONF, BUILD_TYPE_WORKER,
-                            BUILD_TYPE_ORCHESTRATOR, BUILD_FINISHED_STATES)
-from osbs.core import Openshift
+                            BUILD_TYPE_ORCHESTRATOR, BUILD_FINISHED_STATES,
+                            BATCH_BUILD_WORKERS, RESTORE_CONFLICT_RETRIES,
+                            RESTORE_CONFLICT_BACKOFF, LOGS_READ_AHEAD, LOGS_REORDER_WINDOW,
+                            WATCH_DELETED)
+from osbs.cache import BuildCache
+from osbs.core import LogPosition, Openshift
 from osbs.exceptions import (OsbsException, OsbsValidationException, OsbsResponseException,
                              OsbsOrchestratorNotEnabled)
 # import utils in this way, so that we can mock standalone functions with flexmock
 from osbs import utils
 
+import six
 from six.moves import http_client
 
 
@@ -71,6 +81,81 @@ logger = logging.getLogger(__name__)
 
 LogEntry = namedtuple('LogEntry', ['platform', 'line'])
 
+# time at the start of atomic-reactor log lines, sorts in time order as str
+LOG_TIME_RE = re.compile(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}')
+BatchBuildResult = namedtuple('BatchBuildResult', ['build', 'error'])
+BatchUpdateResult = namedtuple('BatchUpdateResult', ['response', 'error'])
+RestoreResult = namedtuple('RestoreResult', ['succeeded', 'failed'])
+BuildLoad = namedtuple('BuildLoad', ['running', 'pending'])
+LoadSummary = namedtuple('LoadSummary', ['builds', 'quota_headroom', 'pods', 'timestamp'])
+
+
+class RelayedLogPosition(LogPosition):
+    """
+    Position in log of worker build relayed by orchestrator build, so that
+    reading the worker build directly continues after the entries relayed
+
+    The position is given by atomic-reactor time at the start of lines.
+    """
+
+    @staticmethod
+    def split_timestamp(line):
+        """
+        :param line: str, log line without platform
+        :return: tuple, timestamp as (time,) or None, and the line unchanged
+        """
+        match = LOG_TIME_RE.match(line)
+        if not match:
+            return None, line
+        return (match.group(0),), line
+
+
+class _LookupMemo(object):
+    """
+    Results of read-only API lookups shared by builds submitted in one batch
+
+    Concurrent lookups of the same object wait for the first one. Only
+    successful responses and 404 errors are remembered, other failures are
+    retried by the next caller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, func, *args):
+        key = (func.__name__,) + args
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = {'done': threading.Event()}
+                    break
+
+            entry['done'].wait()
+            if 'result' in entry:
+                return entry['result']
+            if 'error' in entry:
+                raise entry['error']
+
+        try:
+            entry['result'] = func(*args)
+        except OsbsResponseException as ex:
+            if ex.status_code != http_client.NOT_FOUND:
+                with self._lock:
+                    del self._entries[key]
+            else:
+                entry['error'] = ex
+            raise
+        except Exception:
+            with self._lock:
+                del self._entries[key]
+            raise
+        finally:
+            entry['done'].set()
+
+        return entry['result']
+
 
 class OSBS(object):
     """
@@ -86,6 +171,9 @@ class OSBS(object):
         """ """
         self.os_conf = openshift_configuration
         self.build_conf = build_configuration
+        token_file = None
+        if self.os_conf.get_persist_token():
+            token_file = utils.get_instance_token_file_name(self.os_conf.conf_section)
         self.os = Openshift(openshift_api_url=self.os_conf.get_openshift_api_uri(),
                             openshift_api_version=self.os_conf.get_openshift_api_version(),
                             openshift_oauth_url=self.os_conf.get_openshift_oauth_api_uri(),
@@ -102,20 +190,84 @@ class OSBS(object):
                             use_auth=self.os_conf.get_use_auth(),
                             verify_ssl=self.os_conf.get_verify_ssl(),
                             token=self.os_conf.get_oauth2_token(),
-                            namespace=self.os_conf.get_namespace())
+                            namespace=self.os_conf.get_namespace(),
+                            http_pool_maxsize=self.os_conf.get_http_pool_maxsize(),
+                            http_keepalive=self.os_conf.get_http_keepalive(),
+                            token_file=token_file)
         self._bm = None
+        # lookup memo of batch being created by current thread
+        self._lookup_local = threading.local()
+        self._git_mirror_cache = None
+        git_cache_dir = self.os_conf.get_git_cache_dir()
+        if git_cache_dir:
+            self._git_mirror_cache = utils.GitMirrorCache(
+                git_cache_dir, max_repos=self.os_conf.get_git_cache_size())
+        self._repo_info_cache = utils.RepoInfoCache(
+            self.os_conf.get_repo_info_cache_dir(),
+            max_entries=self.os_conf.get_repo_info_cache_size())
+        self._load_summary = None
+        self._load_summary_lock = threading.Lock()
+        self._build_cache = None
+        if self.os_conf.get_build_cache():
+            self._build_cache = BuildCache(
+                self.os, resync_period=self.os_conf.get_build_cache_resync_period())
+            self._build_cache.start()
+
+    def _get_build_cache(self):
+        """
+        :return: BuildCache instance if enabled and synced, None otherwise
+        """
+        if self._build_cache is not None and self._build_cache.synced:
+            return self._build_cache
+        return None
 
     @osbsapi
     def list_builds(self, field_selector=None, koji_task_id=None, running=None,
-                    labels=None):
+                    labels=None, max_results=None, summary=False):
         """
         List builds with matching fields
 
         :param field_selector: str, field selector for Builds
         :param koji_task_id: str, only list builds for Koji Task ID
+        :param max_results: int, list at most this many builds, in the order server
+                            returns them (not necessarily the newest)
+        :param summary: bool, leave out logs, Dockerfile and RPM packages of builds
         :return: BuildResponse list
         """
+        return list(self.iter_builds(field_selector=field_selector, koji_task_id=koji_task_id,
+                                     running=running, labels=labels, max_results=max_results,
+                                     summary=summary))
+
+    def iter_builds(self, field_selector=None, koji_task_id=None, running=None,
+                    labels=None, max_results=None, summary=False):
+        """
+        Iterate over builds with matching fields
+
+        Builds are fetched from OpenShift in chunks as the iteration goes, so
+        there's never more than a chunk of them in memory.
+
+        :param field_selector: str, field selector for Builds
+        :param koji_task_id: str, only list builds for Koji Task ID
+        :param max_results: int, stop after this many builds, in the order server
+                            returns them (not necessarily the newest)
+        :param summary: bool, leave out logs, Dockerfile and RPM packages of builds
+        :return: generator of BuildResponse instances
+        """
+        build_cache = self._get_build_cache()
+        if build_cache is not None and field_selector is None:
+            builds = build_cache.list(koji_task_id=koji_task_id, running=running, labels=labels)
+            for build in builds[:max_results]:
+                yield BuildResponse(build)
+            return
+
+        field_selector = self._builds_field_selector(field_selector, running)
+        for build in self.os.iter_builds(field_selector=field_selector,
+                                         koji_task_id=koji_task_id, labels=labels,
+                                         max_results=max_results, summary=summary):
+            yield BuildResponse(build)
 
+    @staticmethod
+    def _builds_field_selector(field_selector=None, running=None):
         if running:
             running_fs = ",".join(["status!={status}".format(status=status.capitalize())
                                   for status in BUILD_FINISHED_STATES])
@@ -123,25 +275,24 @@ class OSBS(object):
                 field_selector = running_fs
             else:
                 field_selector = ','.join([field_selector, running_fs])
-        response = self.os.list_builds(field_selector=field_selector,
-                                       koji_task_id=koji_task_id, labels=labels)
-        serialized_response = response.json()
-        build_list = []
-        for build in serialized_response["items"]:
-            build_list.append(BuildResponse(build))
-
-        return build_list
+        return field_selector
 
-    def watch_builds(self, field_selector=None):
+    def watch_builds(self, field_selector=None, summary=False):
         kwargs = {}
         if field_selector is not None:
             kwargs['fieldSelector'] = field_selector
 
-        for changetype, obj in self.os.watch_resource("builds", **kwargs):
+        for changetype, obj in self.os.watch_resource("builds", summary=summary, **kwargs):
             yield changetype, obj
 
     @osbsapi
     def get_build(self, build_id):
+        build_cache = self._get_build_cache()
+        if build_cache is not None:
+            build = build_cache.get(build_id)
+            if build is not None:
+                return BuildResponse(build)
+
         response = self.os.get_build(build_id)
         build_response = BuildResponse(response.json())
         return build_response
@@ -212,11 +363,18 @@ class OSBS(object):
         build_request.set_openshift_required_version(self.os_conf.get_openshift_required_version())
         build = build_request.render()
         response = self.os.create_build(json.dumps(build))
-        build_response = BuildResponse(response.json())
+        build_json = response.json()
+        if self._build_cache is not None:
+            self._build_cache.update(build_json)
+        build_response = BuildResponse(build_json)
         return build_response
 
     def _get_running_builds_for_build_config(self, build_config_id):
-        all_builds_for_bc = self.os.list_builds(build_config_id=build_config_id).json()['items']
+        build_cache = self._get_build_cache()
+        if build_cache is not None:
+            all_builds_for_bc = build_cache.list(build_config_id=build_config_id)
+        else:
+            all_builds_for_bc = self.os.iter_builds(build_config_id=build_config_id)
         running = []
         for b in all_builds_for_bc:
             br = BuildResponse(b)
@@ -328,7 +486,10 @@ class OSBS(object):
                 raise RuntimeError('Matching build(s) already running: {0}'
                                    .format(', '.join(x.get_build_name() for x in running_builds)))
 
-        return BuildResponse(self.os.create_build(build_json).json())
+        build_json = self.os.create_build(build_json).json()
+        if self._build_cache is not None:
+            self._build_cache.update(build_json)
+        return BuildResponse(build_json)
 
     def _get_image_stream_info_for_build_request(self, build_request):
         """Return ImageStream, and ImageStreamTag name for base_image of build_request
@@ -452,7 +613,9 @@ class OSBS(object):
                               koji_parent_build=None,
                               isolated=None,
                               **kwargs):
-        repo_info = utils.get_repo_info(git_uri, git_ref, git_branch=git_branch)
+        repo_info = utils.get_repo_info(git_uri, git_ref, git_branch=git_branch,
+                                        git_mirror_cache=self._git_mirror_cache,
+                                        repo_info_cache=self._repo_info_cache)
         df_parser = repo_info.dockerfile_parser
         build_request = self.get_build_request(inner_template=inner_template,
                                                outer_template=outer_template,
@@ -708,6 +871,43 @@ class OSBS(object):
 
             raise
 
+    @osbsapi
+    def create_orchestrator_builds(self, builds, workers=BATCH_BUILD_WORKERS):
+        """
+        Create many orchestrator builds concurrently
+
+        Builds are created as by create_orchestrator_build, using a pool of
+        threads. Image streams and image stream tags looked up by more than
+        one build are fetched only once.
+
+        :param builds: list of dicts, keyword arguments for create_orchestrator_build
+        :param workers: int, maximal number of builds being created at once
+        :return: list of BatchBuildResult instances, in the same order as builds;
+                 either build is BuildResponse instance or error is the exception
+                 raised while creating it
+        """
+        memo = _LookupMemo()
+
+        def create(kwargs):
+            self._lookup_local.memo = memo
+            try:
+                return BatchBuildResult(self.create_orchestrator_build(**kwargs), None)
+            except Exception as ex:
+                logger.error("failed to create orchestrator build: %r", ex)
+                return BatchBuildResult(None, ex)
+            finally:
+                self._lookup_local.memo = None
+
+        if not builds:
+            return []
+
+        pool = ThreadPool(min(workers, len(builds)))
+        try:
+            return pool.map(create, [dict(kwargs) for kwargs in builds])
+        finally:
+            pool.close()
+            pool.join()
+
     def _decode_build_logs_generator(self, logs):
         for line in logs:
             line = line.decode("utf-8").rstrip()
@@ -715,7 +915,7 @@ class OSBS(object):
 
     @osbsapi
     def get_build_logs(self, build_id, follow=False, build_json=None, wait_if_missing=False,
-                       decode=False):
+                       decode=False, read_ahead=0):
         """
         provide logs from build
 
@@ -728,10 +928,12 @@ class OSBS(object):
         :param build_json: dict, to save one get-build query
         :param wait_if_missing: bool, if build doesn't exist, wait
         :param decode: bool, whether or not to decode logs as utf-8
+        :param read_ahead: int, when following, number of lines read from
+                           the server ahead of a slow consumer
         :return: None, bytes, or iterable of bytes
         """
         logs = self.os.logs(build_id, follow=follow, build_json=build_json,
-                            wait_if_missing=wait_if_missing)
+                            wait_if_missing=wait_if_missing, read_ahead=read_ahead)
 
         if decode and isinstance(logs, GeneratorType):
             return self._decode_build_logs_generator(logs)
@@ -744,54 +946,266 @@ class OSBS(object):
 
     @staticmethod
     def _parse_build_log_entry(entry):
-        items = entry.split()
-        if len(items) < 4:
-            # This is not a valid build log entry
-            return (None, entry)
-
-        platform = items[2]
-        if not platform.startswith("platform:"):
-            # Line logged without using the appropriate LoggerAdapter
+        # <date> <time> <platform> - <name> - <level> - <message>
+        items = entry.split(" ", 8)
+        if len(items) < 4 or not items[2].startswith("platform:"):
+            # This is not a valid build log entry, or line logged without
+            # using the appropriate LoggerAdapter
             return (None, entry)
 
-        platform = platform.split(":", 1)[1]
+        platform = items[2][len("platform:"):]
         if platform == "-":
             return (None, entry)  # proper orchestrator build log entry
 
         # Anything else should be a worker build log entry, so we strip off
-        # the leading 8 wrapping orchestrator log fields:
-        # <date> <time> <platform> - <name> - <level> -
-        plen = sum(len(items[i]) + 1  # include trailing space
-                   for i in range(8))
-        line = entry[plen:]
+        # the leading 8 wrapping orchestrator log fields
+        line = items[8] if len(items) > 8 else ""
+        return (platform, OSBS._strip_log_platform(line))
+
+    @staticmethod
+    def _strip_log_platform(line):
         # if the 3rd field is "platform:-", we strip it out
-        items = line.split()
+        items = line.split(" ", 3)
         if len(items) > 2 and items[2] == "platform:-":
-            plen = sum(len(items[i]) + 1  # include trailing space
-                       for i in range(3))
-            line = "%s %s %s" % (items[0], items[1], line[plen:])
-        return (platform, line)
+            return "%s %s %s" % (items[0], items[1], items[3] if len(items) > 3 else "")
+        return line
+
+    @staticmethod
+    def _iter_log_lines(logs):
+        if logs is None:
+            return
+        if isinstance(logs, GeneratorType):
+            for entries in logs:
+                for entry in entries.splitlines():
+                    yield entry
+        else:
+            for entry in logs.splitlines():
+                yield entry
+
+    def _get_worker_build_names(self, build_id):
+        """
+        :return: dict, platform -> name of worker build, of those known
+                 from annotations of orchestrator build
+        """
+        try:
+            build_response = self.get_build(build_id)
+        except OsbsResponseException as ex:
+            if ex.status_code != http_client.NOT_FOUND:
+                raise
+            return {}
+
+        return self._worker_build_names(build_response)
+
+    @staticmethod
+    def _worker_build_names(build_response):
+        """
+        :param build_response: BuildResponse, orchestrator build
+        :return: dict, platform -> name of worker build, of those known
+                 from annotations of orchestrator build
+        """
+        annotations = build_response.get_annotations() or {}
+        worker_builds = json.loads(annotations.get('worker-builds', '{}'))
+        return dict((platform, worker_build['build']['build-name'])
+                    for platform, worker_build in worker_builds.items()
+                    if 'build-name' in worker_build.get('build', {}))
+
+    @staticmethod
+    def _merge_log_entries_by_time(streams):
+        """
+        merge streams of LogEntry already ordered by time into one
+
+        Lines without time at the start keep their place after the line
+        before them.
+        """
+        def decorate(index, entries):
+            time_key = ""
+            for seq, entry in enumerate(entries):
+                match = LOG_TIME_RE.match(entry.line)
+                if match:
+                    time_key = match.group(0)
+                yield (time_key, index, seq, entry)
+
+        for _, _, _, entry in heapq.merge(*[decorate(index, entries)
+                                            for index, entries in enumerate(streams)]):
+            yield entry
 
     @osbsapi
-    def get_orchestrator_build_logs(self, build_id, follow=False, wait_if_missing=False):
+    def get_orchestrator_build_logs(self, build_id, follow=False, wait_if_missing=False,
+                                    platforms=None, workers=None):
         """
         provide logs from orchestrator build
 
+        Logs of worker builds are relayed through the orchestrator build. For
+        platforms in workers, logs of worker builds (as found in annotations
+        of the orchestrator build) are read directly from the worker clusters
+        instead, together with the orchestrator build logs. When following,
+        the orchestrator build is watched for worker builds appearing in its
+        annotations. Entries are merged in time order; when following, only
+        entries arriving within LOGS_REORDER_WINDOW seconds of each other
+        are reordered.
+
         :param build_id: str
         :param follow: bool, fetch logs as they come?
         :param wait_if_missing: bool, if build doesn't exist, wait
+        :param platforms: iterable of str, only provide entries for these
+                          platforms; include None for entries of the
+                          orchestrator build itself
+        :param workers: dict, platform -> OSBS instance for the cluster
+                        running worker build for the platform
         :return: generator yielding objects with attributes 'platform' and 'line'
         """
-        logs = self.get_build_logs(build_id=build_id, follow=follow,
-                                   wait_if_missing=wait_if_missing, decode=True)
+        if platforms is not None:
+            platforms = set(platforms)
+
+        if follow and workers:
+            for log_entry in self._follow_orchestrator_build_logs(build_id, wait_if_missing,
+                                                                  platforms, workers):
+                yield log_entry
+            return
+
+        worker_builds = {}
+        if workers:
+            worker_builds = self._get_worker_build_names(build_id)
+            worker_builds = dict((platform, name) for platform, name in worker_builds.items()
+                                 if platform in workers and
+                                 (platforms is None or platform in platforms))
+
+        def orchestrator_entries():
+            logs = self.get_build_logs(build_id=build_id, follow=follow,
+                                       wait_if_missing=wait_if_missing, decode=True)
+            for entry in self._iter_log_lines(logs):
+                log_entry = LogEntry(*self._parse_build_log_entry(entry))
+                if log_entry.platform in worker_builds:
+                    continue  # read from the worker build
+                if platforms is None or log_entry.platform in platforms:
+                    yield log_entry
+
+        def worker_entries(platform, build_name):
+            logs = workers[platform].get_build_logs(build_id=build_name, follow=follow,
+                                                    decode=True)
+            for entry in self._iter_log_lines(logs):
+                yield LogEntry(platform, self._strip_log_platform(entry))
+
+        if not worker_builds:
+            for log_entry in orchestrator_entries():
+                yield log_entry
+            return
+
+        streams = [orchestrator_entries()]
+        streams.extend(worker_entries(platform, build_name)
+                       for platform, build_name in sorted(worker_builds.items()))
+        for log_entry in self._merge_log_entries_by_time(streams):
+            yield log_entry
 
-        if isinstance(logs, GeneratorType):
-            for entries in logs:
-                for entry in entries.splitlines():
-                    yield LogEntry(*self._parse_build_log_entry(entry))
-        else:
-            for entry in logs.splitlines():
-                yield LogEntry(*self._parse_build_log_entry(entry))
+    @staticmethod
+    def _reorder_log_entries_by_time(entries, window, idle):
+        """
+        put LogEntry objects coming from several streams, each ordered by
+        time, in time order
+
+        Each entry is held back until window seconds after it came, so that
+        entries coming a bit later from other streams can go before it.
+        Lines without time at the start keep their place after the line
+        before them of the same platform.
+
+        :param entries: iterable of LogEntry objects, and of idle (provided
+                        when nothing came for a while)
+        :param window: float, seconds to hold entries back for
+        :param idle: object, marker of time passing without entries
+        :return: generator of LogEntry objects
+        """
+        held = []
+        time_keys = {}
+        seq = itertools.count()
+        for entry in entries:
+            now = time.time()
+            if entry is not idle:
+                match = LOG_TIME_RE.match(entry.line)
+                if match:
+                    time_keys[entry.platform] = match.group(0)
+                heapq.heappush(held, (time_keys.get(entry.platform, ""), next(seq), now, entry))
+
+            while held and held[0][2] + window <= now:
+                yield heapq.heappop(held)[3]
+
+        while held:
+            yield heapq.heappop(held)[3]
+
+    def _follow_orchestrator_build_logs(self, build_id, wait_if_missing, platforms, workers):
+        """
+        follow logs of orchestrator build and of its worker builds
+
+        Worker builds are looked for in annotations of the orchestrator build
+        whenever it changes. Until a worker build is found, its entries are
+        relayed by the orchestrator build; reading it directly then continues
+        after the time of the last entry relayed. Entries are provided in
+        time order, as far as they come within LOGS_REORDER_WINDOW.
+        """
+        lock = threading.Lock()
+        direct = {}  # platform -> name of worker build read directly
+        relayed = {}  # platform -> position after entries relayed
+        idle = object()
+        merged = utils.MergedIterator(LOGS_READ_AHEAD, poll_interval=LOGS_REORDER_WINDOW / 2.0,
+                                      idle=idle)
+
+        def wanted(platform):
+            return platforms is None or platform in platforms
+
+        def orchestrator_entries():
+            logs = self.get_build_logs(build_id=build_id, follow=True,
+                                       wait_if_missing=wait_if_missing, decode=True)
+            advance = {}
+            for entry in self._iter_log_lines(logs):
+                log_entry = LogEntry(*self._parse_build_log_entry(entry))
+                if not wanted(log_entry.platform):
+                    continue
+                with lock:
+                    if log_entry.platform in direct:
+                        continue  # read from the worker build
+                    if log_entry.platform is not None:
+                        if log_entry.platform not in advance:
+                            position = relayed.setdefault(log_entry.platform,
+                                                          RelayedLogPosition())
+                            advance[log_entry.platform] = position.line_filter()
+                        advance[log_entry.platform](log_entry.line)
+                yield log_entry
+
+        def worker_entries(platform, build_name, accept):
+            logs = workers[platform].get_build_logs(build_id=build_name, follow=True,
+                                                    decode=True)
+            for entry in self._iter_log_lines(logs):
+                line = accept(self._strip_log_platform(entry))
+                if line is not None:
+                    yield LogEntry(platform, line)
+
+        def add_worker_builds(worker_builds):
+            for platform, build_name in sorted(worker_builds.items()):
+                if platform not in workers or not wanted(platform):
+                    continue
+                with lock:
+                    if platform in direct:
+                        continue
+                    direct[platform] = build_name
+                    position = relayed.get(platform, RelayedLogPosition())
+                    accept = position.line_filter()
+                logger.debug("following worker build %s for %s after %s", build_name, platform,
+                             position.timestamp or "nothing relayed")
+                merged.add(worker_entries(platform, build_name, accept))
+
+        def watch_worker_builds():
+            for changetype, obj in self.os.watch_resource("builds", build_id):
+                if changetype == WATCH_DELETED or merged.closed:
+                    break
+                build_response = BuildResponse(obj)
+                add_worker_builds(self._worker_build_names(build_response))
+                if build_response.is_finished():
+                    break
+
+        add_worker_builds(self._get_worker_build_names(build_id))
+        merged.add(orchestrator_entries())
+        merged.run(watch_worker_builds)
+        for log_entry in self._reorder_log_entries_by_time(merged, LOGS_REORDER_WINDOW, idle):
+            yield log_entry
 
     @osbsapi
     def get_docker_build_logs(self, build_id, decode_logs=True, build_json=None):
@@ -822,6 +1236,26 @@ class OSBS(object):
         build_response = BuildResponse(response)
         return build_response
 
+    @osbsapi
+    def wait_for_builds_to_finish(self, build_ids, label_selector=None, callback=None):
+        """
+        wait for many builds to finish, watching all of them over single connection
+
+        :param build_ids: list of str, names of builds to wait for
+        :param label_selector: str, only watch builds matching this label selector
+        :param callback: callable, called with build name and BuildResponse instance
+                         whenever phase of one of the builds changes
+        :return: generator of BuildResponse instances, yielded as each build finishes
+        """
+        def os_callback(build_id, build_json):
+            callback(build_id, BuildResponse(build_json))
+
+        builds = self.os.wait_for_builds_to_finish(
+            build_ids, label_selector=label_selector,
+            callback=os_callback if callback is not None else None)
+        for build_json in builds:
+            yield BuildResponse(build_json)
+
     @osbsapi
     def wait_for_build_to_get_scheduled(self, build_id):
         response = self.os.wait_for_build_to_get_scheduled(build_id)
@@ -856,6 +1290,36 @@ class OSBS(object):
     def set_annotations_on_build(self, build_id, annotations):
         return self.os.set_annotations_on_build(build_id, annotations)
 
+    @osbsapi
+    def update_annotations_on_builds(self, annotations, workers=BATCH_BUILD_WORKERS):
+        """
+        Update annotations on many builds concurrently
+
+        :param annotations: dict, build name to dict of annotations to set on it
+        :param workers: int, maximal number of builds being updated at once
+        :return: dict, build name to BatchUpdateResult instance; either
+                 response is HttpResponse or error is the exception raised
+                 while updating the build
+        """
+        def update(item):
+            build_id, build_annotations = item
+            try:
+                response = self.os.update_annotations_on_build(build_id, build_annotations)
+                return build_id, BatchUpdateResult(response, None)
+            except Exception as ex:
+                logger.error("failed to update annotations on %s: %r", build_id, ex)
+                return build_id, BatchUpdateResult(None, ex)
+
+        if not annotations:
+            return {}
+
+        pool = ThreadPool(min(workers, len(annotations)))
+        try:
+            return dict(pool.map(update, list(annotations.items())))
+        finally:
+            pool.close()
+            pool.join()
+
     @osbsapi
     def import_image(self, name):
         """
@@ -869,7 +1333,7 @@ class OSBS(object):
     @osbsapi
     def get_token(self):
         if self.os.use_kerberos:
-            return self.os.get_oauth_token()
+            return self.os.ensure_token()
         else:
             if self.os.token:
                 return self.os.token
@@ -906,23 +1370,7 @@ class OSBS(object):
             raise
 
         token_file = utils.get_instance_token_file_name(self.os_conf.conf_section)
-        token_file_dir = os.path.dirname(token_file)
-
-        if not os.path.exists(token_file_dir):
-            os.makedirs(token_file_dir)
-
-        # Inspired by http://stackoverflow.com/a/15015748/5998718
-        # For security, remove file with potentially elevated mode
-        if os.path.exists(token_file):
-            os.remove(token_file)
-
-        # Open file descriptor
-        fdesc = os.open(token_file,
-                        os.O_WRONLY | os.O_CREAT | os.O_EXCL,
-                        stat.S_IRUSR | stat.S_IWUSR)
-
-        with os.fdopen(fdesc, 'w') as f:
-            f.write(token + '\n')
+        utils.write_token_file(token_file, token)
 
     @osbsapi
     def get_user(self, username="~"):
@@ -934,6 +1382,9 @@ class OSBS(object):
 
     @osbsapi
     def get_image_stream_tag(self, tag_id):
+        memo = getattr(self._lookup_local, 'memo', None)
+        if memo is not None:
+            return memo.get(self.os.get_image_stream_tag, tag_id)
         return self.os.get_image_stream_tag(tag_id)
 
     @osbsapi
@@ -949,12 +1400,15 @@ class OSBS(object):
         """
         img_stream_tag_file = os.path.join(self.os_conf.get_build_json_store(),
                                            'image_stream_tag.json')
-        tag_template = json.load(open(img_stream_tag_file))
+        tag_template = utils.load_json_template(img_stream_tag_file)
         return self.os.ensure_image_stream_tag(stream, tag_name, tag_template,
                                                scheduled)
 
     @osbsapi
     def get_image_stream(self, stream_id):
+        memo = getattr(self._lookup_local, 'memo', None)
+        if memo is not None:
+            return memo.get(self.os.get_image_stream, stream_id)
         return self.os.get_image_stream(stream_id)
 
     @osbsapi
@@ -971,8 +1425,12 @@ class OSBS(object):
         :param insecure_registry: bool, whether plain HTTP should be used
         :return: response
         """
+        stream = self._get_image_stream_json(name, docker_image_repository, insecure_registry)
+        return self.os.create_image_stream(json.dumps(stream))
+
+    def _get_image_stream_json(self, name, docker_image_repository, insecure_registry=False):
         img_stream_file = os.path.join(self.os_conf.get_build_json_store(), 'image_stream.json')
-        stream = json.load(open(img_stream_file))
+        stream = utils.load_json_template(img_stream_file)
         stream['metadata']['name'] = name
         stream['spec']['dockerImageRepository'] = docker_image_repository
         if insecure_registry:
@@ -980,13 +1438,12 @@ class OSBS(object):
             insecure_annotation = 'openshift.io/image.insecureRepository'
             stream['metadata']['annotations'][insecure_annotation] = 'true'
 
-        return self.os.create_image_stream(json.dumps(stream))
+        return stream
 
     def _load_quota_json(self, quota_name=None):
         quota_file = os.path.join(self.os_conf.get_build_json_store(),
                                   'pause_quota.json')
-        with open(quota_file) as fp:
-            quota_json = json.load(fp)
+        quota_json = utils.load_json_template(quota_file)
 
         if quota_name:
             quota_json['metadata']['name'] = quota_name
@@ -1003,15 +1460,15 @@ class OSBS(object):
         while True:
             field_selector = ','.join(['status=%s' % status.capitalize()
                                        for status in BUILD_RUNNING_STATES])
-            builds = self.list_builds(field_selector)
+            builds = self.iter_builds(field_selector, summary=True)
 
             # Double check builds are actually in running state.
-            running_builds = [build for build in builds if build.is_running()]
+            running_build = next((build for build in builds if build.is_running()), None)
 
-            if not running_builds:
+            if running_build is None:
                 break
 
-            name = running_builds[0].get_build_name()
+            name = running_build.get_build_name()
             logger.info("waiting for build to finish: %s", name)
             self.wait_for_build_to_finish(name)
 
@@ -1029,25 +1486,109 @@ class OSBS(object):
     def dump_resource(self, resource_type):
         return self.os.dump_resource(resource_type).json()
 
+    def iter_resource(self, resource_type, members=None):
+        """
+        Iterate over all objects of resource type without loading all of them at once
+
+        :param resource_type: str, e.g. builds
+        :param members: dict, if set, other members of the list (kind, metadata...)
+                        are stored in it
+        :return: generator of dicts, objects
+        """
+        return self.os.iter_resource(resource_type, members=members)
+
     @osbsapi
-    def restore_resource(self, resource_type, resources, continue_on_error=False):
-        nfailed = 0
-        for r in resources["items"]:
+    def restore_resource(self, resource_type, resources, continue_on_error=False, jobs=1):
+        """
+        Create objects from backup
+
+        Objects are created by up to jobs threads at once and the method
+        returns once all of them are done. Items are taken from resources
+        only as fast as they are created, so they can be read lazily.
+
+        :param resource_type: str, e.g. builds
+        :param resources: dict with list of objects in "items", or iterable of objects
+        :param continue_on_error: bool, restore other objects when one fails
+        :param jobs: int, number of objects created at once
+        :return: RestoreResult, numbers of objects restored and failed
+        """
+        items = resources["items"] if isinstance(resources, dict) else resources
+        lock = threading.Lock()
+        counts = {'succeeded': 0, 'failed': 0}
+        errors = []
+
+        def restore(r):
             name = utils.graceful_chain_get(r, 'metadata', 'name') or '(no name)'
             logger.debug("restoring %s/%s", resource_type, name)
             try:
                 self._prepare_resource(r)
-                self.os.restore_resource(resource_type, r)
-            except Exception:
+                self._restore_object(resource_type, r)
+            except Exception as ex:
                 if continue_on_error:
                     logger.exception("failed to restore %s/%s", resource_type, name)
-                    nfailed += 1
+                return ex, sys.exc_info()[2]
+            return None, None
+
+        def done(result):
+            error, _ = result
+            with lock:
+                if error is None:
+                    counts['succeeded'] += 1
                 else:
-                    raise
+                    counts['failed'] += 1
+                    errors.append(result)
+
+        if jobs > 1:
+            pool = ThreadPool(jobs)
+            # don't read items much faster than they are restored
+            slots = threading.BoundedSemaphore(jobs * 2)
+
+            def release(result):
+                done(result)
+                slots.release()
+
+            try:
+                for r in items:
+                    if errors and not continue_on_error:
+                        break
+                    slots.acquire()
+                    pool.apply_async(restore, (r,), callback=release)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for r in items:
+                done(restore(r))
+                if errors and not continue_on_error:
+                    break
+
+        if errors and not continue_on_error:
+            error, traceback = errors[0]
+            six.reraise(type(error), error, traceback)
 
         if continue_on_error:
-            ntotal = len(resources["items"])
-            logger.info("restored %s/%s %s", ntotal - nfailed, ntotal, resource_type)
+            ntotal = counts['succeeded'] + counts['failed']
+            logger.info("restored %s/%s %s", counts['succeeded'], ntotal, resource_type)
+
+        return RestoreResult(counts['succeeded'], counts['failed'])
+
+    def _restore_object(self, resource_type, resource):
+        """
+        create object, retrying when OpenShift reports conflict other than
+        that the object already exists
+        """
+        for attempt in range(RESTORE_CONFLICT_RETRIES + 1):
+            try:
+                return self.os.restore_resource(resource_type, resource)
+            except OsbsResponseException as ex:
+                status = ex.json if isinstance(ex.json, dict) else {}
+                if (ex.status_code != http_client.CONFLICT or
+                        status.get('reason') == 'AlreadyExists' or
+                        attempt == RESTORE_CONFLICT_RETRIES):
+                    raise
+
+                logger.info("conflict restoring %s, retrying: %s", resource_type, ex)
+                time.sleep(RESTORE_CONFLICT_BACKOFF * (attempt + 1))
 
     @osbsapi
     def get_compression_extension(self):
@@ -1085,6 +1626,69 @@ class OSBS(object):
     def get_resource_quota(self, quota_name):
         return self.os.get_resource_quota(quota_name).json()
 
+    @osbsapi
+    def get_load_summary(self):
+        """
+        Summarize load of the cluster, for choosing where to build
+
+        Running builds, resource quotas and pods are listed concurrently.
+        The summary is reused for load_summary_ttl seconds, callers asking
+        while it is being gathered wait for it.
+
+        :return: LoadSummary instance:
+                 builds -- dict, node selector of builds ("key=value,..." str,
+                           "" for none) to BuildLoad instance with counts of
+                           running and pending (incl. new) builds
+                 quota_headroom -- dict, resource name to float, amount still
+                                   available under the most limiting quota
+                 pods -- dict, pod phase (lowercase) to number of pods
+                 timestamp -- float, when the summary was gathered
+        """
+        with self._load_summary_lock:
+            summary = self._load_summary
+            ttl = self.os_conf.get_load_summary_ttl()
+            if summary is None or time.time() - summary.timestamp >= ttl:
+                summary = self._load_summary = self._gather_load_summary()
+            return summary
+
+    def _gather_load_summary(self):
+        timestamp = time.time()
+        pool = ThreadPool(3)
+        try:
+            builds = pool.apply_async(self.list_builds, kwds={'running': True, 'summary': True})
+            quotas = pool.apply_async(self.os.list_resource_quotas)
+            pods = pool.apply_async(self.os.list_pods)
+            builds, quotas, pods = builds.get(), quotas.get().json(), pods.get().json()
+        finally:
+            pool.close()
+            pool.join()
+
+        build_counts = defaultdict(lambda: [0, 0])
+        for build in builds:
+            node_selector = build.json.get('spec', {}).get('nodeSelector') or {}
+            key = ','.join('%s=%s' % item for item in sorted(node_selector.items()))
+            if build.is_running():
+                build_counts[key][0] += 1
+            elif build.is_pending():
+                build_counts[key][1] += 1
+
+        quota_headroom = {}
+        for quota in quotas.get('items', []):
+            status = quota.get('status', {})
+            used = status.get('used', {})
+            for resource, hard in status.get('hard', {}).items():
+                headroom = (utils.parse_quantity(hard) -
+                            utils.parse_quantity(used.get(resource, 0)))
+                quota_headroom[resource] = min(headroom,
+                                               quota_headroom.get(resource, headroom))
+
+        pod_counts = defaultdict(int)
+        for pod in pods.get('items', []):
+            pod_counts[pod.get('status', {}).get('phase', 'unknown').lower()] += 1
+
+        return LoadSummary(dict((key, BuildLoad(*counts)) for key, counts in build_counts.items()),
+                           quota_headroom, dict(pod_counts), timestamp)
+
     @osbsapi
     def can_orchestrate(self):
         return self.build_conf.get_can_orchestrate()
@@ -1101,7 +1705,7 @@ class OSBS(object):
         :returns: ConfigMapResponse containing the ConfigMap with name and data
         """
         config_data_file = os.path.join(self.os_conf.get_build_json_store(), 'config_map.json')
-        config_data = json.load(open(config_data_file))
+        config_data = utils.load_json_template(config_data_file)
         config_data['metadata']['name'] = name
         data_dict = {}
         for key, value in data.items():
@@ -7,7 +7,6 @@ of the BSD license. See the LICENSE file for details.
 """
 from __future__ import print_function, absolute_import, unicode_literals
 
-import json
 import logging
 import os
 import re
@@ -22,7 +21,7 @@ from osbs.constants import (SECRETS_PATH, DEFAULT_OUTER_TEMPLATE, DEFAULT_INNER_
                             ISOLATED_RELEASE_FORMAT)
 from osbs.exceptions import OsbsException, OsbsValidationException
 from osbs.utils import (git_repo_humanish_part_from_uri, wrap_name_from_git, sanitize_version,
-                        Labels)
+                        Labels, load_json_template)
 from osbs import __version__ as client_version
 
 
@@ -159,8 +158,7 @@ class BuildRequest(object):
             path = os.path.join(self.build_json_store, self._outer_template_path)
             logger.debug("loading template from path %s", path)
             try:
-                with open(path, "r") as fp:
-                    self._template = json.load(fp)
+                self._template = load_json_template(path)
             except (IOError, OSError) as ex:
                 raise OsbsException("Can't open template '%s': %s" %
                                     (path, repr(ex)))
@@ -171,8 +169,7 @@ class BuildRequest(object):
         if self._inner_template is None:
             path = os.path.join(self.build_json_store, self._inner_template_path)
             logger.debug("loading inner template from path %s", path)
-            with open(path, "r") as fp:
-                self._inner_template = json.load(fp)
+            self._inner_template = load_json_template(path)
         return self._inner_template
 
     @property
@@ -181,8 +178,7 @@ class BuildRequest(object):
             path = os.path.join(self.build_json_store, self._customize_conf_path)
             logger.debug("loading customize conf from path %s", path)
             try:
-                with open(path, "r") as fp:
-                    self._customize_conf = json.load(fp)
+                self._customize_conf = load_json_template(path)
             except IOError:
                 # File not found, which is perfectly fine. Set to empty string
                 self._customize_conf = {}
@@ -7,6 +7,7 @@ of the BSD license. See the LICENSE file for details.
 """
 from __future__ import print_function, absolute_import, unicode_literals
 
+import copy
 import json
 import logging
 
@@ -20,15 +21,32 @@ logger = logging.getLogger(__name__)
 
 
 class BuildResponse(object):
-    """ class which wraps json from http response from OpenShift """
+    """
+    class which wraps json from http response from OpenShift
+
+    JSON values stored in annotations are decoded once, on first use; getters
+    return copies of the decoded objects, so callers are free to modify them.
+    Assigning to json drops everything decoded so far.
+    """
+
+    __slots__ = ('_json', '_status', '_cancelled', '_decoded')
 
     def __init__(self, build_json):
         """
         :param build_json: dict from JSON of OpenShift Build object
         """
         self.json = build_json
+
+    @property
+    def json(self):
+        return self._json
+
+    @json.setter
+    def json(self, value):
+        self._json = value
         self._status = None
         self._cancelled = None
+        self._decoded = {}
 
     @property
     def status(self):
@@ -54,6 +72,31 @@ class BuildResponse(object):
         self.json['status']['cancelled'] = value
         self._cancelled = value
 
+    def _get_annotation(self, key):
+        """
+        like graceful_chain_get(self.get_annotations_or_labels(), key), without copying
+        """
+        value = self._get("metadata", "annotations", key)
+        if value is None and self._get("metadata", "annotations") is None:
+            value = self._get("metadata", "labels", key)
+        return value
+
+    def _get_decoded_annotation(self, key):
+        """
+        :param key: str, name of annotation holding JSON
+        :return: decoded JSON, or None if the annotation is missing or empty;
+                 shared by all calls, must not be modified
+        """
+        try:
+            return self._decoded[key]
+        except KeyError:
+            pass
+
+        value = self._get_annotation(key)
+        decoded = json.loads(value) if value else None
+        self._decoded[key] = decoded
+        return decoded
+
     def is_finished(self):
         return self.status in BUILD_FINISHED_STATES
 
@@ -75,17 +118,34 @@ class BuildResponse(object):
     def is_in_progress(self):
         return self.status not in BUILD_FINISHED_STATES
 
+    def _get(self, *keys):
+        """
+        like graceful_chain_get(self.json, *keys), without copying
+        """
+        value = self.json
+        try:
+            for key in keys:
+                value = value[key]
+        except (IndexError, KeyError, TypeError):
+            return None
+        return value
+
     def get_build_name(self):
-        return graceful_chain_get(self.json, "metadata", "name")
+        return self._get("metadata", "name")
 
     def get_image_tag(self):
-        return graceful_chain_get(self.json, "spec", "output", "to", "name")
+        return self._get("spec", "output", "to", "name")
 
     def get_time_created(self):
-        return graceful_chain_get(self.json, "metadata", "creationTimestamp")
+        return self._get("metadata", "creationTimestamp")
 
     def get_time_created_in_seconds(self):
-        return get_time_from_rfc3339(self.get_time_created())
+        try:
+            return self._decoded['creationTimestamp']
+        except KeyError:
+            seconds = get_time_from_rfc3339(self.get_time_created())
+            self._decoded['creationTimestamp'] = seconds
+            return seconds
 
     def get_annotations(self):
         return graceful_chain_get(self.json, "metadata", "annotations")
@@ -100,10 +160,10 @@ class BuildResponse(object):
         return r
 
     def get_rpm_packages(self):
-        return graceful_chain_get(self.get_annotations_or_labels(), "rpm-packages")
+        return self._get_annotation("rpm-packages")
 
     def get_dockerfile(self):
-        return graceful_chain_get(self.get_annotations_or_labels(), "dockerfile")
+        return self._get_annotation("dockerfile")
 
     def get_logs(self, decode_logs=True):
         """
@@ -112,7 +172,7 @@ class BuildResponse(object):
             if this arg is set to True, it decodes logs to human readable form
         :return: str
         """
-        logs = graceful_chain_get(self.get_annotations_or_labels(), "logs")
+        logs = self._get_annotation("logs")
         if not logs:
             logger.debug("no logs found in annotations")
             return ""
@@ -141,8 +201,7 @@ class BuildResponse(object):
         Return an error message based on atomic-reactor's metadata
         """
         try:
-            str_metadata = graceful_chain_get(self.get_annotations_or_labels(), "plugins-metadata")
-            metadata_dict = json.loads(str_metadata)
+            metadata_dict = self._get_decoded_annotation("plugins-metadata")
             plugin, error_message = list(metadata_dict['errors'].items())[0]
             if error_message:
                 # Plugin has non-empty error description
@@ -153,45 +212,43 @@ class BuildResponse(object):
             return None
 
     def get_commit_id(self):
-        return graceful_chain_get(self.get_annotations_or_labels(), "commit_id")
+        return self._get_annotation("commit_id")
 
     def get_repositories(self):
-        repositories_json = graceful_chain_get(self.get_annotations_or_labels(), "repositories")
-        if repositories_json:
-            return json.loads(repositories_json)
+        return copy.deepcopy(self._get_decoded_annotation("repositories"))
 
     def get_tar_metadata(self):
-        tar_md_json = graceful_chain_get(self.get_annotations_or_labels(), "tar_metadata")
-        if tar_md_json:
-            return json.loads(tar_md_json)
+        return copy.deepcopy(self._get_decoded_annotation("tar_metadata"))
+
+    def _get_tar_metadata_value(self, key):
+        try:
+            return self._get_decoded_annotation("tar_metadata")[key]
+        except (KeyError, TypeError):
+            return None
 
     def get_tar_metadata_size(self):
-        return graceful_chain_get(self.get_tar_metadata(), "size")
+        return self._get_tar_metadata_value("size")
 
     def get_tar_metadata_md5sum(self):
-        return graceful_chain_get(self.get_tar_metadata(), "md5sum")
+        return self._get_tar_metadata_value("md5sum")
 
     def get_tar_metadata_sha256sum(self):
-        return graceful_chain_get(self.get_tar_metadata(), "sha256sum")
+        return self._get_tar_metadata_value("sha256sum")
 
     def get_tar_metadata_filename(self):
-        return graceful_chain_get(self.get_tar_metadata(), "filename")
+        return self._get_tar_metadata_value("filename")
 
     def get_image_id(self):
-        return graceful_chain_get(self.get_annotations_or_labels(), "image-id")
+        return self._get_annotation("image-id")
 
     def get_base_image_id(self):
-        return graceful_chain_get(self.get_annotations_or_labels(),
-                                  "base-image-id")
+        return self._get_annotation("base-image-id")
 
     def get_base_image_name(self):
-        return graceful_chain_get(self.get_annotations_or_labels(),
-                                  "base-image-name")
+        return self._get_annotation("base-image-name")
 
     def get_digests(self):
-        digests_json = graceful_chain_get(self.get_annotations_or_labels(), "digests")
-        if digests_json:
-            return json.loads(digests_json)
+        return copy.deepcopy(self._get_decoded_annotation("digests"))
 
     def get_koji_build_id(self):
-        return graceful_chain_get(self.get_labels(), "koji-build-id")
+        return self._get("metadata", "labels", "koji-build-id")
@@ -17,6 +17,8 @@ class DockJsonManipulator(object):
         """ """
         self.build_json = build_json
         self.dock_json = dock_json
+        # plugin_type -> ((id, length) of plugin list, {plugin_name: [plugin]})
+        self._index = {}
 
     def get_dock_json(self):
         """ return dock json from existing build json """
@@ -31,6 +33,26 @@ class DockJsonManipulator(object):
         dock_json = json.loads(dock_json_str)
         return dock_json
 
+    def _plugin_index(self, plugin_type):
+        """
+        Return plugins of a type indexed by name, preserving their order.
+
+        The index is rebuilt whenever the list of plugins was replaced or its
+        length changed.
+
+        Raises KeyError if there are no plugins of that type.
+        """
+        plugins = self.dock_json[plugin_type]
+        signature = (id(plugins), len(plugins))
+        cached = self._index.get(plugin_type)
+        if cached is None or cached[0] != signature:
+            index = {}
+            for plugin in plugins:
+                index.setdefault(plugin.get('name'), []).append(plugin)
+            cached = (signature, index)
+            self._index[plugin_type] = cached
+        return cached[1]
+
     def dock_json_get_plugin_conf(self, plugin_type, plugin_name):
         """
         Return the configuration for a plugin.
@@ -38,32 +60,42 @@ class DockJsonManipulator(object):
         Raises KeyError if there are no plugins of that type.
         Raises IndexError if the named plugin is not listed.
         """
-        match = [x for x in self.dock_json[plugin_type] if x.get('name') == plugin_name]
+        match = self._plugin_index(plugin_type).get(plugin_name, [])
         return match[0]
 
     def remove_plugin(self, plugin_type, plugin_name):
         """
         if config contains plugin, remove it
         """
-        for p in self.dock_json[plugin_type]:
-            if p.get('name') == plugin_name:
-                self.dock_json[plugin_type].remove(p)
-                break
+        index = self._plugin_index(plugin_type)
+        match = index.get(plugin_name)
+        if match:
+            plugins = self.dock_json[plugin_type]
+            for i, plugin in enumerate(plugins):
+                if plugin is match[0]:
+                    del plugins[i]
+                    break
+
+            del match[0]
+            if not match:
+                del index[plugin_name]
+            self._index[plugin_type] = ((id(plugins), len(plugins)), index)
 
     def add_plugin(self, plugin_type, plugin_name, args_dict):
         """
         if config has plugin, override it, else add it
         """
-
-        plugin_modified = False
-
-        for plugin in self.dock_json[plugin_type]:
-            if plugin['name'] == plugin_name:
+        index = self._plugin_index(plugin_type)
+        match = index.get(plugin_name)
+        if match:
+            for plugin in match:
                 plugin['args'] = args_dict
-                plugin_modified = True
-
-        if not plugin_modified:
-            self.dock_json[plugin_type].append({"name": plugin_name, "args": args_dict})
+        else:
+            plugins = self.dock_json[plugin_type]
+            plugin = {"name": plugin_name, "args": args_dict}
+            plugins.append(plugin)
+            index[plugin_name] = [plugin]
+            self._index[plugin_type] = ((id(plugins), len(plugins)), index)
 
     def dock_json_has_plugin_conf(self, plugin_type, plugin_name):
         """
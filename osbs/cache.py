@@ -0,0 +1,230 @@
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+In-process cache of Build objects kept up to date by watching OpenShift
+"""
+from __future__ import print_function, unicode_literals, absolute_import
+
+from collections import defaultdict
+import copy
+import logging
+import threading
+import time
+
+from osbs.constants import (BUILD_FINISHED_STATES, BUILD_CACHE_RESYNC_PERIOD,
+                            WATCH_ADDED, WATCH_MODIFIED, WATCH_DELETED, WATCH_ERROR,
+                            WATCH_RETRY_BACKOFF_MAX)
+
+
+logger = logging.getLogger(__name__)
+
+
+class BuildCache(object):
+    """
+    Local store of all builds in a namespace
+
+    Builds are listed once and then kept current by a watch running in a
+    background thread. The store is indexed by name, BuildConfig, Koji task
+    ID and phase. It may lag behind the server by the latency of the watch
+    and it is fully re-listed every resync_period seconds; while it is not
+    synced, callers should ask the server instead.
+    """
+
+    def __init__(self, openshift, resync_period=BUILD_CACHE_RESYNC_PERIOD):
+        """
+        :param openshift: osbs.core.Openshift instance
+        :param resync_period: int, seconds between full re-lists of builds
+        """
+        self.os = openshift
+        self.resync_period = resync_period
+        self._lock = threading.Lock()
+        self._builds = {}
+        self._by_build_config = defaultdict(set)
+        self._by_koji_task_id = defaultdict(set)
+        self._by_phase = defaultdict(set)
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def synced(self):
+        return self._synced.is_set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        # each watch thread has its own event, so that a stopped thread
+        # still waiting for an event never runs next to its replacement
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stopped,),
+                                        name='osbs-build-cache')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        stop updating the cache; the watch thread exits with the next event
+        (or when the server closes the watch), without changing the cache
+        """
+        with self._lock:
+            self._stopped.set()
+            self._synced.clear()
+        self._thread = None
+
+    def wait_for_sync(self, timeout=None):
+        """
+        :param timeout: float, seconds to wait for initial listing of builds
+        :return: bool, whether the cache is synced
+        """
+        return self._synced.wait(timeout)
+
+    def get(self, name):
+        """
+        :param name: str, name of Build
+        :return: dict, copy of Build JSON, or None if not known
+        """
+        with self._lock:
+            build = self._builds.get(name)
+            return copy.deepcopy(build) if build is not None else None
+
+    def list(self, build_config_id=None, koji_task_id=None, running=None, labels=None):
+        """
+        :param build_config_id: str, only list builds created from BuildConfig
+        :param koji_task_id: str, only list builds for Koji Task ID
+        :param running: bool, only list builds not in finished state
+        :param labels: dict, only list builds with all of these labels
+        :return: list of dicts, copies of Build JSONs
+        """
+        with self._lock:
+            names = set(self._builds)
+            if build_config_id is not None:
+                names &= self._by_build_config.get(build_config_id, set())
+            if koji_task_id is not None:
+                names &= self._by_koji_task_id.get(str(koji_task_id), set())
+            if running:
+                for phase in BUILD_FINISHED_STATES:
+                    names -= self._by_phase.get(phase, set())
+
+            builds = [self._builds[name] for name in sorted(names)]
+            if labels:
+                builds = [build for build in builds
+                          if all(self._labels(build).get(key) == value
+                                 for key, value in labels.items())]
+
+            return [copy.deepcopy(build) for build in builds]
+
+    def update(self, build):
+        """
+        store build unless it is already known, e.g. right after creating it
+
+        :param build: dict, Build JSON
+        """
+        with self._lock:
+            name = build.get('metadata', {}).get('name')
+            if name is not None and name not in self._builds:
+                self._store(build)
+
+    def _store(self, build):
+        name = build['metadata']['name']
+        self._discard(name)
+        self._builds[name] = build
+        for index, value in self._index_keys(build):
+            index[value].add(name)
+
+    def _discard(self, name):
+        build = self._builds.pop(name, None)
+        if build is None:
+            return
+
+        for index, value in self._index_keys(build):
+            index[value].discard(name)
+            if not index[value]:
+                del index[value]
+
+    @staticmethod
+    def _labels(build):
+        return build.get('metadata', {}).get('labels') or {}
+
+    def _index_keys(self, build):
+        labels = self._labels(build)
+        phase = build.get('status', {}).get('phase')
+        keys = []
+        if 'buildconfig' in labels:
+            keys.append((self._by_build_config, labels['buildconfig']))
+        if 'koji-task-id' in labels:
+            keys.append((self._by_koji_task_id, labels['koji-task-id']))
+        if phase is not None:
+            keys.append((self._by_phase, phase.lower()))
+        return keys
+
+    def _relist(self, stopped=None):
+        """
+        :param stopped: threading.Event, set when the calling thread is stopped
+        :return: str, resourceVersion of the listing
+        """
+        members = {}
+        listed = set()
+        for build in self.os.iter_builds(members=members):
+            with self._lock:
+                if stopped is not None and stopped.is_set():
+                    return None
+                self._store(build)
+            listed.add(build['metadata']['name'])
+
+        with self._lock:
+            if stopped is not None and stopped.is_set():
+                return None
+            for name in set(self._builds) - listed:
+                self._discard(name)
+            self._synced.set()
+
+        logger.debug("build cache synced with %d builds", len(self._builds))
+        return members.get('metadata', {}).get('resourceVersion')
+
+    def _apply(self, changetype, build, stopped=None):
+        """
+        :param changetype: str, type of watch event
+        :param build: dict, Build JSON
+        :param stopped: threading.Event, set when the calling thread is stopped
+        """
+        name = build.get('metadata', {}).get('name')
+        if name is None:
+            return
+
+        with self._lock:
+            if stopped is not None and stopped.is_set():
+                return
+            if changetype in (WATCH_ADDED, WATCH_MODIFIED):
+                self._store(build)
+            elif changetype == WATCH_DELETED:
+                self._discard(name)
+
+    def _run(self, stopped):
+        while not stopped.is_set():
+            try:
+                resource_version = self._relist(stopped)
+                if stopped.is_set():
+                    break
+
+                # the watch ends at the resync time even when no events come
+                resync_at = time.time() + self.resync_period
+                for changetype, obj in self.os.watch_resource('builds', deadline=resync_at,
+                                                              resourceVersion=resource_version):
+                    if stopped.is_set() or changetype == WATCH_ERROR:
+                        break
+
+                    self._apply(changetype, obj, stopped)
+                    if time.time() > resync_at:
+                        break
+            except Exception:
+                logger.exception("watching builds failed, build cache is not used")
+                with self._lock:
+                    if not stopped.is_set():
+                        self._synced.clear()
+                stopped.wait(WATCH_RETRY_BACKOFF_MAX)
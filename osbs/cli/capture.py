@@ -46,6 +46,32 @@ class IterLinesSaver(object):
             yield line
 
 
+class IterChunksSaver(object):
+    """
+    Wrap HttpStream.iter_chunks() and save the whole response once read.
+    """
+
+    def __init__(self, path, fn):
+        self.path = path
+        self.fn = fn
+
+    def iter_chunks(self):
+        chunks = []
+        for chunk in self.fn():
+            chunks.append(chunk)
+            yield chunk
+
+        path = "{f}.json".format(f=self.path)
+        logger.debug("capturing to %s", path)
+        content = b''.join(chunks)
+        with open(path, "w") as outf:
+            try:
+                json.dump(json.loads(content.decode(guess_json_utf(content))), outf,
+                          sort_keys=True, indent=4)
+            except ValueError:
+                outf.write(content.decode('utf-8', 'replace'))
+
+
 class ResponseSaver(object):
     """
     Wrap HttpSession.request() and save responses.
@@ -77,6 +103,8 @@ class ResponseSaver(object):
             stream = self.fn(url, method, *args, **kwargs)
             stream.iter_lines = IterLinesSaver(path,
                                                stream.iter_lines).iter_lines
+            stream.iter_chunks = IterChunksSaver(path,
+                                                 stream.iter_chunks).iter_chunks
             return stream
         else:
             response = self.fn(url, method, *args, **kwargs)
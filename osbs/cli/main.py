@@ -13,24 +13,30 @@ import logging
 import pkg_resources
 
 from textwrap import dedent
-import codecs
 import time
 import os.path
+import resource
 import sys
 import argparse
+import tempfile
+import uuid
 from osbs import set_logging
 from osbs.api import OSBS
 from osbs.build.build_response import BuildResponse
-from osbs.cli.render import TablePrinter
+from osbs.cli.render import StreamingTablePrinter
 from osbs.conf import Configuration
 from osbs.constants import (DEFAULT_CONFIGURATION_FILE, DEFAULT_CONFIGURATION_SECTION,
                             CLI_LIST_BUILDS_DEFAULT_COLS, PY3, BACKUP_RESOURCES,
-                            BUILD_FINISHED_STATES, CLI_WATCH_BUILDS_DEFAULT_COLS)
+                            BUILD_FINISHED_STATES, CLI_WATCH_BUILDS_DEFAULT_COLS,
+                            BACKUP_COMPRESSIONS, DEFAULT_BACKUP_COMPRESSION,
+                            RESTORE_READ_SIZE, BACKUP_MANIFEST, LOGS_READ_AHEAD)
 from osbs.exceptions import (OsbsNetworkException, OsbsException, OsbsAuthException,
                              OsbsResponseException)
 from osbs.cli.capture import setup_json_capture
+from osbs.http import iter_json_items
 from osbs.utils import (strip_registry_from_image, paused_builds, TarReader,
-                        TarWriter, get_time_from_rfc3339, graceful_chain_get)
+                        TarWriter, get_time_from_rfc3339, graceful_chain_get,
+                        write_json_list)
 from six.moves.urllib.parse import urljoin
 
 logger = logging.getLogger('osbs')
@@ -40,6 +46,21 @@ def print_json_nicely(decoded_json):
     print(json.dumps(decoded_json, indent=2))
 
 
+def print_json_list_nicely(items):
+    """
+    print items as print_json_nicely would print list of them, one at a time
+    """
+    first = True
+    for item in items:
+        item_json = json.dumps(item, indent=2).replace("\n", "\n  ")
+        if first:
+            sys.stdout.write("[\n  " + item_json)
+            first = False
+        else:
+            sys.stdout.write(",\n  " + item_json)
+    print("[]" if first else "\n]")
+
+
 def cmd_get_all_resource_quota(args, osbs):
     quota_name = args.QUOTA_NAME
     logger.debug("quota name = %s", quota_name)
@@ -58,13 +79,15 @@ def cmd_watch_builds(args, osbs):
     if args.columns:
         cols_to_display = args.columns.split(",")
 
-    data = [{
+    header = {
         "changetype": "CHANGE",
         "status": "STATUS",
         "created": "CREATED",
         "name": "NAME",
-    }]
-    for changetype, obj in osbs.watch_builds(field_selector=field_selector):
+    }
+    # rows are printed as events come, column widths grow when needed
+    tp = StreamingTablePrinter(header, cols_to_display, sample_size=1)
+    for changetype, obj in osbs.watch_builds(field_selector=field_selector, summary=True):
         try:
             name = obj['metadata']['name']
         except KeyError:
@@ -89,13 +112,12 @@ def cmd_watch_builds(args, osbs):
                 "status": status,
                 "created": created,
             }
-            data.append(b)
         if args.output == 'json':
             print(json.dumps(b))
             sys.stdout.flush()
         elif args.output == 'text':
-            tp = TablePrinter(data, cols_to_display)
-            tp.render()
+            tp.add(b)
+            tp.flush()
 
 
 def cmd_list_builds(args, osbs):
@@ -103,23 +125,26 @@ def cmd_list_builds(args, osbs):
     if args.running:
         kwargs['running'] = args.running
 
+    if args.max_results is not None:
+        kwargs['max_results'] = args.max_results
+
+    # whole builds are only needed for JSON output
+    kwargs['summary'] = args.output != 'json'
+
     if args.from_json:
         with open(args.from_json) as fp:
-            builds = [BuildResponse(build) for build in json.load(fp)]
+            builds = [BuildResponse(build) for build in json.load(fp)][:args.max_results]
     else:
-        builds = osbs.list_builds(**kwargs)
+        builds = osbs.iter_builds(**kwargs)
 
     if args.output == 'json':
-        json_output = []
-        for build in builds:
-            json_output.append(build.json)
-        print_json_nicely(json_output)
+        print_json_list_nicely(build.json for build in builds)
     elif args.output == 'text':
         if args.columns:
             cols_to_display = args.columns.split(",")
         else:
             cols_to_display = CLI_LIST_BUILDS_DEFAULT_COLS
-        data = [{
+        header = {
             "base_image": "BASE IMAGE NAME",
             "base_image_id": "BASE IMAGE ID",
             "commit": "COMMIT",
@@ -130,9 +155,10 @@ def cmd_list_builds(args, osbs):
             "name": "BUILD ID",
             "status": "STATUS",
             "time_created": "TIME CREATED",
-        }]
-        for build in sorted(builds,
-                            key=lambda x: x.get_time_created_in_seconds()):
+        }
+        # only rows to display are kept, not whole builds
+        rows = []
+        for build in builds:
             unique_image = build.get_image_tag()
             try:
                 image = strip_registry_from_image(build.get_repositories()["primary"][0])
@@ -154,9 +180,12 @@ def cmd_list_builds(args, osbs):
                 "status": build.status,
                 "time_created": build.get_time_created(),
             }
-            data.append(b)
-        tp = TablePrinter(data, cols_to_display)
-        tp.render()
+            rows.append((build.get_time_created_in_seconds(), b))
+        rows.sort(key=lambda row: row[0])
+        tp = StreamingTablePrinter(header, cols_to_display)
+        for _, b in rows:
+            tp.add(b)
+        tp.flush()
 
 
 def make_digests_str(digests):
@@ -401,9 +430,10 @@ def cmd_build_logs(args, osbs):
     if args.from_docker_build:
         logs = osbs.get_docker_build_logs(build_id)
     else:
+        # when following, stdout may be a pipe read slower than lines come
         logs = osbs.get_build_logs(build_id, follow=follow,
                                    wait_if_missing=args.wait_if_missing,
-                                   decode=True)
+                                   decode=True, read_ahead=LOGS_READ_AHEAD)
         if follow:
             for line in logs:
                 print(line)
@@ -475,6 +505,88 @@ def cmd_get_build_image_id(args, osbs):
             print(format_str.format(tag=name, image=image_id))
 
 
+def _parse_resource_version(resource_version):
+    """
+    :return: int, resourceVersion for comparison, or None if it's not a number
+    """
+    try:
+        return int(resource_version)
+    except (TypeError, ValueError):
+        return None
+
+
+def _dump_resource(osbs, resource_type, fp, base=None):
+    """
+    Write objects of resource type to file
+
+    :param base: dict, manifest entry for resource_type of the backup this
+                 one is based on; when set, only objects changed since then
+                 are written
+    :return: tuple, number of objects written and manifest entry
+    """
+    base_version = _parse_resource_version((base or {}).get('resourceVersion'))
+    names = set()
+    # highest resourceVersion seen, in case the list has none
+    latest = {}
+
+    def changed(objects):
+        for obj in objects:
+            metadata = obj.get('metadata') or {}
+            if metadata.get('name'):
+                names.add(metadata['name'])
+            version = _parse_resource_version(metadata.get('resourceVersion'))
+            if version is not None and version > latest.get('version', -1):
+                latest['version'] = version
+            if base_version is None or version is None or version > base_version:
+                yield obj
+
+    members = {}
+    count = write_json_list(fp, changed(osbs.iter_resource(resource_type, members=members)),
+                            members=members)
+    resource_version = (members.get('metadata') or {}).get('resourceVersion')
+    if resource_version is None and latest:
+        resource_version = str(latest['version'])
+
+    entry = {
+        'resourceVersion': resource_version,
+        'objects': sorted(names),
+        'deleted': sorted(set((base or {}).get('objects', [])) - names),
+    }
+    return count, entry
+
+
+def _read_backup_manifest(archive):
+    """
+    :return: dict, manifest of backup archive, or None if it has none
+    """
+    reader = TarReader(archive)
+    try:
+        for f in reader:
+            if os.path.basename(f.filename) == BACKUP_MANIFEST:
+                return json.loads(f.fileobj.read().decode('utf-8'))
+            # manifest is always the first member
+            break
+    finally:
+        reader.close()
+    return None
+
+
+def _iter_backup_objects(archive, resource_type):
+    """
+    :return: generator of objects of resource type stored in backup archive
+    """
+    reader = TarReader(archive)
+    try:
+        for f in reader:
+            if os.path.basename(f.filename) == resource_type + '.json':
+                chunks = iter(lambda: f.fileobj.read(RESTORE_READ_SIZE), b'')
+                for obj in iter_json_items(chunks):
+                    yield obj
+                break
+    finally:
+        reader.close()
+
+
 def cmd_backup(args, osbs):
     dirname = time.strftime("osbs-backup-{0}-%Y-%m-%d-%H%M%S"
                             .format(args.instance))
@@ -483,48 +595,157 @@ def cmd_backup(args, osbs):
     elif args.filename:
         outfile = args.filename
     else:
-        outfile = dirname + ".tar.bz2"
-
-    with paused_builds(osbs, quota_name='pause-backup',
-                       ignore_quota_errors=args.ignore_quota_errors):
-        with TarWriter(outfile, dirname) as t:
+        outfile = dirname + BACKUP_COMPRESSIONS[args.compression]
+
+    base = None
+    if args.incremental_from:
+        base = _read_backup_manifest(args.incremental_from)
+        if base is None:
+            raise OsbsException("%s has no manifest, it can't be base of incremental backup" %
+                                args.incremental_from)
+
+    manifest = {
+        'id': uuid.uuid4().hex,
+        'base': base['id'] if base else None,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'resources': {},
+    }
+    started = time.time()
+    total = 0
+    dumps = []
+    try:
+        with paused_builds(osbs, quota_name='pause-backup',
+                           ignore_quota_errors=args.ignore_quota_errors):
             for resource_type in BACKUP_RESOURCES:
+                # size of tar member has to be known before its content
+                # is written, so dumps are spooled to disk first
+                fp = tempfile.TemporaryFile()
                 try:
                     logger.info("dumping %s", resource_type)
-                    resources = osbs.dump_resource(resource_type)
-                    t.write_file(resource_type + ".json", json.dumps(resources).encode('ascii'))
+                    base_entry = base['resources'].get(resource_type) if base else None
+                    count, entry = _dump_resource(osbs, resource_type, fp, base=base_entry)
+                    logger.debug("dumped %d %s", count, resource_type)
                 except Exception as e:
+                    fp.close()
                     if args.continue_on_error:
                         logger.warning(
                             "Error during {} backup".format(resource_type), exc_info=True)
                     else:
                         raise e
-
+                else:
+                    dumps.append((resource_type, fp))
+                    manifest['resources'][resource_type] = entry
+                    total += count
+
+        with TarWriter(outfile, dirname, compression=args.compression) as t:
+            t.write_file(BACKUP_MANIFEST, json.dumps(manifest).encode('ascii'))
+            for resource_type, fp in dumps:
+                t.add_file(resource_type + ".json", fp)
+    finally:
+        for _, fp in dumps:
+            fp.close()
+
+    elapsed = max(time.time() - started, 0.001)
+    mib = t.bytes_written / 1024.0 / 1024.0
+    # ru_maxrss is in kilobytes on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    logger.info("backed up %d objects into %.1f MiB in %.1f s (%.1f objects/s, %.2f MiB/s), "
+                "peak memory usage %.1f MiB", total, mib, elapsed, total / elapsed,
+                mib / elapsed, max_rss)
     if not hasattr(outfile, "write"):
         logger.info("backup archive created: %s", outfile)
 
 
-def cmd_restore(args, osbs):
-    if args.BACKUP_ARCHIVE == '-':
-        infile = sys.stdin.buffer if PY3 else sys.stdin
-    else:
-        infile = args.BACKUP_ARCHIVE
-    asciireader = codecs.getreader('ascii')
+def _restore_chain(args, osbs, archives):
+    """
+    restore full backup followed by incremental backups based on each other
 
-    with paused_builds(osbs, quota_name='pause-backup',
-                       ignore_quota_errors=args.ignore_quota_errors):
-        for f in TarReader(infile):
-            resource_type = os.path.basename(f.filename).split('.')[0]
-            if resource_type not in BACKUP_RESOURCES:
-                logger.warning("Unknown resource type for %s, skipping", f.filename)
+    Every object is restored just once, from the newest backup it is in,
+    unless a newer backup records it as deleted.
+
+    :return: tuple, numbers of objects restored and failed
+    """
+    manifests = [_read_backup_manifest(archive) for archive in archives]
+    for i, (archive, manifest) in enumerate(zip(archives, manifests)):
+        if manifest is None:
+            raise OsbsException("%s has no manifest, it can't be part of backup chain" % archive)
+        expected_base = manifests[i - 1]['id'] if i else None
+        if manifest.get('base') != expected_base:
+            raise OsbsException("%s is not based on %s" %
+                                (archive, archives[i - 1] if i else "any backup"))
+
+    succeeded = failed = 0
+    for resource_type in BACKUP_RESOURCES:
+        done = set()
+        for archive, manifest in reversed(list(zip(archives, manifests))):
+            entry = manifest['resources'].get(resource_type)
+            if entry is None:
+                logger.warning("%s has no %s", archive, resource_type)
                 continue
 
-            logger.info("restoring %s", resource_type)
-            osbs.restore_resource(resource_type, json.load(asciireader(f.fileobj)),
-                                  continue_on_error=args.continue_on_error)
-            f.fileobj.close()
+            def newest(objects):
+                for obj in objects:
+                    name = (obj.get('metadata') or {}).get('name')
+                    if name not in done:
+                        done.add(name)
+                        yield obj
+
+            logger.info("restoring %s from %s", resource_type, archive)
+            result = osbs.restore_resource(resource_type,
+                                           newest(_iter_backup_objects(archive, resource_type)),
+                                           continue_on_error=args.continue_on_error,
+                                           jobs=args.jobs)
+            succeeded += result.succeeded
+            failed += result.failed
+            # objects deleted since the previous backup must not be restored from it
+            done.update(entry.get('deleted', []))
+
+    return succeeded, failed
+
 
-    logger.info("backup recovery complete!")
+def cmd_restore(args, osbs):
+    archives = args.BACKUP_ARCHIVE
+    if len(archives) > 1 and '-' in archives:
+        raise OsbsException("backup chain can't be read from standard input")
+
+    started = time.time()
+    succeeded = failed = 0
+    with paused_builds(osbs, quota_name='pause-backup',
+                       ignore_quota_errors=args.ignore_quota_errors):
+        if len(archives) > 1:
+            succeeded, failed = _restore_chain(args, osbs, archives)
+        else:
+            if archives[0] == '-':
+                infile = sys.stdin.buffer if PY3 else sys.stdin
+            else:
+                infile = archives[0]
+
+            # resource types are restored one after another in the order they
+            # were backed up, i.e. the order of BACKUP_RESOURCES
+            for f in TarReader(infile):
+                if os.path.basename(f.filename) == BACKUP_MANIFEST:
+                    manifest = json.loads(f.fileobj.read().decode('utf-8'))
+                    if manifest.get('base'):
+                        logger.warning("restoring incremental backup without the backups "
+                                       "it is based on")
+                    continue
+
+                resource_type = os.path.basename(f.filename).split('.')[0]
+                if resource_type not in BACKUP_RESOURCES:
+                    logger.warning("Unknown resource type for %s, skipping", f.filename)
+                    continue
+
+                logger.info("restoring %s", resource_type)
+                chunks = iter(lambda: f.fileobj.read(RESTORE_READ_SIZE), b'')
+                result = osbs.restore_resource(resource_type, iter_json_items(chunks),
+                                               continue_on_error=args.continue_on_error,
+                                               jobs=args.jobs)
+                f.fileobj.close()
+                succeeded += result.succeeded
+                failed += result.failed
+
+    logger.info("backup recovery complete! restored %d objects, %d failed, in %.1f s",
+                succeeded, failed, time.time() - started)
 
 
 def cmd_print_token_url(args, osbs):
@@ -596,6 +817,9 @@ def cli():
                                     action="store_true")
     list_builds_parser.add_argument("--from-json",
                                     help="fetch builds list from JSON file instead of from server")
+    list_builds_parser.add_argument("--max-results", type=int,
+                                    help="list at most this many builds, in the order "
+                                         "server returns them (not necessarily the newest)")
 
     list_builds_parser.set_defaults(func=cmd_list_builds)
 
@@ -752,7 +976,14 @@ def cli():
                                            help='dump builder data (admin)',
                                            description='create backup of all OSBS data')
     backup_builder.add_argument("-f", "--filename",
-                                help="name of the resulting tar.bz2 file (use - for stdout)")
+                                help="name of the resulting archive (use - for stdout)")
+    backup_builder.add_argument("--compression", choices=sorted(BACKUP_COMPRESSIONS),
+                                default=DEFAULT_BACKUP_COMPRESSION,
+                                help="compression of the archive, default is %(default)s; "
+                                "zstd requires the zstandard module, xz requires Python 3")
+    backup_builder.add_argument("--incremental-from", metavar="BASE_ARCHIVE",
+                                help="only back up objects changed since backup in BASE_ARCHIVE "
+                                "was made, and names of objects deleted since")
     backup_builder.add_argument("--ignore-quota-errors", action='store_true',
                                 help="ignore resourcequota errors")
     backup_builder.add_argument("--continue-on-error", action='store_true',
@@ -762,8 +993,12 @@ def cli():
     restore_builder = subparsers.add_parser(str_on_2_unicode_on_3('restore-builder'),
                                             help='restore builder data (admin)',
                                             description='restore OSBS data from backup')
-    restore_builder.add_argument("BACKUP_ARCHIVE",
-                                 help="name of the tar.bz2 archive to restore (use - for stdin)")
+    restore_builder.add_argument("BACKUP_ARCHIVE", nargs='+',
+                                 help="name of the archive to restore (use - for stdin); "
+                                 "full backup followed by incremental backups based on it "
+                                 "and on each other can be given")
+    restore_builder.add_argument("--jobs", "-j", type=int, default=1,
+                                 help="number of objects to create at once, default is 1")
     restore_builder.add_argument("--continue-on-error", action='store_true',
                                  help="don't stop when restoring a resource fails")
     restore_builder.add_argument("--ignore-quota-errors", action='store_true',
@@ -10,6 +10,7 @@ from __future__ import print_function, absolute_import, unicode_literals
 import sys
 import logging
 
+from osbs.constants import CLI_TABLE_SAMPLE_SIZE
 from osbs.exceptions import OsbsException
 from osbs.utils import run_command
 
@@ -67,7 +68,7 @@ class TableFormatter(object):
         """
         try:
             # +2 is for implicit separator
-            return max([len(x[col]) for x in self.table if x[col]]) + 2
+            return max(len(x[col]) for x in self.table if x[col]) + 2
         except KeyError:
             logger.error("there is no column %r", col)
             raise
@@ -103,6 +104,14 @@ class TablePrinter(TableFormatter):
         self.col_count = len(self.col_list)
         # list of lengths of longest entries in columns
         self.col_longest = self.get_all_longest_col_lengths()
+        self._distribute_free_space()
+
+    def _distribute_free_space(self):
+        """
+        split space left on terminal line between columns
+
+        :return: None
+        """
         self.data_length = sum(self.col_longest.values())
 
         if self.terminal_width > 0:
@@ -197,3 +206,60 @@ class TablePrinter(TableFormatter):
         print(self.header_format_str.format(**self.header_data), file=sys.stderr)
         for row in self.data:
             print(self.format_str.format(**row))
+
+
+class StreamingTablePrinter(TablePrinter):
+    """
+    Print table row by row, as rows come, without keeping them
+
+    Column widths are measured on the header and first sample_size rows,
+    which are held back until then. When a later row does not fit, its
+    column is widened for the rows which follow.
+    """
+    def __init__(self, header, col_list, sample_size=CLI_TABLE_SAMPLE_SIZE):
+        """
+        :param header: dict, column names to display in header
+        :param col_list: list of strs, columns to display
+        :param sample_size: int, number of rows to measure column widths on,
+                            1 to print every row as soon as it's added
+        """
+        TableFormatter.__init__(self, [header])
+        self.col_list = col_list
+        self.sample_size = sample_size
+        self._started = False
+
+    def add(self, row):
+        """
+        print row, or hold it back until column widths are known
+
+        :param row: dict, values of columns
+        :return: None
+        """
+        if not self._started:
+            self.data.append(row)
+            if len(self.data) >= self.sample_size:
+                self.flush()
+            return
+
+        if any(len(row[col]) > self.col_widths[col] - 2 for col in self.col_list):
+            for col in self.col_list:
+                self.col_longest[col] = max(self.col_longest[col], len(row[col]) + 2)
+            self._distribute_free_space()
+            self._count_sizes()
+        print(self.format_str.format(**row))
+
+    def flush(self):
+        """
+        print rows held back, with header if it wasn't printed yet
+
+        :return: None
+        """
+        if not self._started:
+            self.table = [self.header] + self.data
+            self._init()
+            self._count_sizes()
+            self.render()
+            self._started = True
+            self.table = [self.header]
+            self.data = []
+        sys.stdout.flush()
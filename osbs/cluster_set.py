@@ -0,0 +1,169 @@
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Queries run on many OpenShift clusters at once
+"""
+from __future__ import print_function, unicode_literals, absolute_import
+
+from collections import namedtuple
+import logging
+import threading
+import time
+
+from six.moves import http_client
+
+from osbs.api import OSBS
+from osbs.conf import Configuration
+from osbs.constants import CLUSTER_QUERY_TIMEOUT, DEFAULT_CONFIGURATION_FILE
+from osbs.exceptions import OsbsResponseException, OsbsTimeoutException
+
+
+logger = logging.getLogger(__name__)
+
+# results and errors of query, both dicts keyed by cluster name
+ClusterSetResult = namedtuple('ClusterSetResult', ['results', 'errors'])
+
+
+class ClusterSet(object):
+    """
+    Set of OSBS instances, each talking to its own cluster
+
+    Every query is sent to all clusters at once, from a thread per cluster.
+    Clusters which fail or don't answer within the timeout are reported
+    in errors of the result, the others in results.
+    """
+
+    def __init__(self, clusters, timeout=CLUSTER_QUERY_TIMEOUT):
+        """
+        :param clusters: dict, cluster name to OSBS instance
+        :param timeout: float, how long (in seconds) to wait for each cluster
+        """
+        self.clusters = clusters
+        self.timeout = timeout
+
+    @classmethod
+    def from_configuration(cls, sections, conf_file=DEFAULT_CONFIGURATION_FILE,
+                           timeout=CLUSTER_QUERY_TIMEOUT, **kwargs):
+        """
+        create OSBS instance for each section of configuration file
+
+        :param sections: list of strs, configuration sections (cluster names)
+        :param conf_file: str, path to configuration file
+        :param timeout: float, how long (in seconds) to wait for each cluster
+        :param kwargs: keyword arguments for Configuration, same for all sections
+        :return: ClusterSet instance
+        """
+        clusters = {}
+        for section in sections:
+            conf = Configuration(conf_file=conf_file, conf_section=section, **kwargs)
+            clusters[section] = OSBS(conf, conf)
+        return cls(clusters, timeout=timeout)
+
+    def map(self, func, timeout=None):
+        """
+        call func with OSBS instance of every cluster concurrently
+
+        Calls which don't return within timeout are not interrupted, they
+        are left to finish in the background and their results are dropped.
+
+        :param func: callable, taking OSBS instance
+        :param timeout: float, how long (in seconds) to wait, default is
+                        timeout of this ClusterSet
+        :return: ClusterSetResult instance
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        lock = threading.Lock()
+        results = {}
+        errors = {}
+        collected = []
+
+        def call(name, osbs):
+            try:
+                result, error = func(osbs), None
+            except Exception as ex:
+                logger.warning("query on cluster %s failed: %r", name, ex)
+                result, error = None, ex
+
+            with lock:
+                if collected:
+                    logger.debug("dropping late answer from cluster %s", name)
+                elif error is None:
+                    results[name] = result
+                else:
+                    errors[name] = error
+
+        threads = []
+        for name, osbs in self.clusters.items():
+            thread = threading.Thread(target=call, args=(name, osbs),
+                                      name='cluster-%s' % name)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        deadline = time.time() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+
+        with lock:
+            collected.append(True)
+            for name in self.clusters:
+                if name not in results and name not in errors:
+                    logger.error("cluster %s didn't answer in %s seconds", name, timeout)
+                    errors[name] = OsbsTimeoutException(
+                        "cluster %s didn't answer in %s seconds" % (name, timeout))
+
+        return ClusterSetResult(results, errors)
+
+    def list_running_builds(self, timeout=None):
+        """
+        list running builds on all clusters
+
+        :param timeout: float, how long (in seconds) to wait for each cluster
+        :return: ClusterSetResult instance, results are lists of BuildResponse
+        """
+        return self.map(lambda osbs: osbs.list_builds(running=True, summary=True),
+                        timeout=timeout)
+
+    def list_resource_quotas(self, timeout=None):
+        """
+        list resource quotas on all clusters
+
+        :param timeout: float, how long (in seconds) to wait for each cluster
+        :return: ClusterSetResult instance, results are ResourceQuotaList dicts
+        """
+        return self.map(lambda osbs: osbs.list_resource_quotas(), timeout=timeout)
+
+    def get_load_summary(self, timeout=None):
+        """
+        summarize load of all clusters
+
+        :param timeout: float, how long (in seconds) to wait for each cluster
+        :return: ClusterSetResult instance, results are LoadSummary instances
+        """
+        return self.map(lambda osbs: osbs.get_load_summary(), timeout=timeout)
+
+    def get_build(self, build_id, timeout=None):
+        """
+        look up build on all clusters
+
+        Clusters which don't have the build are left out of the result.
+
+        :param build_id: str, name of build
+        :param timeout: float, how long (in seconds) to wait for each cluster
+        :return: ClusterSetResult instance, results are BuildResponse instances
+        """
+        found = self.map(lambda osbs: osbs.get_build(build_id), timeout=timeout)
+        errors = {}
+        for name, error in found.errors.items():
+            if (isinstance(error, OsbsResponseException) and
+                    error.status_code == http_client.NOT_FOUND):
+                continue
+            errors[name] = error
+        return ClusterSetResult(found.results, errors)
@@ -19,7 +19,9 @@ from six.moves.urllib.parse import urljoin
 
 from osbs.constants import (DEFAULT_CONFIGURATION_FILE, DEFAULT_CONFIGURATION_SECTION,
                             GENERAL_CONFIGURATION_SECTION, DEFAULT_NAMESPACE,
-                            DEFAULT_ARRANGEMENT_VERSION)
+                            DEFAULT_ARRANGEMENT_VERSION, HTTP_POOL_MAXSIZE,
+                            BUILD_CACHE_RESYNC_PERIOD, GIT_MIRROR_CACHE_SIZE, REPO_INFO_CACHE_SIZE,
+                            LOAD_SUMMARY_TTL)
 from osbs.exceptions import OsbsValidationException
 from osbs import utils
 
@@ -301,6 +303,65 @@ class Configuration(object):
         return self._get_value("verify_ssl", self.conf_section, "verify_ssl",
                                default=True, is_bool_val=True)
 
+    def get_http_pool_maxsize(self):
+        value = self._get_value("http_pool_maxsize", self.conf_section, "http_pool_maxsize",
+                                default=HTTP_POOL_MAXSIZE)
+        try:
+            return int(value)
+        except ValueError:
+            raise OsbsValidationException("Invalid http_pool_maxsize: %s" % value)
+
+    def get_http_keepalive(self):
+        return self._get_value("http_keepalive", self.conf_section, "http_keepalive",
+                               default=True, is_bool_val=True)
+
+    def get_persist_token(self):
+        return self._get_value("persist_token", self.conf_section, "persist_token",
+                               default=False, is_bool_val=True)
+
+    def get_build_cache(self):
+        return self._get_value("build_cache", self.conf_section, "build_cache",
+                               default=False, is_bool_val=True)
+
+    def get_build_cache_resync_period(self):
+        value = self._get_value("build_cache_resync_period", self.conf_section,
+                                "build_cache_resync_period",
+                                default=BUILD_CACHE_RESYNC_PERIOD)
+        try:
+            return int(value)
+        except ValueError:
+            raise OsbsValidationException("Invalid build_cache_resync_period: %s" % value)
+
+    def get_load_summary_ttl(self):
+        value = self._get_value("load_summary_ttl", self.conf_section, "load_summary_ttl",
+                                default=LOAD_SUMMARY_TTL)
+        try:
+            return int(value)
+        except ValueError:
+            raise OsbsValidationException("Invalid load_summary_ttl: %s" % value)
+
+    def get_git_cache_dir(self):
+        return self._get_value("git_cache_dir", self.conf_section, "git_cache_dir")
+
+    def get_git_cache_size(self):
+        value = self._get_value("git_cache_size", self.conf_section, "git_cache_size",
+                                default=GIT_MIRROR_CACHE_SIZE)
+        try:
+            return int(value)
+        except ValueError:
+            raise OsbsValidationException("Invalid git_cache_size: %s" % value)
+
+    def get_repo_info_cache_dir(self):
+        return self._get_value("repo_info_cache_dir", self.conf_section, "repo_info_cache_dir")
+
+    def get_repo_info_cache_size(self):
+        value = self._get_value("repo_info_cache_size", self.conf_section,
+                                "repo_info_cache_size", default=REPO_INFO_CACHE_SIZE)
+        try:
+            return int(value)
+        except ValueError:
+            raise OsbsValidationException("Invalid repo_info_cache_size: %s" % value)
+
     def get_vendor(self):
         return self._get_value("vendor", self.conf_section, "vendor")
 
@@ -63,9 +63,33 @@ SECRETS_PATH = "/var/run/secrets/atomic-reactor"
 # Backup/restore
 BACKUP_RESOURCES = ('buildconfigs', 'imagestreams', 'builds',)
 
+# compression of backup archives and their file name extensions
+BACKUP_COMPRESSIONS = {
+    'bz2': '.tar.bz2',
+    'gz': '.tar.gz',
+    'xz': '.tar.xz',
+    'zstd': '.tar.zst',
+}
+DEFAULT_BACKUP_COMPRESSION = 'bz2'
+
+# name of the archive member describing the backup, always stored first
+BACKUP_MANIFEST = 'manifest.json'
+
+# how many times restoring an object is retried after conflict, and how long
+# to wait (in seconds, growing linearly) before the attempts
+RESTORE_CONFLICT_RETRIES = 3
+RESTORE_CONFLICT_BACKOFF = 0.5
+
+# size of blocks backup archive members are read in
+RESTORE_READ_SIZE = 65536
+
 CLI_LIST_BUILDS_DEFAULT_COLS = ["name", "status", "image"]
 CLI_WATCH_BUILDS_DEFAULT_COLS = ["changetype", "status", "created", "name"]
 
+# number of rows column widths are measured on, when table is printed as
+# rows come instead of all at once
+CLI_TABLE_SAMPLE_SIZE = 1000
+
 # number of digits used for unique image tags
 RAND_DIGITS = 5
 
@@ -76,6 +100,15 @@ ATOMIC_REACTOR_LOGGING_FMT = \
 REPO_CONFIG_FILE = '.osbs-repo-config'
 ADDITIONAL_TAGS_FILE = 'additional-tags'
 
+# number of commits fetched when reading repository without mirror
+GIT_FETCH_DEPTH = 1
+
+# number of git repository mirrors kept by default
+GIT_MIRROR_CACHE_SIZE = 50
+
+# number of RepoInfo objects for git commits kept by default
+REPO_INFO_CACHE_SIZE = 100
+
 # number of retries for http requests
 HTTP_MAX_RETRIES = 8
 
@@ -86,7 +119,62 @@ HTTP_BACKOFF_FACTOR = 4
 HTTP_RETRIES_STATUS_FORCELIST = [408, 500, 502, 503, 504]
 
 # HTTP methods that we should retry on
-HTTP_RETRIES_METHODS_WHITELIST = ['GET', 'PUT', 'POST', 'DELETE']
+HTTP_RETRIES_METHODS_WHITELIST = ['GET', 'PUT', 'PATCH', 'POST', 'DELETE']
+
+# number of connections kept open in each pooled HTTP session
+HTTP_POOL_MAXSIZE = 10
+
+# longest time (in seconds) to wait before another attempt to update object
+# after conflict
+CONFLICT_RETRY_BACKOFF_MAX = 8
+
+# OAuth tokens with known lifetime are fetched again this many seconds
+# (at most half of their lifetime) before they expire
+OAUTH_TOKEN_REFRESH_MARGIN = 60
+
+# number of consecutive failures after which watching a resource is given up
+WATCH_MAX_RETRIES = 8
+
+# initial and maximal delay (in seconds) before reconnecting a failed watch;
+# the delay doubles with each consecutive failure and is randomized
+WATCH_RETRY_BACKOFF = 0.5
+WATCH_RETRY_BACKOFF_MAX = 30
+
+# watch streams closed without events sooner than this (in seconds) are
+# considered failed; longer quiet streams are reconnected immediately
+WATCH_MIN_DURATION = 1
+
+# number of builds fetched in one request when listing builds
+LIST_PAGE_SIZE = 200
+
+# large annotations left out of builds listed or watched in summary mode
+BUILD_SUMMARY_OMITTED_ANNOTATIONS = ('logs', 'dockerfile', 'rpm-packages')
+
+# number of log lines read from the server ahead of the consumer
+LOGS_READ_AHEAD = 1000
+
+# how long (in seconds) followed log entries of orchestrator and worker
+# builds are held back, so that they can be put in time order
+LOGS_REORDER_WINDOW = 1
+
+# number of builds created at once by create_orchestrator_builds
+BATCH_BUILD_WORKERS = 8
+
+# how often (in seconds) the build cache re-lists all builds
+BUILD_CACHE_RESYNC_PERIOD = 600
+
+# how long (in seconds) ClusterSet waits for each cluster to answer a query
+CLUSTER_QUERY_TIMEOUT = 30
+
+# how long (in seconds) OSBS.get_load_summary remembers the load of cluster
+LOAD_SUMMARY_TTL = 30
+
+# multipliers of Kubernetes quantity suffixes, as used in ResourceQuota
+QUANTITY_SUFFIXES = {
+    'm': 10 ** -3,
+    'k': 10 ** 3, 'M': 10 ** 6, 'G': 10 ** 9, 'T': 10 ** 12, 'P': 10 ** 15, 'E': 10 ** 18,
+    'Ki': 2 ** 10, 'Mi': 2 ** 20, 'Gi': 2 ** 30, 'Ti': 2 ** 40, 'Pi': 2 ** 50, 'Ei': 2 ** 60,
+}
 
 BUILD_TYPE_ORCHESTRATOR = object()
 BUILD_TYPE_WORKER = object()
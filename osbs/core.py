@@ -8,21 +8,30 @@ of the BSD license. See the LICENSE file for details.
 from __future__ import print_function, unicode_literals, absolute_import
 from functools import wraps
 import json
+import math
 import os
 import numbers
 import time
 import base64
+import random
+import re
+import threading
 
 import logging
-from osbs.kerberos_ccache import kerberos_ccache_init
+from osbs.kerberos_ccache import kerberos_ccache_init, kerberos_ccache_forget
 from osbs.build.build_response import BuildResponse
 from osbs.constants import DEFAULT_NAMESPACE, BUILD_FINISHED_STATES, BUILD_RUNNING_STATES
 from osbs.constants import WATCH_MODIFIED, WATCH_DELETED, WATCH_ERROR
 from osbs.constants import (SERVICEACCOUNT_SECRET, SERVICEACCOUNT_TOKEN,
-                            SERVICEACCOUNT_CACRT)
+                            SERVICEACCOUNT_CACRT, HTTP_POOL_MAXSIZE,
+                            OAUTH_TOKEN_REFRESH_MARGIN, CONFLICT_RETRY_BACKOFF_MAX)
+from osbs.constants import (WATCH_MAX_RETRIES, WATCH_RETRY_BACKOFF,
+                            WATCH_RETRY_BACKOFF_MAX, WATCH_MIN_DURATION,
+                            LIST_PAGE_SIZE,
+                            BUILD_SUMMARY_OMITTED_ANNOTATIONS)
 from osbs.exceptions import (OsbsResponseException, OsbsException,
                              OsbsWatchBuildNotFound, OsbsAuthException)
-from osbs.utils import graceful_chain_get
+from osbs.utils import graceful_chain_get, iter_read_ahead, write_token_file
 from requests.exceptions import ConnectionError
 from requests.utils import guess_json_utf
 
@@ -34,6 +43,9 @@ from .http import HttpSession
 
 logger = logging.getLogger(__name__)
 
+# RFC 3339 timestamp prefixed to log lines when requested with timestamps=true
+LOG_TIMESTAMP_RE = re.compile(br'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d{1,9}))?Z$')
+
 
 def check_response(response, log_level=logging.ERROR):
     if response.status_code not in (http_client.OK, http_client.CREATED):
@@ -52,7 +64,10 @@ def retry_on_conflict(func, sleep_seconds=0.5, max_attempts=10):
         last_exception = None
         for attempt in range(max_attempts):
             if attempt != 0:
-                time.sleep(sleep_seconds)
+                # exponential backoff with jitter, so that clients which
+                # conflicted once don't collide again
+                backoff = min(sleep_seconds * 2 ** (attempt - 1), CONFLICT_RETRY_BACKOFF_MAX)
+                time.sleep(random.uniform(backoff / 2, backoff))
 
             logger.debug("attempt %d to call %s", attempt + 1, func.__name__)
             try:
@@ -68,14 +83,257 @@ def retry_on_conflict(func, sleep_seconds=0.5, max_attempts=10):
     return retry
 
 
+class _CurrentResponse(object):
+    """
+    Response read by another thread, which is closed to unblock the reader
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._response = None
+        self.closed = False
+
+    def set(self, response):
+        """
+        :param response: HttpStream being read now
+        :return: bool, whether it should be read, False after close()
+        """
+        with self._lock:
+            if not self.closed:
+                self._response = response
+                return True
+        response.close()
+        return False
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            response, self._response = self._response, None
+        if response is not None:
+            response.close()
+
+
+class WatchState(object):
+    """
+    Bookkeeping of a watch which is reconnected whenever the server closes
+    the stream, shared by the blocking and the asyncio client (which do the
+    requests themselves)
+
+    For every connection, the client calls connect() for its query, passes
+    each received event through event(), and exceptions through failed().
+    When gone is set afterwards, current state has to be listed and passed
+    to relisted(). Then it waits reconnect_delay() seconds.
+    """
+
+    def __init__(self, resource_version=None, deadline=None):
+        """
+        :param resource_version: str, resourceVersion to start watching from
+        :param deadline: float, time (as returned by time.time()) to stop at
+        """
+        self.resource_version = resource_version
+        self.deadline = deadline
+        self.attempt = 0
+        self.failures = 0
+        self.gone = False
+        self._received = False
+        self._failed = False
+        self._started = None
+
+    def connect(self, request_args):
+        """
+        :param request_args: dict, query parameters given by the caller
+        :return: dict, query parameters for next connection, or None when
+                 deadline has passed
+        """
+        query = dict(request_args)
+        if self.deadline is not None:
+            remaining = self.deadline - time.time()
+            if remaining <= 0:
+                return None
+            query['timeoutSeconds'] = int(math.ceil(remaining))
+        if self.resource_version is not None:
+            query['resourceVersion'] = self.resource_version
+
+        self.gone = False
+        self._received = False
+        self._failed = False
+        self._started = time.time()
+        return query
+
+    def event(self, changetype, obj):
+        """
+        :return: bool, whether event should be delivered; False when the
+                 resource version is gone and the stream should be left
+        """
+        if changetype == WATCH_ERROR and obj.get('code') == http_client.GONE:
+            logger.debug("resource version %s is gone", self.resource_version)
+            self.gone = True
+            return False
+
+        version = obj.get('metadata', {}).get('resourceVersion')
+        if version is not None:
+            self.resource_version = version
+        self._received = True
+        return True
+
+    def failed(self, ex):
+        """
+        :param ex: OsbsException, raised while watching
+        :return: bool, whether to reconnect; False when ex should be re-raised
+        """
+        if isinstance(ex, OsbsResponseException):
+            if ex.status_code == http_client.GONE:
+                self.gone = True
+                return True
+            if ex.status_code < http_client.INTERNAL_SERVER_ERROR:
+                return False
+
+        self._failed = True
+        self.failures += 1
+        if self.failures > WATCH_MAX_RETRIES:
+            return False
+        logger.warning("watch failed: %r", ex)
+        return True
+
+    def relisted(self, resource_version, items):
+        """
+        :param resource_version: str, resourceVersion of the listing
+        :param items: list of objects listed, reported as modified
+        """
+        self.resource_version = resource_version
+        if items:
+            self._received = True
+
+    def reconnect_delay(self):
+        """
+        :return: float, seconds to wait before reconnecting; delay grows only
+                 after errors or streams closed right after they were opened
+        """
+        if self._received:
+            self.attempt = 0
+            self.failures = 0
+            logger.debug("connection closed, reconnecting from resource version %s",
+                         self.resource_version)
+            return 0
+
+        if (not self._failed and self.resource_version is not None and
+                time.time() - self._started >= WATCH_MIN_DURATION):
+            # quiet stream closed by the server (timeout), nothing is wrong
+            self.attempt = 0
+            logger.debug("connection closed without events, reconnecting from "
+                         "resource version %s", self.resource_version)
+            return 0
+
+        self.attempt += 1
+        delay = self.retry_delay(self.attempt)
+        logger.debug("no events received, reconnecting in %.1fs", delay)
+        return delay
+
+    @staticmethod
+    def retry_delay(attempt):
+        """
+        :param attempt: int, number of reconnects without receiving events
+        :return: float, seconds to wait before reconnecting (exponential
+                 backoff with jitter)
+        """
+        backoff = min(WATCH_RETRY_BACKOFF * 2 ** (attempt - 1), WATCH_RETRY_BACKOFF_MAX)
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+
 # TODO: error handling: create function which handles errors in response object
+class LogPosition(object):
+    """
+    Position in build log, so that streaming can be resumed after the
+    connection is closed without repeating or losing lines
+
+    The position is the timestamp of the last line delivered and number of
+    lines delivered with that timestamp. Lines without timestamp share the
+    one of the line before them; when there are no timestamps at all, the
+    position is simply number of lines delivered.
+    """
+
+    def __init__(self):
+        self.timestamp = ()
+        self.count = 0
+
+    @staticmethod
+    def split_timestamp(line):
+        """
+        :param line: bytes, log line
+        :return: tuple, timestamp as (seconds, nanoseconds) or None,
+                 and the line without timestamp
+        """
+        prefix, sep, rest = line.partition(b' ')
+        match = LOG_TIMESTAMP_RE.match(prefix) if sep else None
+        if not match:
+            return None, line
+
+        seconds, fraction = match.groups()
+        return (seconds, int((fraction or b'').ljust(9, b'0'))), rest
+
+    def since_time(self):
+        """
+        :return: str, value of sinceTime to resume streaming at, or None
+                 if the log has to be read from the start
+        """
+        if not self.timestamp:
+            return None
+
+        # sinceTime has precision of seconds, the rest is skipped by filter()
+        return self.timestamp[0].decode('ascii') + 'Z'
+
+    def filter(self, lines):
+        """
+        strip timestamps from lines and skip those delivered already
+
+        :param lines: iterable of bytes, log lines as sent by the server
+        :return: generator of bytes
+        """
+        accept = self.line_filter()
+        for line in lines:
+            line = accept(line)
+            if line is not None:
+                yield line
+
+    def line_filter(self):
+        """
+        filter for lines of one response, for callers which cannot pass
+        them to filter() as an iterable
+
+        :return: function taking log line as sent by the server and
+                 returning it without timestamp, or None to skip it
+        """
+        resume_at = (self.timestamp, self.count)
+        state = {'resuming': resume_at != ((), 0), 'timestamp': (), 'count': 0}
+
+        def accept(line):
+            line_timestamp, line = self.split_timestamp(line)
+            if line_timestamp is not None and line_timestamp != state['timestamp']:
+                state['timestamp'] = line_timestamp
+                state['count'] = 0
+            state['count'] += 1
+            position = (state['timestamp'], state['count'])
+
+            if state['resuming']:
+                if position <= resume_at:
+                    return None
+                state['resuming'] = False
+
+            self.timestamp, self.count = position
+            return line
+
+        return accept
+
+
 class Openshift(object):
     def __init__(self, openshift_api_url, openshift_api_version, openshift_oauth_url,
                  k8s_api_url=None,
                  verbose=False, username=None, password=None, use_kerberos=False,
                  kerberos_keytab=None, kerberos_principal=None, kerberos_ccache=None,
                  client_cert=None, client_key=None, verify_ssl=True, use_auth=None,
-                 token=None, namespace=DEFAULT_NAMESPACE):
+                 token=None, namespace=DEFAULT_NAMESPACE,
+                 http_pool_maxsize=HTTP_POOL_MAXSIZE, http_keepalive=True,
+                 token_file=None):
         self.os_api_url = openshift_api_url
         self.k8s_api_url = k8s_api_url
         self._os_api_version = openshift_api_version
@@ -83,8 +341,11 @@ class Openshift(object):
         self.namespace = namespace
         self.verbose = verbose
         self.verify_ssl = verify_ssl
-        self._con = HttpSession(verbose=self.verbose)
+        self._con = HttpSession(verbose=self.verbose, pool_maxsize=http_pool_maxsize,
+                                keepalive=http_keepalive)
         self.retries_enabled = True
+        # number of times a watch had to be re-established
+        self.watch_reconnects = 0
 
         # auth stuff
         self.use_kerberos = use_kerberos
@@ -96,6 +357,15 @@ class Openshift(object):
         self.kerberos_principal = kerberos_principal
         self.kerberos_ccache = kerberos_ccache
         self.token = token
+        # file to store tokens fetched from OAuth server in
+        self.token_file = token_file
+        # time when token fetched from OAuth server should be fetched again,
+        # None when its lifetime is not known
+        self.token_refresh_at = None
+        self._token_fetched = False
+        self._token_lock = threading.Lock()
+        # set when server rejects merge-PATCH requests
+        self.merge_patch_unsupported = False
 
         self.ca = None
         auth_credentials_provided = bool(use_kerberos or
@@ -134,6 +404,12 @@ class Openshift(object):
             logger.info("Using service account's auth token")
             return True
 
+    def close(self):
+        """
+        close pooled connections to the server
+        """
+        self._con.close()
+
     @property
     def os_oauth_url(self):
         return self._os_oauth_url
@@ -155,8 +431,7 @@ class Openshift(object):
     def _request_args(self, with_auth=True, **kwargs):
         headers = kwargs.pop("headers", {})
         if with_auth and self.use_auth:
-            if self.token is None:
-                self.get_oauth_token()
+            self.ensure_token()
             if self.token:
                 headers["Authorization"] = "Bearer %s" % self.token
             else:
@@ -180,29 +455,78 @@ class Openshift(object):
 
         return headers, kwargs
 
+    def _send(self, method, url, with_auth=True, **kwargs):
+        headers, request_kwargs = self._request_args(with_auth, **kwargs)
+        token = self.token
+        response = method(url, headers=headers, verify_ssl=self.verify_ssl,
+                          retries_enabled=self.retries_enabled, **request_kwargs)
+        if (with_auth and self.use_auth and self.can_fetch_token() and
+                response.status_code == http_client.UNAUTHORIZED):
+            # token was revoked or expired sooner than expected, try once more
+            # with new one
+            logger.debug("token rejected, fetching new one")
+            if hasattr(response, 'close'):
+                response.close()
+            self.invalidate_token(token)
+            headers, request_kwargs = self._request_args(with_auth, **kwargs)
+            response = method(url, headers=headers, verify_ssl=self.verify_ssl,
+                              retries_enabled=self.retries_enabled, **request_kwargs)
+        return response
+
     def _post(self, url, with_auth=True, **kwargs):
-        headers, kwargs = self._request_args(with_auth, **kwargs)
-        return self._con.post(
-            url, headers=headers, verify_ssl=self.verify_ssl,
-            retries_enabled=self.retries_enabled, **kwargs)
+        return self._send(self._con.post, url, with_auth, **kwargs)
 
     def _get(self, url, with_auth=True, **kwargs):
-        headers, kwargs = self._request_args(with_auth, **kwargs)
-        return self._con.get(
-            url, headers=headers, verify_ssl=self.verify_ssl,
-            retries_enabled=self.retries_enabled, **kwargs)
+        return self._send(self._con.get, url, with_auth, **kwargs)
 
     def _put(self, url, with_auth=True, **kwargs):
-        headers, kwargs = self._request_args(with_auth, **kwargs)
-        return self._con.put(
-            url, headers=headers, verify_ssl=self.verify_ssl,
-            retries_enabled=self.retries_enabled, **kwargs)
+        return self._send(self._con.put, url, with_auth, **kwargs)
+
+    def _patch(self, url, with_auth=True, **kwargs):
+        return self._send(self._con.patch, url, with_auth, **kwargs)
 
     def _delete(self, url, with_auth=True, **kwargs):
-        headers, kwargs = self._request_args(with_auth, **kwargs)
-        return self._con.delete(
-            url, headers=headers, verify_ssl=self.verify_ssl,
-            retries_enabled=self.retries_enabled, **kwargs)
+        return self._send(self._con.delete, url, with_auth, **kwargs)
+
+    def can_fetch_token(self):
+        """
+        :return: bool, whether new token can be fetched from OAuth server
+                 when the current one is rejected
+        """
+        return bool(self._token_fetched or self.use_kerberos or
+                    (self.username and self.password))
+
+    def _token_needs_refresh(self):
+        if self.token is None:
+            return True
+        return self.token_refresh_at is not None and time.time() >= self.token_refresh_at
+
+    def ensure_token(self):
+        """
+        get OAuth token, fetching it only when there is none yet or when
+        it is about to expire
+
+        Only one thread fetches the token, others wait for it.
+
+        :return: str, token
+        """
+        if self._token_needs_refresh():
+            with self._token_lock:
+                if self._token_needs_refresh():
+                    return self.get_oauth_token()
+        return self.token
+
+    def invalidate_token(self, token):
+        """
+        forget token rejected by the server, so that new one is fetched
+
+        :param token: str, token which was rejected; when it was replaced
+                      by another thread meanwhile, nothing is done
+        """
+        with self._token_lock:
+            if self.token == token:
+                self.token = None
+                self.token_refresh_at = None
 
     def get_oauth_token(self):
         url = self.os_oauth_url + "?response_type=token&client_id=openshift-challenging-client"
@@ -222,6 +546,15 @@ class Openshift(object):
                                          ccache_file=self.kerberos_ccache)
 
                 r = self._get(url, with_auth=False, allow_redirects=False, kerberos_auth=True)
+                if self.kerberos_keytab and r.status_code == http_client.UNAUTHORIZED:
+                    # ticket remembered as valid may have been destroyed meanwhile
+                    logger.debug("kerberos authentication failed, renewing TGT")
+                    kerberos_ccache_forget(self.kerberos_principal,
+                                           ccache_file=self.kerberos_ccache)
+                    kerberos_ccache_init(self.kerberos_principal, self.kerberos_keytab,
+                                         ccache_file=self.kerberos_ccache)
+                    r = self._get(url, with_auth=False, allow_redirects=False,
+                                  kerberos_auth=True)
             else:
                 logger.debug("using identity authentication")
                 r = self._get(url, with_auth=False, allow_redirects=False)
@@ -240,6 +573,18 @@ class Openshift(object):
         logger.debug("fragment is '%s'", fragment)
         parsed_fragment = parse_qs(fragment)
         self.token = parsed_fragment['access_token'][0]
+        self._token_fetched = True
+        self.token_refresh_at = None
+        if 'expires_in' in parsed_fragment:
+            expires_in = int(parsed_fragment['expires_in'][0])
+            margin = min(OAUTH_TOKEN_REFRESH_MARGIN, expires_in / 2)
+            self.token_refresh_at = time.time() + expires_in - margin
+
+        if self.token_file:
+            try:
+                write_token_file(self.token_file, self.token)
+            except (IOError, OSError) as ex:
+                logger.warning("cannot store token in %s: %r", self.token_file, ex)
         return self.token
 
     def get_user(self, username="~"):
@@ -410,32 +755,50 @@ class Openshift(object):
         raise OsbsResponseException("New BuildConfig instance not found",
                                     http_client.NOT_FOUND)
 
-    def stream_logs(self, build_id):
+    def stream_logs(self, build_id, read_ahead=0):
         """
         stream logs from build
 
         :param build_id: str
+        :param read_ahead: int, number of lines read from the server ahead of
+                           the consumer in a background thread, 0 to read
+                           them only when asked for; the thread is started
+                           by the first line asked for and stopped when the
+                           returned generator is closed
         :return: iterator
         """
-        kwargs = {'follow': 1}
+        if not read_ahead:
+            return self._stream_log_lines(build_id)
 
+        current = _CurrentResponse()
+        return iter_read_ahead(self._stream_log_lines(build_id, current), read_ahead,
+                               close=current.close)
+
+    def _stream_log_lines(self, build_id, current=None):
         # If connection is closed within this many seconds, give up:
         min_idle_timeout = 60
 
         # Stream logs, but be careful of the connection closing
         # due to idle timeout. In that case, try again until the
         # call returns more quickly than a reasonable timeout
-        # would be set to.
+        # would be set to. Lines are requested with timestamps,
+        # so that the stream can be resumed where it ended.
+        position = LogPosition()
         last_activity = time.time()
         while True:
+            kwargs = {'follow': 1, 'timestamps': 'true'}
+            since_time = position.since_time()
+            if since_time:
+                kwargs['sinceTime'] = since_time
             buildlogs_url = self._build_url("builds/%s/log/" % build_id,
                                             **kwargs)
             try:
-                response = self._get(buildlogs_url, stream=1,
-                                     headers={'Connection': 'close'})
+                response = self._get(buildlogs_url, stream=1)
+                if current is not None and not current.set(response):
+                    return
                 check_response(response)
 
-                for line in response.iter_lines():
+                for line in position.filter(response.iter_lines()):
                     last_activity = time.time()
                     yield line
             # NOTE1: If self._get causes ChunkedEncodingError, ConnectionError,
@@ -451,17 +814,19 @@ class Openshift(object):
                 if not isinstance(exc.cause, ConnectionError):
                     raise
 
+            if current is not None and current.closed:
+                return
+
             idle = time.time() - last_activity
             logger.debug("connection closed after %ds", idle)
             if idle < min_idle_timeout:
                 # Finish output
                 return
 
-            since = int(idle - 1)
-            logger.debug("fetching logs starting from %ds ago", since)
-            kwargs['sinceSeconds'] = since
+            logger.debug("resuming logs from %s", position.since_time() or "the start")
 
-    def logs(self, build_id, follow=False, build_json=None, wait_if_missing=False):
+    def logs(self, build_id, follow=False, build_json=None, wait_if_missing=False,
+             read_ahead=0):
         """
         provide logs from build
 
@@ -469,6 +834,8 @@ class Openshift(object):
         :param follow: bool, fetch logs as they come?
         :param build_json: dict, to save one get-build query
         :param wait_if_missing: bool, if build doesn't exist, wait
+        :param read_ahead: int, when following, number of lines read ahead
+                           of a slow consumer, see stream_logs()
         :return: None, str or iterator
         """
         # does build exist?
@@ -491,7 +858,7 @@ class Openshift(object):
             return
 
         if follow:
-            return self.stream_logs(build_id)
+            return self.stream_logs(build_id, read_ahead=read_ahead)
 
         buildlogs_url = self._build_url("builds/%s/log/" % build_id)
         response = self._get(buildlogs_url, headers={'Connection': 'close'})
@@ -499,14 +866,37 @@ class Openshift(object):
         return response.content
 
     def list_builds(self, build_config_id=None, koji_task_id=None,
-                    field_selector=None, labels=None):
+                    field_selector=None, labels=None, limit=None, continue_token=None,
+                    stream=False):
         """
         List builds matching criteria
 
         :param build_config_id: str, only list builds created from BuildConfig
         :param koji_task_id: str, only list builds for Koji Task ID
         :param field_selector: str, field selector for query
-        :return: HttpResponse
+        :param limit: int, maximal number of builds in the response
+        :param continue_token: str, metadata.continue of the previous response
+        :param stream: bool, return response before reading its body
+        :return: HttpResponse, or HttpStream if stream is True
+        """
+        query = self._list_builds_query(build_config_id=build_config_id,
+                                        koji_task_id=koji_task_id,
+                                        field_selector=field_selector, labels=labels)
+        if limit is not None:
+            query['limit'] = limit
+
+        if continue_token is not None:
+            query['continue'] = continue_token
+        url = self._build_url("builds/", **query)
+        if stream:
+            return self._get(url, stream=True)
+        return self._get(url)
+
+    @staticmethod
+    def _list_builds_query(build_config_id=None, koji_task_id=None, field_selector=None,
+                           labels=None):
+        """
+        :return: dict, query parameters selecting builds matching criteria
         """
         query = {}
         selector = '{key}={value}'
@@ -528,8 +918,93 @@ class Openshift(object):
 
         if field_selector is not None:
             query['fieldSelector'] = field_selector
-        url = self._build_url("builds/", **query)
-        return self._get(url)
+
+        return query
+
+    def iter_builds(self, build_config_id=None, koji_task_id=None, field_selector=None,
+                    labels=None, page_size=LIST_PAGE_SIZE, max_results=None,
+                    members=None, summary=False):
+        """
+        Iterate over builds matching criteria, fetching page_size of them at once
+
+        Servers not supporting chunked lists return all builds in one response.
+        Responses are decoded incrementally, so only one build at a time is
+        held in memory.
+
+        :param build_config_id: str, only list builds created from BuildConfig
+        :param koji_task_id: str, only list builds for Koji Task ID
+        :param field_selector: str, field selector for query
+        :param labels: dict, only list builds with all of these labels
+        :param page_size: int, number of builds fetched in one request
+        :param max_results: int, stop after this many builds
+        :param members: dict, if set, other members of the list (kind, metadata...)
+                        are stored in it
+        :param summary: bool, leave out large annotations (see summarize_build)
+        :return: generator of dicts, Build JSONs
+        """
+        def list_page(limit, continue_token):
+            return self.list_builds(build_config_id=build_config_id,
+                                    koji_task_id=koji_task_id,
+                                    field_selector=field_selector, labels=labels,
+                                    limit=limit, continue_token=continue_token,
+                                    stream=True)
+
+        builds = self._iter_list(list_page, page_size=page_size, max_results=max_results,
+                                 members=members)
+        if summary:
+            builds = (self.summarize_build(build) for build in builds)
+        return builds
+
+    @staticmethod
+    def summarize_build(build_json):
+        """
+        drop large annotations (logs, Dockerfile, RPM packages) from build,
+        for callers interested only in its name, phase and the like
+
+        Builds are decoded one at a time, so without these annotations only
+        a small part of each of them is kept by the caller.
+
+        :param build_json: dict, Build object, modified in place
+        :return: dict, the same Build object
+        """
+        annotations = (build_json.get('metadata') or {}).get('annotations')
+        if annotations:
+            for key in BUILD_SUMMARY_OMITTED_ANNOTATIONS:
+                annotations.pop(key, None)
+        return build_json
+
+    def _iter_list(self, list_page, page_size=LIST_PAGE_SIZE, max_results=None,
+                   members=None):
+        """
+        Iterate over items of chunked list
+
+        :param list_page: callable, takes limit and continue token, returns HttpStream
+        :param page_size: int, number of items fetched in one request
+        :param max_results: int, stop after this many items
+        :param members: dict, if set, other members of the list object are stored in it
+        :return: generator of dicts, items of the list
+        """
+        continue_token = None
+        count = 0
+        while max_results is None or count < max_results:
+            limit = page_size
+            if max_results is not None:
+                limit = min(limit, max_results - count)
+            page = {}
+            with list_page(limit, continue_token) as response:
+                check_response(response)
+                for item in response.iter_json_items(members=page):
+                    yield item
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        break
+
+            metadata = page.get('metadata') or {}
+            continue_token = metadata.pop('continue', None)
+            if members is not None:
+                members.update(page)
+            if not continue_token:
+                break
 
     def get_build(self, build_id):
         """
@@ -579,40 +1054,122 @@ class Openshift(object):
 
         return response
 
-    def watch_resource(self, resource_type, resource_name=None, **request_args):
-        path = "watch/namespaces/%s/%s/" % (self.namespace, resource_type)
+    def _list_resource(self, resource_type, resource_name=None, **request_args):
+        """
+        get current state of watched resource(s)
+
+        :return: tuple, resourceVersion to resume watching from and list of objects
+        """
+        if resource_name is None:
+            url = self._build_url("%s/" % resource_type, **request_args)
+        else:
+            url = self._build_url("%s/%s/" % (resource_type, resource_name))
+        response = self._get(url)
+        try:
+            check_response(response, log_level=logging.DEBUG)
+        except OsbsResponseException as ex:
+            if resource_name is None or ex.status_code != http_client.NOT_FOUND:
+                raise
+            return None, []
+
+        obj = response.json()
+        items = obj.get('items', []) if resource_name is None else [obj]
+        return graceful_chain_get(obj, 'metadata', 'resourceVersion'), items
+
+    @staticmethod
+    def _watch_path(namespace, resource_type, resource_name=None):
+        path = "watch/namespaces/%s/%s/" % (namespace, resource_type)
         if resource_name is not None:
             path += "%s/" % resource_name
-        url = self._build_url(path, _prepend_namespace=False, **request_args)
+        return path
 
-        while True:
-            with self._get(url, stream=True, headers={'Connection': 'close'}) as response:
-                check_response(response)
-                encoding = None
-                for line in response.iter_lines():
-                    logger.debug(line)
+    def _iter_watch_events(self, response):
+        for line in response.iter_lines():
+            event = self._decode_watch_event(line)
+            if event is not None:
+                yield event
 
-                    if not encoding:
-                        encoding = guess_json_utf(line)
+    @staticmethod
+    def _decode_watch_event(line):
+        """
+        :param line: bytes, line of watch response
+        :return: tuple, (changetype, object), or None if line is not valid event
+        """
+        logger.debug(line)
+        try:
+            j = json.loads(line.decode(guess_json_utf(line)))
+        except ValueError:
+            logger.error("Cannot decode watch event: %s", line)
+            return None
 
-                    try:
-                        j = json.loads(line.decode(encoding))
-                    except ValueError:
-                        logger.error("Cannot decode watch event: %s", line)
-                        continue
+        if 'object' not in j:
+            logger.error("Watch event has no 'object': %s", j)
+            return None
 
-                    if 'object' not in j:
-                        logger.error("Watch event has no 'object': %s", j)
-                        continue
+        if 'type' not in j:
+            logger.error("Watch event has no 'type': %s", j)
+            return None
 
-                    if 'type' not in j:
-                        logger.error("Watch event has no 'type': %s", j)
-                        continue
+        return (j['type'].lower(), j['object'])
 
-                    yield (j['type'].lower(), j['object'])
+    def watch_resource(self, resource_type, resource_name=None, summary=False, deadline=None,
+                       **request_args):
+        """
+        watch resource(s), reconnecting whenever the server closes the stream
+
+        Watching resumes from the last seen resourceVersion so no event is
+        replayed or missed. When that version is too old (410 Gone), current
+        state is listed again and reported as modified objects. Reconnecting
+        is delayed (with exponential backoff) only after errors or when the
+        stream is closed right after it was opened.
+
+        :param resource_type: str, e.g. "builds"
+        :param resource_name: str, watch single resource only
+        :param summary: bool, leave out large annotations of builds (see summarize_build)
+        :param deadline: float, time (as returned by time.time()) to stop
+                         watching at; the server is asked to close the stream
+                         then, so it's kept even when no events come
+        :param request_args: query parameters, e.g. fieldSelector
+        :return: generator of (changetype, object) tuples
+        """
+        for changetype, obj in self._watch_resource(resource_type, resource_name,
+                                                    deadline=deadline, **request_args):
+            if summary and changetype != WATCH_ERROR:
+                obj = self.summarize_build(obj)
+            yield (changetype, obj)
+
+    def _watch_resource(self, resource_type, resource_name=None, deadline=None,
+                        **request_args):
+        path = self._watch_path(self.namespace, resource_type, resource_name)
+        state = WatchState(request_args.pop('resourceVersion', None), deadline=deadline)
+        while True:
+            query = state.connect(request_args)
+            if query is None:
+                return
+            url = self._build_url(path, _prepend_namespace=False, **query)
 
-            logger.debug("connection closed, reconnecting in 30s")
-            time.sleep(30)
+            try:
+                with self._get(url, stream=True, headers={'Connection': 'close'}) as response:
+                    check_response(response)
+                    for changetype, obj in self._iter_watch_events(response):
+                        if not state.event(changetype, obj):
+                            break
+                        yield (changetype, obj)
+            except OsbsException as ex:
+                if not state.failed(ex):
+                    raise
+
+            self.watch_reconnects += 1
+            if state.gone:
+                resource_version, items = self._list_resource(resource_type, resource_name,
+                                                              **request_args)
+                state.relisted(resource_version, items)
+                for obj in items:
+                    yield (WATCH_MODIFIED, obj)
+
+            delay = state.reconnect_delay()
+            if delay:
+                time.sleep(delay)
 
     def wait(self, build_id, states):
         """
@@ -667,6 +1224,78 @@ class Openshift(object):
                 continue
         raise OsbsException("Failed to wait for a build: %s" % build_id)
 
+    def wait_for_builds_to_finish(self, build_ids, label_selector=None, callback=None):
+        """
+        wait for many builds using a single watch of all builds in the namespace
+
+        :param build_ids: list of str, names of builds to wait for
+        :param label_selector: str, only watch builds matching this label selector
+        :param callback: callable, called with build name and Build JSON whenever
+                         phase of one of the builds changes
+        :return: generator of Build JSONs, yielded as each build finishes
+        """
+        pending = set(build_ids)
+        phases = {}
+        query = {}
+        if label_selector is not None:
+            query['labelSelector'] = label_selector
+
+        def update(obj):
+            name = obj.get('metadata', {}).get('name')
+            if name not in pending:
+                return False
+
+            phase = obj.get('status', {}).get('phase')
+            if phase is None:
+                logger.error("build '%s' doesn't have any status", name)
+                return False
+
+            if phases.get(name) != phase:
+                phases[name] = phase
+                logger.info("build '%s' is %s", name, phase)
+                if callback is not None:
+                    callback(name, obj)
+
+            if phase.lower() in BUILD_FINISHED_STATES:
+                pending.discard(name)
+                return True
+            return False
+
+        def list_page(limit, continue_token):
+            page_query = dict(query, limit=limit)
+            if continue_token is not None:
+                page_query['continue'] = continue_token
+            return self._get(self._build_url("builds/", **page_query), stream=True)
+
+        members = {}
+        listed = set()
+        for obj in self._iter_list(list_page, members=members):
+            listed.add(obj.get('metadata', {}).get('name'))
+            if update(obj):
+                yield obj
+
+        missing = pending - listed
+        if missing:
+            raise OsbsWatchBuildNotFound("builds not found: %s" % ", ".join(sorted(missing)))
+
+        if not pending:
+            return
+
+        resource_version = graceful_chain_get(members, 'metadata', 'resourceVersion')
+        if resource_version is not None:
+            query['resourceVersion'] = resource_version
+        for changetype, obj in self.watch_resource("builds", **query):
+            if changetype == WATCH_DELETED:
+                name = obj.get('metadata', {}).get('name')
+                if name in pending:
+                    raise OsbsWatchBuildNotFound("build '%s' was deleted during wait" % name)
+                continue
+
+            if update(obj):
+                yield obj
+                if not pending:
+                    return
+
     def wait_for_build_to_get_scheduled(self, build_id):
         build_response = self.wait(build_id, BUILD_FINISHED_STATES + BUILD_RUNNING_STATES)
         return build_response
@@ -705,20 +1334,49 @@ class Openshift(object):
         check_response(response)
         return response
 
-    def update_labels_on_build(self, build_id, labels):
-        return self.adjust_attributes_on_object('builds', build_id,
-                                                'labels', labels,
+    def merge_attributes_on_object(self, collection, name, things, values):
+        """
+        update labels or annotations on object using single merge-PATCH
+        request, so that the object doesn't have to be fetched first and
+        there are no conflicts with other updates
+
+        When the server does not support merge-PATCH,
+        adjust_attributes_on_object() is used instead.
+
+        :param collection: str, object collection e.g. 'builds'
+        :param name: str, name of object
+        :param things: str, 'labels' or 'annotations'
+        :param values: dict, values to set
+        :return: HttpResponse
+        """
+        if not self.merge_patch_unsupported:
+            url = self._build_url("%s/%s" % (collection, name))
+            patch = {'metadata': {things: values}}
+            response = self._patch(url, data=json.dumps(patch),
+                                   headers={"Content-Type": "application/merge-patch+json"})
+            if response.status_code not in (http_client.METHOD_NOT_ALLOWED,
+                                            http_client.UNSUPPORTED_MEDIA_TYPE):
+                check_response(response)
+                return response
+
+            logger.info("merge-PATCH not supported (%d), using GET and PUT",
+                        response.status_code)
+            self.merge_patch_unsupported = True
+
+        return self.adjust_attributes_on_object(collection, name, things, values,
                                                 self._update_metadata_things)
 
+    def update_labels_on_build(self, build_id, labels):
+        return self.merge_attributes_on_object('builds', build_id, 'labels', labels)
+
     def set_labels_on_build(self, build_id, labels):
         return self.adjust_attributes_on_object('builds', build_id,
                                                 'labels', labels,
                                                 self._replace_metadata_things)
 
     def update_labels_on_build_config(self, build_config_id, labels):
-        return self.adjust_attributes_on_object('buildconfigs', build_config_id,
-                                                'labels', labels,
-                                                self._update_metadata_things)
+        return self.merge_attributes_on_object('buildconfigs', build_config_id,
+                                               'labels', labels)
 
     def set_labels_on_build_config(self, build_config_id, labels):
         return self.adjust_attributes_on_object('buildconfigs', build_config_id,
@@ -733,9 +1391,8 @@ class Openshift(object):
         :param annotations: dict, annotations to set
         :return:
         """
-        return self.adjust_attributes_on_object('builds', build_id,
-                                                'annotations', annotations,
-                                                self._update_metadata_things)
+        return self.merge_attributes_on_object('builds', build_id,
+                                               'annotations', annotations)
 
     def set_annotations_on_build(self, build_id, annotations):
         return self.adjust_attributes_on_object('builds', build_id,
@@ -870,6 +1527,26 @@ class Openshift(object):
         check_response(response)
         return response
 
+    def iter_resource(self, resource_type, page_size=LIST_PAGE_SIZE, members=None):
+        """
+        Iterate over all objects of resource type, fetching page_size of them at once
+
+        :param resource_type: str, e.g. builds
+        :param page_size: int, number of objects fetched in one request
+        :param members: dict, if set, other members of the list (kind, metadata...)
+                        are stored in it
+        :return: generator of dicts, objects
+        """
+        def list_page(limit, continue_token):
+            query = {}
+            if limit:
+                query['limit'] = limit
+            if continue_token is not None:
+                query['continue'] = continue_token
+            return self._get(self._build_url(resource_type, **query), stream=True)
+
+        return self._iter_list(list_page, page_size=page_size, members=members)
+
     def restore_resource(self, resource_type, resource):
         url = self._build_url("%s" % resource_type)
         response = self._post(url, data=json.dumps(resource),
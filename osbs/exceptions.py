@@ -87,3 +87,7 @@ class OsbsOrchestratorNotEnabled(OsbsValidationException):
 
 class OsbsWatchBuildNotFound(OsbsException):
     """ watch stream ended and build was not found """
+
+
+class OsbsTimeoutException(OsbsException):
+    """ cluster didn't answer in time """
@@ -11,16 +11,19 @@ abstraction on top of http api calls
 
 from __future__ import print_function, absolute_import, unicode_literals
 
+import codecs
 import sys
 import json
 import logging
+import threading
 from six.moves import http_client
+from six.moves.urllib.parse import urlparse
 
 
 from osbs.exceptions import OsbsException, OsbsNetworkException, OsbsResponseException
 from osbs.constants import (
     HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_RETRIES_STATUS_FORCELIST,
-    HTTP_RETRIES_METHODS_WHITELIST)
+    HTTP_RETRIES_METHODS_WHITELIST, HTTP_POOL_MAXSIZE)
 
 import requests
 from requests.adapters import HTTPAdapter
@@ -38,9 +41,193 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 logger = logging.getLogger(__name__)
 
 
+def create_session(retries_enabled=True, pool_maxsize=HTTP_POOL_MAXSIZE):
+    """
+    create requests.Session with retry adapters mounted
+
+    :param retries_enabled: bool, retry failed requests
+    :param pool_maxsize: int, number of connections to keep open per host
+    :return: requests.Session
+    """
+    session = requests.Session()
+    if retries_enabled:
+        retry = Retry(
+            total=HTTP_MAX_RETRIES,
+            backoff_factor=HTTP_BACKOFF_FACTOR,
+            status_forcelist=HTTP_RETRIES_STATUS_FORCELIST,
+            method_whitelist=HTTP_RETRIES_METHODS_WHITELIST
+        )
+    else:
+        retry = 0
+
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, HTTPAdapter(max_retries=retry, pool_maxsize=pool_maxsize))
+    return session
+
+
+class _JsonReader(object):
+    """
+    Read JSON values one by one from document split into chunks
+
+    Only the part of the document not decoded yet is kept in memory. When a
+    value is incomplete, at least as much input as is buffered already is
+    read before trying to decode it again, so large values spanning many
+    chunks are decoded in time linear to their size.
+    """
+
+    WHITESPACE = ' \t\r\n'
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read(self, size=1):
+        """
+        append chunks to buffer until at least size characters are not decoded yet
+
+        :param size: int, number of characters wanted
+        :return: bool, False at the end of input
+        """
+        pending = []
+        available = len(self._buffer) - self._pos
+        while not self._eof and (not pending or available < size):
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._eof = True
+                chunk = b''
+
+            text = self._text_decoder.decode(chunk, final=self._eof)
+            if text:
+                pending.append(text)
+                available += len(text)
+
+        if not pending:
+            return False
+
+        # drop decoded input while joining the new one
+        pending.insert(0, self._buffer[self._pos:])
+        self._buffer = ''.join(pending)
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+        :return: str, next non-whitespace character, or '' at the end of input
+        """
+        while True:
+            while (self._pos < len(self._buffer) and
+                   self._buffer[self._pos] in self.WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ''
+
+    def expect(self, chars):
+        """
+        consume next non-whitespace character, which must be one of chars
+
+        :return: str, the character
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("Expecting one of %r at position %d of JSON document, got %r" %
+                             (chars, self._pos, char))
+        self._pos += 1
+        return char
+
+    def value(self):
+        """
+        :return: next JSON value
+        """
+        self.peek()
+        while True:
+            available = len(self._buffer) - self._pos
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                # value may be incomplete, try again with (twice) more data
+                if self._read(2 * available):
+                    continue
+                raise
+
+            # number at the end of buffer may continue in next chunk
+            if end == len(self._buffer) and self._read(available + 1):
+                continue
+
+            self._pos = end
+            return value
+
+
+def iter_json_items(chunks, key='items', members=None):
+    """
+    Decode JSON object incrementally, yielding elements of one of its arrays
+
+    Memory needed is bounded by the size of the largest element, not by the
+    size of the whole document.
+
+    :param chunks: iterable of bytes, UTF-8 encoded JSON object
+    :param key: str, name of member holding the array
+    :param members: dict, if set, other members of the object are stored in it
+    :return: generator of decoded array elements
+    """
+    reader = _JsonReader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            value = reader.value()
+            if members is not None and name != key:
+                members[name] = value
+
+        if reader.expect(',}') == '}':
+            break
+
+    # read until the end so there's no unread data left in the response
+    if reader.peek():
+        raise ValueError("Extra data after JSON document")
+
+
 class HttpSession(object):
-    def __init__(self, verbose=False):
+    """
+    Long-lived pool of requests sessions
+
+    A session (and therefore its connection pool) is shared by all requests
+    going to the same host with the same TLS settings, so subsequent calls
+    don't have to go through TCP and TLS handshake again. Sessions are
+    created lazily and kept until close() is called.
+    """
+
+    def __init__(self, verbose=False, pool_maxsize=HTTP_POOL_MAXSIZE, keepalive=True):
+        """
+        :param verbose: bool, log more
+        :param pool_maxsize: int, number of connections to keep open per host
+        :param keepalive: bool, keep connections open between requests
+        """
         self.verbose = verbose
+        self.pool_maxsize = pool_maxsize
+        self.keepalive = keepalive
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
 
     def get(self, url, **kwargs):
         return self.request(url, "get", **kwargs)
@@ -51,12 +238,43 @@ class HttpSession(object):
     def put(self, url, **kwargs):
         return self.request(url, "put", **kwargs)
 
+    def patch(self, url, **kwargs):
+        return self.request(url, "patch", **kwargs)
+
     def delete(self, url, **kwargs):
         return self.request(url, "delete", **kwargs)
 
+    def get_session(self, url, verify_ssl=True, ca=None, client_cert=None, client_key=None,
+                    retries_enabled=True, **kwargs):
+        """
+        return pooled requests.Session suitable for given request
+
+        :param url: str, URL of the request
+        :return: requests.Session
+        """
+        parsed_url = urlparse(url)
+        key = (parsed_url.scheme, parsed_url.netloc, verify_ssl, ca,
+               client_cert, client_key, retries_enabled)
+        with self._sessions_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                logger.debug("creating new session for %s://%s",
+                             parsed_url.scheme, parsed_url.netloc)
+                session = create_session(retries_enabled=retries_enabled,
+                                         pool_maxsize=self.pool_maxsize)
+                self._sessions[key] = session
+
+        return session
+
     def request(self, url, *args, **kwargs):
         try:
-            stream = HttpStream(url, *args, verbose=self.verbose, **kwargs)
+            if not self.keepalive:
+                headers = kwargs.get('headers') or {}
+                headers.setdefault('Connection', 'close')
+                kwargs['headers'] = headers
+
+            session = self.get_session(url, **kwargs)
+            stream = HttpStream(url, *args, verbose=self.verbose, session=session, **kwargs)
             if kwargs.get('stream', False):
                 return stream
 
@@ -72,6 +290,23 @@ class HttpSession(object):
         except Exception as ex:
             raise OsbsException(cause=ex, traceback=sys.exc_info()[2])
 
+    def close(self):
+        """
+        close all pooled sessions and their connections
+        """
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 
 class HttpStream(object):
     """
@@ -88,34 +323,30 @@ class HttpStream(object):
     def __init__(self, url, method, data=None, kerberos_auth=False,
                  allow_redirects=True, verify_ssl=True, ca=None, use_json=False,
                  headers=None, stream=False, username=None, password=None,
-                 client_cert=None, client_key=None, verbose=False, retries_enabled=True):
+                 client_cert=None, client_key=None, verbose=False, retries_enabled=True,
+                 session=None):
         self.finished = False  # have we read all data?
         self.closed = False    # have we destroyed curl resources?
 
         self.status_code = 0
         self.headers = None
 
-        retry = Retry(
-            total=HTTP_MAX_RETRIES,
-            backoff_factor=HTTP_BACKOFF_FACTOR,
-            status_forcelist=HTTP_RETRIES_STATUS_FORCELIST,
-            method_whitelist=HTTP_RETRIES_METHODS_WHITELIST
-        )
-        self.session = requests.Session()
-        if retries_enabled:
-            self.session.mount('http://', HTTPAdapter(max_retries=retry))
-            self.session.mount('https://', HTTPAdapter(max_retries=retry))
+        # when no (pooled) session is provided, use a private one
+        self._own_session = session is None
+        if self._own_session:
+            session = create_session(retries_enabled=retries_enabled)
+        self.session = session
 
         self.url = url
         headers = headers or {}
         method = method.lower()
 
-        if method not in ['post', 'get', 'put', 'delete']:
+        if method not in ['post', 'get', 'put', 'patch', 'delete']:
             raise RuntimeError("Unsupported method '%s' for curl call!" % method)
 
         args = {}
 
-        if method in ['post', 'put']:
+        if method in ['post', 'put', 'patch']:
             headers['Expect'] = ''
 
         if not verify_ssl:
@@ -161,6 +392,16 @@ class HttpStream(object):
     def iter_chunks(self):
         return self.req.iter_content(None)
 
+    def iter_json_items(self, key='items', members=None):
+        """
+        decode JSON object in response incrementally, see iter_json_items()
+
+        :param key: str, name of member holding array to iterate over
+        :param members: dict, if set, other members of the object are stored in it
+        :return: generator of decoded array elements
+        """
+        return iter_json_items(self.iter_chunks(), key=key, members=members)
+
     def iter_lines(self):
         kwargs = {
             # OpenShift does not respond with any encoding value.
@@ -179,13 +420,17 @@ class HttpStream(object):
         except (requests.exceptions.ChunkedEncodingError,
                 requests.exceptions.ConnectionError,
                 http_client.IncompleteRead):
-            raise StopIteration
+            return
 
     def close(self):
         if not self.closed:
             logger.debug("cleaning up")
             if hasattr(self, 'req'):
+                # release the connection back to the pool
+                self.req.close()
                 del self.req
+            if getattr(self, '_own_session', False):
+                self.session.close()
         self.closed = True
 
     def __del__(self):
@@ -12,11 +12,27 @@ import os
 import logging
 import datetime
 import subprocess
+import threading
+from collections import Counter
 
 from osbs.exceptions import OsbsException
 
 logger = logging.getLogger(__name__)
 
+# TGT is renewed when it's valid for less than this
+TGT_MIN_VALIDITY = datetime.timedelta(hours=1)
+
+# expiration of valid TGTs seen in credential caches, keyed by principal and
+# ccache file, so that klist does not have to be run on every token fetch
+_tgt_expires = {}
+# lock per principal and ccache file, held while the ccache is inspected and
+# renewed; _tgt_lock is only held to look up (or create) these locks
+_tgt_locks = {}
+_tgt_lock = threading.Lock()
+
+# number of times each command was run, e.g. subprocess_calls['klist']
+subprocess_calls = Counter()
+
 KLIST_TGT_RE = (r"\d\d/\d\d/\d{2,4}"
                 r" +"
                 r"\d\d:\d\d:\d\d"
@@ -42,6 +58,7 @@ def run(cmd, extraenv=None):
         env.update(extraenv)
 
     logger.debug("Subprocess: %s", ' '.join(cmd))
+    subprocess_calls[cmd[0]] += 1
     # universal_newlines=True causes stdout/stderr to be strings (not bytes) in py3
     p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
                          universal_newlines=True)
@@ -50,44 +67,87 @@ def run(cmd, extraenv=None):
     return p.returncode, stdout, stderr
 
 
+def _klist_tgt_expires(env):
+    """
+    :return: datetime, expiration of TGT in credential cache, or None if
+             there's no TGT
+    """
+    rc, klist, _ = run(["klist"], extraenv=env)
+    if rc != 0:
+        return None
+
+    expires = None
+    for line in klist.splitlines():
+        m = re.match(KLIST_TGT_RE, line)
+        if m:
+            year = m.group("year")
+            if len(year) == 2:
+                year = "20" + year
+
+            line_expires = datetime.datetime(
+                int(year), int(m.group("month")), int(m.group("day")),
+                int(m.group("hour")), int(m.group("minute")), int(m.group("second"))
+            )
+            expires = max(expires or line_expires, line_expires)
+
+    return expires
+
+
+def _tgt_valid(expires):
+    return expires is not None and expires - datetime.datetime.now() > TGT_MIN_VALIDITY
+
+
+def _tgt_key_lock(key):
+    with _tgt_lock:
+        return _tgt_locks.setdefault(key, threading.Lock())
+
+
 def kerberos_ccache_init(principal, keytab_file, ccache_file=None):
     """
     Checks whether kerberos credential cache has ticket-granting ticket that is valid for at least
     an hour.
 
     Default ccache is used unless ccache_file is provided. In that case, KRB5CCNAME environment
-    variable is set to the value of ccache_file if we successfully obtain the ticket.
+    variable is set to the value of ccache_file if we successfully obtain the ticket. The
+    environment is shared by the whole process, so callers using different ccache files from
+    concurrent threads will overwrite each other's KRB5CCNAME.
+
+    Expiration of valid ticket is remembered, so the credential cache is not
+    inspected again until the ticket is about to expire. Only one thread
+    checks (and renews) the ticket of each principal and ccache file at a time.
     """
-    tgt_valid = False
     env = {"LC_ALL": "C"}  # klist uses locales to format date on RHEL7+
     if ccache_file:
         env["KRB5CCNAME"] = ccache_file
 
-    # check if we have tgt that is valid more than one hour
-    rc, klist, _ = run(["klist"], extraenv=env)
-    if rc == 0:
-        for line in klist.splitlines():
-            m = re.match(KLIST_TGT_RE, line)
-            if m:
-                year = m.group("year")
-                if len(year) == 2:
-                    year = "20" + year
-
-                expires = datetime.datetime(
-                    int(year), int(m.group("month")), int(m.group("day")),
-                    int(m.group("hour")), int(m.group("minute")), int(m.group("second"))
-                )
-
-                if expires - datetime.datetime.now() > datetime.timedelta(hours=1):
-                    logger.debug("Valid TGT found, not renewing")
-                    tgt_valid = True
-                    break
-
-    if not tgt_valid:
-        logger.debug("Retrieving kerberos TGT")
-        rc, out, err = run(["kinit", "-k", "-t", keytab_file, principal], extraenv=env)
-        if rc != 0:
-            raise OsbsException("kinit returned %s:\nstdout: %s\nstderr: %s" % (rc, out, err))
-
-    if ccache_file:
-        os.environ["KRB5CCNAME"] = ccache_file
+    key = (principal, ccache_file)
+    with _tgt_key_lock(key):
+        if _tgt_valid(_tgt_expires.get(key)):
+            logger.debug("Valid TGT cached, not renewing")
+        else:
+            # check if we have tgt that is valid more than one hour
+            expires = _klist_tgt_expires(env)
+            if _tgt_valid(expires):
+                logger.debug("Valid TGT found, not renewing")
+                _tgt_expires[key] = expires
+            else:
+                _tgt_expires.pop(key, None)
+                logger.debug("Retrieving kerberos TGT")
+                rc, out, err = run(["kinit", "-k", "-t", keytab_file, principal],
+                                   extraenv=env)
+                if rc != 0:
+                    raise OsbsException("kinit returned %s:\nstdout: %s\nstderr: %s" %
+                                        (rc, out, err))
+
+        if ccache_file:
+            os.environ["KRB5CCNAME"] = ccache_file
+
+
+def kerberos_ccache_forget(principal, ccache_file=None):
+    """
+    Forget TGT seen in credential cache, e.g. when it was rejected, so that
+    the next kerberos_ccache_init() inspects the cache again
+    """
+    key = (principal, ccache_file)
+    with _tgt_key_lock(key):
+        _tgt_expires.pop(key, None)
@@ -9,21 +9,29 @@ from __future__ import print_function, absolute_import, unicode_literals
 
 import contextlib
 import copy
+import fcntl
+import io
+import json
 import logging
 import os
 import os.path
 import re
 import shutil
+import stat
 import string
 import subprocess
 import sys
 import tempfile
 import tarfile
+import threading
 import requests
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from datetime import datetime
 from io import BytesIO
 from hashlib import sha256
+from osbs.constants import (REPO_CONFIG_FILE, ADDITIONAL_TAGS_FILE, GIT_MIRROR_CACHE_SIZE,
+                            GIT_FETCH_DEPTH, REPO_INFO_CACHE_SIZE, BACKUP_COMPRESSIONS,
+                            DEFAULT_BACKUP_COMPRESSION, QUANTITY_SUFFIXES)
 from osbs.repo_utils import RepoConfiguration, RepoInfo, AdditionalTagsConfig
 
 try:
@@ -37,11 +45,23 @@ except ImportError:
     from time import strptime
     from calendar import timegm
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 from dockerfile_parse import DockerfileParser
-from osbs.exceptions import OsbsException, OsbsResponseException
+from osbs.exceptions import OsbsException, OsbsResponseException, OsbsValidationException
+from six.moves import cPickle as pickle
+from six.moves import queue
+import six
 
 logger = logging.getLogger(__name__)
 
+# parsed JSON templates, path -> (file signature, pickled content)
+_json_templates = {}
+_json_templates_lock = threading.Lock()
+
 
 class RegistryURI(object):
     # Group 0: URI without path -- allowing empty value -- including:
@@ -65,39 +85,142 @@ class RegistryURI(object):
         return self.uri
 
 
+# first bytes of zstd and xz compressed data
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+
+def _tarfile_supports(compression):
+    # tarfile of py2 can't handle xz
+    return compression in tarfile.TarFile.OPEN_METH
+
+
+class _RawReader(io.RawIOBase):
+    """
+    Raw stream reading from any file-like object, so that it can be
+    wrapped in io.BufferedReader
+    """
+
+    def __init__(self, fileobj):
+        super(_RawReader, self).__init__()
+        self._fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._fileobj.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class CountingWriter(object):
+    """
+    Write-only file-like object counting bytes passed to the wrapped one
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.bytes_written += len(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+
 class TarWriter(object):
-    def __init__(self, outfile, directory=None):
-        mode = "w|bz2"
-        if hasattr(outfile, "write"):
-            self.tarfile = tarfile.open(fileobj=outfile, mode=mode)
+    def __init__(self, outfile, directory=None, compression=DEFAULT_BACKUP_COMPRESSION):
+        """
+        :param outfile: str or file-like object, where to write the archive
+        :param directory: str, directory to put files in inside the archive
+        :param compression: str, one of BACKUP_COMPRESSIONS
+        """
+        if compression not in BACKUP_COMPRESSIONS:
+            raise OsbsException("unknown compression '%s'" % compression)
+        if compression == 'zstd' and zstandard is None:
+            raise OsbsException("zstd compression requires the zstandard module")
+        if compression == 'xz' and not _tarfile_supports(compression):
+            raise OsbsException("xz compression is not supported on this Python version")
+
+        self._own_file = not hasattr(outfile, "write")
+        self._file = open(outfile, "wb") if self._own_file else outfile
+        self._counter = CountingWriter(self._file)
+        self._zstd = None
+        if compression == 'zstd':
+            self._zstd = zstandard.ZstdCompressor().stream_writer(self._counter)
+            self.tarfile = tarfile.open(fileobj=self._zstd, mode="w|")
         else:
-            self.tarfile = tarfile.open(name=outfile, mode=mode)
+            self.tarfile = tarfile.open(fileobj=self._counter, mode="w|" + compression)
         self.directory = directory or ""
 
+    @property
+    def bytes_written(self):
+        """
+        size of the archive written so far
+        """
+        return self._counter.bytes_written
+
     def __enter__(self):
         return self
 
     def __exit__(self, typ, val, tb):
+        self.close()
+
+    def close(self):
         self.tarfile.close()
+        if self._zstd is not None:
+            self._zstd.flush(zstandard.FLUSH_FRAME)
+        if self._own_file:
+            self._file.close()
 
     def write_file(self, name, content):
-        buf = BytesIO(content)
+        self.add_file(name, BytesIO(content))
+
+    def add_file(self, name, fileobj):
+        """
+        copy content of seekable file into the archive
+
+        :param name: str, file name inside directory
+        :param fileobj: file-like object, read from the beginning to the end
+        """
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
         arcname = os.path.join(self.directory, name)
 
         ti = tarfile.TarInfo(arcname)
-        ti.size = len(content)
-        self.tarfile.addfile(ti, fileobj=buf)
+        ti.size = size
+        self.tarfile.addfile(ti, fileobj=fileobj)
 
 
 class TarReader(object):
     TarFile = namedtuple('TarFile', ['filename', 'fileobj'])
 
     def __init__(self, infile):
-        mode = "r|bz2"
-        if hasattr(infile, "read"):
-            self.tarfile = tarfile.open(fileobj=infile, mode=mode)
-        else:
-            self.tarfile = tarfile.open(name=infile, mode=mode)
+        """
+        :param infile: str or file-like object, archive compressed by any
+                       of BACKUP_COMPRESSIONS
+        """
+        self._own_file = not hasattr(infile, "read")
+        fileobj = open(infile, "rb") if self._own_file else infile
+        self._file = fileobj
+
+        # compression is detected without consuming the data, files of py2
+        # (including sys.stdin) and BytesIO can't peek
+        if not hasattr(fileobj, "peek"):
+            fileobj = io.BufferedReader(_RawReader(fileobj))
+        magic = fileobj.peek(len(XZ_MAGIC))
+        if magic.startswith(XZ_MAGIC) and not _tarfile_supports('xz'):
+            raise OsbsException("xz compressed archive is not supported on this Python version")
+        if magic.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise OsbsException("zstd compressed archive requires the zstandard module")
+            fileobj = zstandard.ZstdDecompressor().stream_reader(fileobj)
+
+        self.tarfile = tarfile.open(fileobj=fileobj, mode="r|*")
 
     def __iter__(self):
         return self
@@ -116,6 +239,229 @@ class TarReader(object):
 
     def close(self):
         self.tarfile.close()
+        if self._own_file:
+            self._file.close()
+
+
+def write_json_list(fileobj, items, members=None, key='items'):
+    """
+    Serialize JSON object holding list of items, one item at a time
+
+    Items are written before the other members, so members may be filled in
+    while items are iterated over, e.g. by Openshift.iter_resource().
+
+    :param fileobj: file-like object, opened for writing bytes
+    :param items: iterable of JSON serializable objects
+    :param members: dict, other members of the object
+    :param key: str, name of member holding the items
+    :return: int, number of items written
+    """
+    fileobj.write("{{{0}: [".format(json.dumps(key)).encode("ascii"))
+    count = 0
+    for item in items:
+        if count:
+            fileobj.write(b", ")
+        fileobj.write(json.dumps(item).encode("ascii"))
+        count += 1
+    fileobj.write(b"]")
+
+    for name, value in sorted((members or {}).items()):
+        if name != key:
+            fileobj.write(", {0}: {1}".format(json.dumps(name), json.dumps(value))
+                          .encode("ascii"))
+    fileobj.write(b"}")
+    return count
+
+
+def iter_read_ahead(iterable, size, poll_interval=1, close=None):
+    """
+    Iterate over iterable in a background thread
+
+    Up to size items are read ahead of the consumer, so a slow consumer
+    doesn't keep the producer (e.g. a socket) waiting. Exceptions raised by
+    the producer are re-raised to the consumer. The thread is started when
+    iteration starts and stopped when the returned generator is closed.
+
+    :param iterable: iterable to read from
+    :param size: int, maximal number of items buffered
+    :param poll_interval: float, how often (in seconds) the threads check
+                          whether the other end is still there
+    :param close: callable, unblocks the thread reading iterable when the
+                  consumer is gone, see MergedIterator.add()
+    :return: generator
+    """
+    merged = MergedIterator(size, poll_interval=poll_interval)
+    merged.add(iterable, close=close)
+    return iter(merged)
+
+
+def iter_merged(iterables, size, poll_interval=1):
+    """
+    Iterate over several iterables at once, in the order items become available
+
+    See MergedIterator.
+
+    :param iterables: list of iterables to read from
+    :param size: int, maximal number of items buffered
+    :param poll_interval: float, how often (in seconds) the threads check
+                          whether the other end is still there
+    :return: generator
+    """
+    merged = MergedIterator(size, poll_interval=poll_interval)
+    for iterable in iterables:
+        merged.add(iterable)
+    return iter(merged)
+
+
+class MergedIterator(object):
+    """
+    Iterate over several iterables at once, in the order items become available
+
+    Each iterable is read by its own background thread into a buffer shared
+    by all of them, see iter_read_ahead(). The threads are started when
+    iteration starts. More iterables may be added while iterating, e.g. by
+    the threads reading the others; iteration ends once all of them are
+    exhausted. The first exception raised by any of the iterables stops the
+    iteration and is re-raised to the consumer.
+
+    Functions which provide no items, but e.g. add() iterables, may be run
+    in the background as well, see run().
+
+    When the generator returned by iter() is closed (or garbage collected),
+    close() is called to stop the threads.
+    """
+
+    _end = object()
+
+    def __init__(self, size, poll_interval=1, idle=None):
+        """
+        :param size: int, maximal number of items buffered
+        :param poll_interval: float, how often (in seconds) the threads check
+                              whether the other end is still there
+        :param idle: object, if not None, it is provided whenever no item
+                     came for poll_interval seconds
+        """
+        self.poll_interval = poll_interval
+        self.idle = idle
+        self._buffered = queue.Queue(maxsize=size)
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._started = False
+        # functions not started yet, and close callbacks
+        self._waiting = []
+        self._close_callbacks = []
+
+    @property
+    def closed(self):
+        return self._stopped.is_set()
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._buffered.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self, iterable):
+        for item in iterable:
+            if not self._put((item, None)):
+                return
+
+    def _produce(self, func):
+        exc_info = None
+        try:
+            func()
+        except Exception:
+            exc_info = sys.exc_info()
+        self._put((self._end, exc_info))
+
+    def _start(self, func):
+        thread = threading.Thread(target=self._produce, args=(func,), name="read-ahead")
+        thread.daemon = True
+        thread.start()
+
+    def run(self, func, close=None):
+        """
+        call func in a background thread, as soon as iteration starts
+
+        Iteration doesn't end while func is running, and exception raised
+        by func is re-raised to the consumer.
+
+        :param func: callable, taking no arguments; it may check closed to
+                     find out the consumer is gone
+        :param close: callable, called by close() to unblock func
+        """
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            self._running += 1
+            if close is not None:
+                self._close_callbacks.append(close)
+            if not self._started:
+                self._waiting.append(func)
+                return
+        self._start(func)
+
+    def add(self, iterable, close=None):
+        """
+        read iterable, as soon as iteration starts
+
+        :param iterable: iterable to read from
+        :param close: callable, called by close() to unblock the thread
+                      reading iterable, e.g. by closing the connection it
+                      reads from
+        """
+        self.run(lambda: self._read(iterable), close=close)
+
+    def close(self):
+        """
+        stop reading all iterables
+
+        Threads stop once their iterable provides another item; close
+        callbacks given to add() are called to make that happen sooner.
+        """
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            self._stopped.set()
+            self._waiting = []
+            callbacks, self._close_callbacks = self._close_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as ex:
+                logger.debug("closing stream failed: %r", ex)
+
+    def __iter__(self):
+        with self._lock:
+            self._started = True
+            waiting, self._waiting = self._waiting, []
+        for func in waiting:
+            self._start(func)
+        try:
+            while True:
+                with self._lock:
+                    if not self._running:
+                        return
+                try:
+                    # blocking without timeout is not interruptible on py2
+                    item, exc_info = self._buffered.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    if self.idle is not None:
+                        yield self.idle
+                    continue
+                if item is self._end:
+                    if exc_info:
+                        six.reraise(*exc_info)
+                    with self._lock:
+                        self._running -= 1
+                    continue
+                yield item
+        finally:
+            self.close()
 
 
 def graceful_chain_get(d, *args):
@@ -144,6 +490,41 @@ def graceful_chain_del(d, *args):
         pass
 
 
+def load_json_template(path):
+    """
+    Load JSON file, parsing it again only when it changed since the last load
+
+    Parsed files are cached for the whole process, each caller gets its own
+    copy which it is free to modify.
+
+    :param path: str, path to JSON file
+    :return: parsed JSON
+    :raises IOError: when the file can't be read
+    :raises ValueError: when the file doesn't contain valid JSON
+    """
+    try:
+        st = os.stat(path)
+    except OSError as ex:
+        # raise the same exception open() would
+        raise IOError(ex.errno, ex.strerror, path)
+
+    signature = (st.st_mtime, st.st_size, st.st_ino)
+    with _json_templates_lock:
+        cached = _json_templates.get(path)
+
+    if cached is None or cached[0] != signature:
+        logger.debug("parsing JSON template %s", path)
+        with open(path, 'r') as fp:
+            template = json.load(fp)
+
+        cached = (signature, pickle.dumps(template, pickle.HIGHEST_PROTOCOL))
+        with _json_templates_lock:
+            _json_templates[path] = cached
+
+    # unpickling is much cheaper than deepcopy of the parsed JSON
+    return pickle.loads(cached[1])
+
+
 def has_triggers(build_config):
     return graceful_chain_get(build_config, 'spec', 'triggers') is not None
 
@@ -240,14 +621,367 @@ def looks_like_git_hash(git_ref):
     return all(ch in string.hexdigits for ch in git_ref) and len(git_ref) == 40
 
 
-def get_repo_info(git_uri, git_ref, git_branch=None):
-    with checkout_git_repo(git_uri, git_ref, git_branch) as code_dir:
-        dfp = DockerfileParser(os.path.join(code_dir), cache_content=True)
-        config = RepoConfiguration(dir_path=code_dir)
-        tags_config = AdditionalTagsConfig(dir_path=code_dir)
+class GitMirrorCache(object):
+    """
+    Local bare mirrors of remote git repositories
+
+    Each repository is mirrored once and later only the refs needed are
+    fetched incrementally. Mirrors are locked while in use so they can be
+    shared by threads and processes; least recently used mirrors are removed
+    when there are more than max_repos of them.
+    """
+
+    def __init__(self, directory, max_repos=GIT_MIRROR_CACHE_SIZE):
+        """
+        :param directory: str, directory to keep mirrors in
+        :param max_repos: int, maximal number of mirrors kept
+        """
+        self.directory = directory
+        self.max_repos = max_repos
+
+    def _path(self, git_uri):
+        digest = sha256(git_uri.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    @contextlib.contextmanager
+    def _locked(self, path, blocking=True):
+        with open(path + '.lock', 'a') as lock_file:
+            flags = fcntl.LOCK_EX
+            if not blocking:
+                flags |= fcntl.LOCK_NB
+            try:
+                fcntl.flock(lock_file, flags)
+            except IOError:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def mirror(self, git_uri):
+        """
+        lock mirror of repository, creating it if needed
+
+        :param git_uri: str, URI of git repository
+        :return: context manager yielding path to bare repository
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        path = self._path(git_uri)
+        git_dir = path + '.git'
+        with self._locked(path):
+            if not os.path.isdir(git_dir):
+                run_command(['git', 'init', '--quiet', '--bare', git_dir])
+            # mtime of the mirror marks its last use
+            os.utime(git_dir, None)
+            yield git_dir
+
+        self.evict()
+
+    def evict(self):
+        mirrors = []
+        for name in os.listdir(self.directory):
+            git_dir = os.path.join(self.directory, name)
+            if name.endswith('.git') and os.path.isdir(git_dir):
+                mirrors.append((os.path.getmtime(git_dir), git_dir))
+
+        mirrors.sort(reverse=True)
+        for _, git_dir in mirrors[self.max_repos:]:
+            with self._locked(git_dir[:-len('.git')], blocking=False) as locked:
+                if locked:
+                    logger.debug("removing git mirror %s", git_dir)
+                    shutil.rmtree(git_dir, ignore_errors=True)
+
+
+def _git_has_commit(git_dir, commit):
+    try:
+        run_command(['git', 'cat-file', '-e', '%s^{commit}' % commit], cwd=git_dir)
+        return True
+    except OsbsException:
+        return False
+
+
+def fetch_git_ref(git_dir, git_uri, git_ref, git_branch=None, depth=None):
+    """
+    Fetch commit referenced by git_ref into local repository
+
+    With depth, the ref is fetched directly and whole branch is fetched
+    only when the remote doesn't allow fetching a commit by its hash.
+    Without depth, whole branch is fetched if known, so that following
+    fetches into the same repository are incremental.
+
+    :param git_dir: str, path to local git repository
+    :param git_uri: str, URI of remote git repository
+    :param git_ref: str, commit hash or ref name
+    :param git_branch: str, branch containing git_ref
+    :param depth: int, fetch only this many commits of history
+    :return: str, commit hash
+    """
+    if looks_like_git_hash(git_ref) and _git_has_commit(git_dir, git_ref):
+        return git_ref
+
+    if depth or not git_branch:
+        args = ['git', 'fetch', '--quiet']
+        if depth:
+            args += ['--depth', str(depth)]
+
+        try:
+            run_command(args + [git_uri, git_ref], cwd=git_dir)
+            return run_command(['git', 'rev-parse', 'FETCH_HEAD^{commit}'],
+                               cwd=git_dir).decode('ascii').strip()
+        except OsbsException as ex:
+            if not git_branch:
+                raise
+            logger.debug("fetching %s failed, fetching branch %s: %s", git_ref, git_branch, ex)
+
+    branch_ref = 'refs/heads/%s' % git_branch
+    run_command(['git', 'fetch', '--quiet', git_uri,
+                 '+%s:%s' % (branch_ref, branch_ref)], cwd=git_dir)
+    if looks_like_git_hash(git_ref):
+        if not _git_has_commit(git_dir, git_ref):
+            raise OsbsException("Commit '%s' not found in branch '%s'" % (git_ref, git_branch))
+        return git_ref
+
+    if git_ref not in (git_branch, branch_ref):
+        run_command(['git', 'fetch', '--quiet', git_uri, git_ref], cwd=git_dir)
+        branch_ref = 'FETCH_HEAD'
+    return run_command(['git', 'rev-parse', '%s^{commit}' % branch_ref],
+                       cwd=git_dir).decode('ascii').strip()
+
+
+def export_git_files(git_dir, commit, paths, target_dir):
+    """
+    Write files from commit which exist in it into target_dir
+
+    :param git_dir: str, path to local git repository
+    :param commit: str, commit hash
+    :param paths: list of str, paths of files relative to repository root
+    :param target_dir: str, directory to write files into
+    """
+    existing = run_command(['git', 'ls-tree', '--name-only', commit, '--'] + list(paths),
+                           cwd=git_dir).decode('utf-8').splitlines()
+    for path in existing:
+        content = run_command(['git', 'cat-file', 'blob', '%s:%s' % (commit, path)],
+                              cwd=git_dir)
+        with open(os.path.join(target_dir, path), 'wb') as fp:
+            fp.write(content)
+
+
+# files RepoInfo is parsed from
+REPO_INFO_FILES = ['Dockerfile', REPO_CONFIG_FILE, ADDITIONAL_TAGS_FILE]
+
+
+@contextlib.contextmanager
+def checkout_repo_info_files(git_uri, git_ref, git_branch=None, git_mirror_cache=None):
+    """
+    Check out just the files needed for RepoInfo into temporary directory
+
+    Files are fetched with a shallow fetch of git_ref, or through
+    git_mirror_cache when it is set. When fetching fails, the whole
+    repository is cloned.
+
+    :param git_uri: str, URI of git repository
+    :param git_ref: str, commit hash or ref name
+    :param git_branch: str, branch containing git_ref
+    :param git_mirror_cache: GitMirrorCache, mirrors to fetch into, or None
+                             to fetch into temporary repository
+    :return: context manager yielding path to directory with the files
+    """
+    paths = REPO_INFO_FILES
+    tmpdir = tempfile.mkdtemp()
+    code_dir = os.path.join(tmpdir, 'repo')
+    os.mkdir(code_dir)
+    try:
+        try:
+            if git_mirror_cache is not None:
+                with git_mirror_cache.mirror(git_uri) as git_dir:
+                    commit = fetch_git_ref(git_dir, git_uri, git_ref, git_branch)
+                    export_git_files(git_dir, commit, paths, code_dir)
+            else:
+                git_dir = os.path.join(tmpdir, 'repo.git')
+                run_command(['git', 'init', '--quiet', '--bare', git_dir])
+                commit = fetch_git_ref(git_dir, git_uri, git_ref, git_branch,
+                                       depth=GIT_FETCH_DEPTH)
+                export_git_files(git_dir, commit, paths, code_dir)
+            fetched = True
+        except OsbsException as ex:
+            logger.warning("fetching '%s' from '%s' failed, cloning whole repository: %s",
+                           git_ref, git_uri, ex)
+            fetched = False
+
+        if fetched:
+            yield code_dir
+        else:
+            with checkout_git_repo(git_uri, git_ref, git_branch) as repo_path:
+                yield repo_path
+
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def parse_repo_info(code_dir):
+    """
+    :param code_dir: str, directory with files from repository
+    :return: RepoInfo
+    """
+    dfp = DockerfileParser(os.path.join(code_dir), cache_content=True)
+    config = RepoConfiguration(dir_path=code_dir)
+    tags_config = AdditionalTagsConfig(dir_path=code_dir)
     return RepoInfo(dfp, config, tags_config)
 
 
+class RepoInfoCache(object):
+    """
+    Cache of RepoInfo for git commits
+
+    Content of a commit never changes, so RepoInfo parsed for (git_uri,
+    commit) stays valid. Entries are kept in memory and, when directory is
+    set, also persisted there as JSON files with content of the repository
+    files, so other processes can use them. At most max_entries of least
+    recently used entries are kept in each of the stores.
+    """
+
+    def __init__(self, directory=None, max_entries=REPO_INFO_CACHE_SIZE):
+        """
+        :param directory: str, directory to persist entries in, or None
+        :param max_entries: int, maximal number of entries kept
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        digest = sha256('{0}#{1}'.format(*key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def _remember(self, key, repo_info):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = repo_info
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, git_uri, commit):
+        """
+        :param git_uri: str, URI of git repository
+        :param commit: str, commit hash
+        :return: RepoInfo, or None if not cached
+        """
+        key = (git_uri, commit.lower())
+        with self._lock:
+            repo_info = self._entries.pop(key, None)
+            if repo_info is not None:
+                self._entries[key] = repo_info
+                return repo_info
+
+        if self.directory is None:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path) as fp:
+                files = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for name, content in files.items():
+                if name in REPO_INFO_FILES:
+                    with open(os.path.join(tmpdir, name), 'wb') as fp:
+                        fp.write(content.encode('utf-8'))
+            repo_info = parse_repo_info(tmpdir)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        try:
+            # mtime of the file marks its last use
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        logger.debug("using cached repository info for %s at %s", git_uri, commit)
+        self._remember(key, repo_info)
+        return repo_info
+
+    def put(self, git_uri, commit, code_dir, repo_info):
+        """
+        :param git_uri: str, URI of git repository
+        :param commit: str, commit hash
+        :param code_dir: str, directory repo_info was parsed from
+        :param repo_info: RepoInfo
+        """
+        key = (git_uri, commit.lower())
+        self._remember(key, repo_info)
+        if self.directory is None:
+            return
+
+        files = {}
+        for name in REPO_INFO_FILES:
+            try:
+                with open(os.path.join(code_dir, name), 'rb') as fp:
+                    files[name] = fp.read().decode('utf-8', 'replace')
+            except (IOError, OSError):
+                continue
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # write under temporary name first so readers never see partial file
+        fd, tmp_path = tempfile.mkstemp(prefix='.', dir=self.directory)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(files, fp)
+        os.rename(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json') and not name.startswith('.'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def get_repo_info(git_uri, git_ref, git_branch=None, git_mirror_cache=None,
+                  repo_info_cache=None):
+    """
+    :param git_uri: str, URI of git repository
+    :param git_ref: str, commit hash or ref name
+    :param git_branch: str, branch containing git_ref
+    :param git_mirror_cache: GitMirrorCache, mirrors to fetch into, or None
+    :param repo_info_cache: RepoInfoCache, RepoInfo of commits already seen,
+                            or None to always fetch repository files
+    :return: RepoInfo
+    """
+    is_commit = looks_like_git_hash(git_ref)
+    if is_commit and repo_info_cache is not None:
+        repo_info = repo_info_cache.get(git_uri, git_ref)
+        if repo_info is not None:
+            return repo_info
+
+    with checkout_repo_info_files(git_uri, git_ref, git_branch,
+                                  git_mirror_cache=git_mirror_cache) as code_dir:
+        repo_info = parse_repo_info(code_dir)
+        if is_commit and repo_info_cache is not None:
+            repo_info_cache.put(git_uri, git_ref, code_dir, repo_info)
+    return repo_info
+
+
 def git_repo_humanish_part_from_uri(git_uri):
     git_uri = git_uri.rstrip('/')
     if git_uri.endswith("/.git"):
@@ -316,6 +1050,30 @@ def get_time_from_rfc3339(rfc3339):
         return timegm(time_tuple)
 
 
+def parse_quantity(quantity):
+    """
+    return value of Kubernetes quantity, such as "500m" or "2Gi"
+
+    :param quantity: str or number
+    :return: float
+    """
+    quantity = str(quantity).strip()
+    try:
+        return float(quantity)
+    except ValueError:
+        pass
+
+    for suffix_length in (2, 1):
+        suffix = quantity[-suffix_length:]
+        if suffix in QUANTITY_SUFFIXES:
+            try:
+                return float(quantity[:-suffix_length]) * QUANTITY_SUFFIXES[suffix]
+            except ValueError:
+                break
+
+    raise OsbsValidationException("invalid quantity: %r" % quantity)
+
+
 def utcnow():
     """
     Return current time in UTC.
@@ -408,6 +1166,27 @@ def get_instance_token_file_name(instance):
     return '{0}/.osbs/{1}.token'.format(os.path.expanduser('~'), instance)
 
 
+def write_token_file(token_file, token):
+    """Store token in file readable only by its owner."""
+    token_file_dir = os.path.dirname(token_file)
+
+    if not os.path.exists(token_file_dir):
+        os.makedirs(token_file_dir)
+
+    # Inspired by http://stackoverflow.com/a/15015748/5998718
+    # For security, remove file with potentially elevated mode
+    if os.path.exists(token_file):
+        os.remove(token_file)
+
+    # Open file descriptor
+    fdesc = os.open(token_file,
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                    stat.S_IRUSR | stat.S_IWUSR)
+
+    with os.fdopen(fdesc, 'w') as f:
+        f.write(token + '\n')
+
+
 def run_command(*popenargs, **kwargs):
     """
     Run command with arguments and return its output as a byte string.
@@ -12,6 +12,7 @@ import sys
 import glob
 
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 
 data_files = {
     "share/osbs": glob.glob("inputs/*.json"),
@@ -31,6 +32,16 @@ def _install_requirements():
         requirements += _get_requirements('requirements-py3.txt')
     return requirements
 
+class BuildPy(build_py):
+    """ leave out modules using syntax the interpreter doesn't know """
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 6):
+            # asyncio client needs async generators
+            modules = [module for module in modules if module[:2] != ('osbs', 'aio')]
+        return modules
+
 setup(
     name="osbs-client",
     description='Python module and command line client for OpenShift Build Service',
@@ -44,6 +55,10 @@ setup(
           'console_scripts': ['osbs=osbs.cli.main:main'],
     },
     install_requires=_install_requirements(),
+    extras_require={
+        'asyncio:python_version >= "3.6"': ['aiohttp'],
+    },
+    cmdclass={'build_py': BuildPy},
     data_files=data_files.items(),
     setup_requires=[],
     tests_require=_get_requirements('tests/requirements.txt'),
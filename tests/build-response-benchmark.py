@@ -0,0 +1,97 @@
+#!/usr/bin/python
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Measure how long it takes to read values `osbs list-builds` shows from builds
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from osbs.build.build_response import BuildResponse  # noqa:E402
+
+DEFAULT_BUILDS = 5000
+DEFAULT_NUMBER = 5
+
+
+def make_build(index):
+    digests = [{'registry': 'registry.example.com', 'repository': 'fedora',
+                'tag': str(index), 'digest': 'sha256:%064x' % index}]
+    return {
+        'metadata': {
+            'name': 'build-%d' % index,
+            'creationTimestamp': '2017-06-01T12:00:00Z',
+            'labels': {'koji-build-id': str(index)},
+            'annotations': {
+                'base-image-name': 'fedora:latest',
+                'base-image-id': 'sha256:%064x' % index,
+                'commit_id': '%040x' % index,
+                'image-id': 'sha256:%064x' % index,
+                'repositories': json.dumps({
+                    'primary': ['registry.example.com/fedora:%d' % index],
+                    'unique': ['registry.example.com/fedora:build-%d' % index],
+                }),
+                'tar_metadata': json.dumps({
+                    'size': index, 'md5sum': '%032x' % index,
+                    'sha256sum': '%064x' % index, 'filename': 'image-%d.tar' % index,
+                }),
+                'digests': json.dumps(digests),
+                'plugins-metadata': json.dumps({'errors': {}, 'timestamps': {}}),
+            },
+        },
+        'spec': {'output': {'to': {'name': 'fedora:build-%d' % index}}},
+        'status': {'phase': 'Complete'},
+    }
+
+
+def read_values(builds):
+    for build in builds:
+        build.get_time_created_in_seconds()
+        build.get_image_tag()
+        build.get_repositories()
+        build.is_in_progress()
+        build.get_base_image_name()
+        build.get_base_image_id()
+        build.get_commit_id()
+        build.get_image_id()
+        build.get_koji_build_id()
+        build.get_build_name()
+        build.get_time_created()
+        build.get_digests()
+        build.get_tar_metadata_size()
+        build.get_tar_metadata_md5sum()
+        build.get_tar_metadata_sha256sum()
+        build.get_tar_metadata_filename()
+        build.get_error_message()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument("--builds", type=int, default=DEFAULT_BUILDS,
+                        help="number of builds in the list")
+    parser.add_argument("--number", type=int, default=DEFAULT_NUMBER,
+                        help="number of passes over the list")
+    args = parser.parse_args()
+
+    build_jsons = [make_build(index) for index in range(args.builds)]
+    builds = [BuildResponse(build_json) for build_json in build_jsons]
+    first = timeit.timeit(lambda: read_values(builds), number=1)
+    again = timeit.timeit(lambda: read_values(builds), number=args.number)
+    print("{0:>12}: {1:8.3f} ms for {2} builds".format('first pass', first * 1000, args.builds))
+    print("{0:>12}: {1:8.3f} ms for {2} builds".format('next passes', again * 1000 / args.number,
+                                                       args.builds))
+
+
+if __name__ == '__main__':
+    main()
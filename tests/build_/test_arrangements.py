@@ -25,7 +25,8 @@ from tests.constants import (TEST_GIT_URI,
                              TEST_COMPONENT,
                              TEST_VERSION,
                              TEST_FILESYSTEM_KOJI_TASK_ID,
-                             INPUTS_PATH)
+                             INPUTS_PATH,
+                             REPO_INFO_CACHES)
 from tests.fake_api import openshift, osbs, osbs_with_pulp  # noqa:F401
 from tests.test_api import request_as_response
 from tests.build_.test_build_request import (get_plugins_from_build_json,
@@ -52,7 +53,8 @@ class ArrangementBase(object):
 
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(RepoInfo(MockParser())))
 
         # Trick create_orchestrator_build into return the *request* JSON
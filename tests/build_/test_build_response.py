@@ -6,6 +6,8 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 import json
+
+from flexmock import flexmock
 import pytest
 from osbs.build.build_response import BuildResponse
 
@@ -131,3 +133,48 @@ class TestBuildResponse(object):
             }
         })
         assert build_response.get_error_message() == expected_error_message
+
+    def test_decoded_annotations(self):
+        tar_metadata = {'size': 10, 'md5sum': 'a', 'sha256sum': 'b', 'filename': 'c.tar'}
+        build_response = BuildResponse({
+            'metadata': {
+                'annotations': {
+                    'repositories': json.dumps({'primary': ['spam:1']}),
+                    'tar_metadata': json.dumps(tar_metadata),
+                    'digests': '',
+                },
+            },
+        })
+        (flexmock(json)
+            .should_call('loads')
+            .times(2))
+
+        for _ in range(2):
+            assert build_response.get_repositories() == {'primary': ['spam:1']}
+            assert build_response.get_tar_metadata_size() == 10
+            assert build_response.get_tar_metadata_md5sum() == 'a'
+            assert build_response.get_tar_metadata_sha256sum() == 'b'
+            assert build_response.get_tar_metadata_filename() == 'c.tar'
+            assert build_response.get_digests() is None
+
+        # callers get copies, modifying them doesn't change the build response
+        build_response.get_repositories()['primary'].append('spam:2')
+        build_response.get_tar_metadata()['size'] = 20
+        assert build_response.get_repositories() == {'primary': ['spam:1']}
+        assert build_response.get_tar_metadata() == tar_metadata
+        assert build_response.get_tar_metadata_size() == 10
+
+    def test_json_assignment(self):
+        build_response = BuildResponse({
+            'metadata': {'labels': {'repositories': '{"primary": []}'}},
+            'status': {'phase': 'Running'},
+        })
+        assert build_response.get_repositories() == {'primary': []}
+        assert build_response.is_running()
+
+        build_response.json = {
+            'metadata': {'annotations': {}, 'labels': {'repositories': '{}'}},
+            'status': {'phase': 'Complete'},
+        }
+        assert build_response.get_repositories() is None
+        assert build_response.is_succeeded()
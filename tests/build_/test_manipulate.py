@@ -58,3 +58,25 @@ class TestDockJsonManipulator(object):
         assert plugin['args']['key1']['a'] == '3'
         assert plugin['args']['key1']['b'] == '2'
         assert plugin['args']['key1']['z'] == '9'
+
+    def test_manipulator_index(self):
+        inner = {'prebuild_plugins': [{'name': 'a'}, {'name': 'b'}, {'name': 'c'}]}
+        m = DockJsonManipulator(None, inner)
+        assert m.dock_json_get_plugin_conf('prebuild_plugins', 'b') == {'name': 'b'}
+
+        m.remove_plugin('prebuild_plugins', 'b')
+        m.add_plugin('prebuild_plugins', 'd', {'x': 1})
+        m.add_plugin('prebuild_plugins', 'a', {'y': 2})
+        assert not m.dock_json_has_plugin_conf('prebuild_plugins', 'b')
+        assert m.dock_json_get_plugin_conf('prebuild_plugins', 'd') == {'name': 'd',
+                                                                        'args': {'x': 1}}
+        assert [x['name'] for x in inner['prebuild_plugins']] == ['a', 'c', 'd']
+        assert inner['prebuild_plugins'][0]['args'] == {'y': 2}
+
+        # changes made directly to the plugin list are picked up
+        inner['prebuild_plugins'].append({'name': 'e'})
+        assert m.dock_json_has_plugin_conf('prebuild_plugins', 'e')
+        inner['prebuild_plugins'] = [{'name': 'f'}]
+        assert not m.dock_json_has_plugin_conf('prebuild_plugins', 'a')
+        assert m.dock_json_has_plugin_conf('prebuild_plugins', 'f')
+        assert not m.dock_json_has_plugin_conf('postbuild_plugins', 'f')
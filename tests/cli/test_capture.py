@@ -10,7 +10,7 @@ import json
 import os
 import pytest
 
-from osbs.constants import DEFAULT_NAMESPACE
+from osbs.constants import DEFAULT_NAMESPACE, LIST_PAGE_SIZE
 from osbs.cli.capture import setup_json_capture
 from tests.fake_api import openshift, osbs  # noqa
 from tests.constants import TEST_BUILD
@@ -31,9 +31,9 @@ def osbs_with_capture(osbs, tmpdir):
 def test_json_capture_no_watch(osbs_with_capture, tmpdir):
     for visit in ["000", "001"]:
         osbs_with_capture.list_builds()
-        filename = "get-namespaces_{n}_builds_-{v}.json"
+        filename = "get-namespaces_{n}_builds_?limit={l}-{v}.json"
         path = os.path.join(str(tmpdir), filename.format(n=DEFAULT_NAMESPACE,
-                                                         v=visit))
+                                                         l=LIST_PAGE_SIZE, v=visit))
         assert os.access(path, os.R_OK)
         with open(path) as fp:
             obj = json.load(fp)
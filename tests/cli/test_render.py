@@ -8,7 +8,7 @@ of the BSD license. See the LICENSE file for details.
 from __future__ import print_function, absolute_import, unicode_literals
 
 import osbs.cli.render
-from osbs.cli.render import TablePrinter, get_terminal_size
+from osbs.cli.render import TablePrinter, StreamingTablePrinter, get_terminal_size
 
 from flexmock import flexmock
 
@@ -70,3 +70,49 @@ def test_print_table_with_mocked_terminal(capsys):
 
     assert err == expected_header
     assert out == expected_data
+
+
+def test_streaming_table_holds_back_sample(capsys):
+    flexmock(osbs.cli.render).should_receive('get_terminal_size').and_return(0, 0)
+    p = StreamingTablePrinter(SAMPLE_DATA[0], ["x", "y", "z"], sample_size=3)
+    p.add(SAMPLE_DATA[1])
+    p.add(SAMPLE_DATA[2])
+    out, err = capsys.readouterr()
+    assert out == err == ''
+
+    p.flush()
+    out, err = capsys.readouterr()
+    streamed = (err, out)
+    TablePrinter(SAMPLE_DATA, ["x", "y", "z"]).render()
+    assert streamed == capsys.readouterr()[::-1]
+
+    # sample is not kept once printed
+    assert p.data == []
+    assert p.table == [SAMPLE_DATA[0]]
+
+
+def test_streaming_table_prints_rows_as_added(capsys):
+    flexmock(osbs.cli.render).should_receive('get_terminal_size').and_return(0, 0).once()
+    p = StreamingTablePrinter({'x': 'X', 'y': 'Y'}, ["x", "y"], sample_size=1)
+    p.add({'x': 'a', 'y': 'b'})
+    out, err = capsys.readouterr()
+    assert err == ' X | Y \n---+---\n'
+    assert out == ' a | b \n'
+
+    p.add({'x': 'c', 'y': 'd'})
+    assert capsys.readouterr()[0] == ' c | d \n'
+
+    # column is widened for row which doesn't fit
+    p.add({'x': 'long', 'y': 'e'})
+    p.add({'x': 'f', 'y': 'g'})
+    assert capsys.readouterr()[0] == ' long | e \n f    | g \n'
+    assert p.data == []
+
+
+def test_streaming_table_empty(capsys):
+    flexmock(osbs.cli.render).should_receive('get_terminal_size').and_return(0, 0)
+    p = StreamingTablePrinter({'x': 'X'}, ["x"])
+    p.flush()
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err == ' X \n---\n'
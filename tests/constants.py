@@ -9,6 +9,8 @@ from __future__ import absolute_import, unicode_literals
 
 import os
 
+from osbs.utils import RepoInfoCache
+
 HERE = os.path.dirname(__file__)
 INPUTS_PATH = os.path.join(HERE, '..', 'inputs')
 
@@ -106,3 +108,6 @@ TEST_INNER_DOCK_JSON = {
         },
     ]
 }
+
+# caches OSBS instance passes to get_repo_info
+REPO_INFO_CACHES = {'git_mirror_cache': None, 'repo_info_cache': RepoInfoCache}
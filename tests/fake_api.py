@@ -14,7 +14,7 @@ import inspect
 import logging
 import fnmatch
 from osbs.core import Openshift
-from osbs.http import HttpResponse
+from osbs.http import HttpResponse, iter_json_items
 from osbs.conf import Configuration
 from osbs.api import OSBS
 from tests.constants import (TEST_BUILD, TEST_CANCELLED_BUILD, TEST_ORCHESTRATOR_BUILD,
@@ -42,6 +42,12 @@ class StreamingResponse(object):
     def iter_lines(self):
         yield self.content
 
+    def iter_chunks(self):
+        yield self.content
+
+    def iter_json_items(self, key='items', members=None):
+        return iter_json_items(self.iter_chunks(), key=key, members=members)
+
     def __enter__(self):
         return self
 
@@ -129,6 +135,9 @@ class Connection(object):
                  },
                  "put": {
                      "file": "build_test-build-123.json",
+                 },
+                 "patch": {
+                     "file": "build_test-build-123.json",
                  }
             },
 
@@ -142,6 +151,9 @@ class Connection(object):
                  },
                  "put": {
                      "file": "build_test-orchestrator-build-123.json",
+                 },
+                 "patch": {
+                     "file": "build_test-orchestrator-build-123.json",
                  }
             },
 
@@ -161,7 +173,9 @@ class Connection(object):
 
             (OAPI_PREFIX + "namespaces/default/builds/%s/log/" % TEST_BUILD,
              OAPI_PREFIX + "namespaces/default/builds/%s/log/?follow=0" % TEST_BUILD,
-             OAPI_PREFIX + "namespaces/default/builds/%s/log/?follow=1" % TEST_BUILD): {
+             OAPI_PREFIX + "namespaces/default/builds/%s/log/?follow=1" % TEST_BUILD,
+             OAPI_PREFIX + "namespaces/default/builds/%s/log/?follow=1&timestamps=true"
+             % TEST_BUILD): {
                  "get": {
                      # Lines of text
                      "file": "build_test-build-123_logs.txt",
@@ -171,6 +185,8 @@ class Connection(object):
             (OAPI_PREFIX + "namespaces/default/builds/%s/log/" % TEST_ORCHESTRATOR_BUILD,
              OAPI_PREFIX + "namespaces/default/builds/%s/log/?follow=0" % TEST_ORCHESTRATOR_BUILD,
              OAPI_PREFIX + "namespaces/default/builds/%s/log/?follow=1"
+             % TEST_ORCHESTRATOR_BUILD,
+             OAPI_PREFIX + "namespaces/default/builds/%s/log/?follow=1&timestamps=true"
              % TEST_ORCHESTRATOR_BUILD): {
                  "get": {
                      # Lines of text
@@ -373,8 +389,11 @@ class Connection(object):
         # fragment = parsed_url.fragment
         # parsed_fragment = urllib.parse_qs(fragment)
         url_path = parsed_url.path
-        if parsed_url.query:
-            url_path += '?' + parsed_url.query
+        # responses are not paginated, ignore limit and continue
+        query = '&'.join(param for param in parsed_url.query.split('&')
+                         if param and not param.startswith(('limit=', 'continue=')))
+        if query:
+            url_path += '?' + query
         logger.info("URL path is '%s'", url_path)
         kwargs = self.response_mapping.response_mapping(url_path, method)
         if stream:
@@ -391,6 +410,9 @@ class Connection(object):
     def put(self, url, *args, **kwargs):
         return self.request(url, "put", *args, **kwargs)
 
+    def patch(self, url, *args, **kwargs):
+        return self.request(url, "patch", *args, **kwargs)
+
     def delete(self, url, *args, **kwargs):
         return self.request(url, "delete", *args, **kwargs)
 
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Measure how long it takes to render orchestrator and worker builds
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from osbs.build.build_request import BuildRequest  # noqa:E402
+from osbs.repo_utils import RepoInfo  # noqa:E402
+from osbs.constants import (BUILD_TYPE_ORCHESTRATOR, BUILD_TYPE_WORKER,  # noqa:E402
+                            ORCHESTRATOR_INNER_TEMPLATE, ORCHESTRATOR_OUTER_TEMPLATE,
+                            ORCHESTRATOR_CUSTOMIZE_CONF, WORKER_INNER_TEMPLATE,
+                            WORKER_OUTER_TEMPLATE, WORKER_CUSTOMIZE_CONF)
+
+DEFAULT_INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inputs')
+DEFAULT_ARRANGEMENT_VERSION = 4
+DEFAULT_NUMBER = 200
+
+COMMON_PARAMS = {
+    'git_uri': 'https://github.com/example/example.git',
+    'git_ref': 'master',
+    'git_branch': 'master',
+    'user': 'john-foo',
+    'component': 'example',
+    'base_image': 'fedora:latest',
+    'name_label': 'fedora/resultingimage',
+    'registry_uris': ['registry.example.com/v2'],
+    'registry_api_versions': ['v2'],
+    'source_registry_uri': 'registry.example.com',
+    'openshift_uri': 'http://openshift/',
+    'builder_openshift_url': 'http://openshift/',
+    'koji_target': 'koji-target',
+    'kojiroot': 'http://root/',
+    'kojihub': 'http://hub/',
+    'sources_command': 'make',
+    'vendor': 'Foo Vendor',
+    'authoritative_registry': 'registry.example.com',
+    'distribution_scope': 'authoritative-source-only',
+    'smtp_host': 'smtp.example.com',
+    'smtp_from': 'user@example.com',
+    'reactor_config_secret': 'reactor-config',
+    'client_config_secret': 'client-config',
+}
+
+
+class DockerfileParser(object):
+    labels = {
+        'name': 'fedora/resultingimage',
+        'com.redhat.component': 'example',
+        'version': '1.0',
+    }
+    baseimage = 'fedora:latest'
+
+
+BUILDS = {
+    'orchestrator': (ORCHESTRATOR_OUTER_TEMPLATE, ORCHESTRATOR_INNER_TEMPLATE,
+                     ORCHESTRATOR_CUSTOMIZE_CONF,
+                     {'build_type': BUILD_TYPE_ORCHESTRATOR, 'platforms': ['x86_64', 'ppc64le']}),
+    'worker': (WORKER_OUTER_TEMPLATE, WORKER_INNER_TEMPLATE, WORKER_CUSTOMIZE_CONF,
+               {'build_type': BUILD_TYPE_WORKER, 'platform': 'x86_64', 'release': '1'}),
+}
+
+
+def render(inputs, arrangement_version, build):
+    outer_template, inner_template, customize_conf, params = BUILDS[build]
+    build_request = BuildRequest(inputs,
+                                 outer_template=outer_template,
+                                 inner_template=inner_template.format(
+                                     arrangement_version=arrangement_version),
+                                 customize_conf=customize_conf)
+    kwargs = dict(COMMON_PARAMS)
+    kwargs.update(params)
+    kwargs['arrangement_version'] = arrangement_version
+    build_request.set_params(**kwargs)
+    build_request.set_repo_info(RepoInfo(DockerfileParser()))
+    return build_request.render()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument("--inputs", default=DEFAULT_INPUTS,
+                        help="directory with build JSON templates")
+    parser.add_argument("--arrangement-version", type=int, default=DEFAULT_ARRANGEMENT_VERSION,
+                        help="version of inner templates to render")
+    parser.add_argument("--number", type=int, default=DEFAULT_NUMBER,
+                        help="number of renders of each build type")
+    args = parser.parse_args()
+
+    for build in sorted(BUILDS):
+        # first render loads the templates, don't count it
+        render(args.inputs, args.arrangement_version, build)
+        total = timeit.timeit(lambda: render(args.inputs, args.arrangement_version, build),
+                              number=args.number)
+        print("{0:>12}: {1:8.3f} ms per render ({2} renders)".format(
+            build, total * 1000 / args.number, args.number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import asyncio
+import json
+import time
+
+from flexmock import flexmock
+import pytest
+
+from osbs.build.build_response import BuildResponse
+from osbs.constants import WATCH_ADDED, WATCH_MODIFIED
+from osbs.exceptions import OsbsResponseException
+from osbs.http import HttpResponse
+
+from tests.constants import TEST_BUILD, TEST_CANCELLED_BUILD
+from tests.fake_api import openshift, osbs  # noqa
+
+pytest.importorskip('aiohttp')
+
+from osbs.aio import AsyncOpenshift, AsyncOSBS  # noqa: E402
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def collect(agen, count=None):
+    items = []
+    async for item in agen:
+        items.append(item)
+        if len(items) == count:
+            break
+    return items
+
+
+class FakeResponse(object):
+    """
+    aiohttp.ClientResponse sending its content in given chunks
+    """
+
+    def __init__(self, status=200, chunks=(), headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.chunks = list(chunks)
+        self.content = self
+
+    @classmethod
+    def from_response(cls, response):
+        return cls(response.status_code, [response.content], response.headers)
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def read(self):
+        return b''.join(self.chunks)
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def mock_send(aos, responses=None):
+    """
+    serve requests from fake_api, or from responses if given
+    """
+    urls = []
+
+    async def fake_send(method, url, **kwargs):
+        urls.append(url)
+        if responses is not None:
+            return responses.pop(0)
+        response = aos.os._con.request(url, method.lower(), stream=True)
+        return FakeResponse.from_response(response)
+
+    flexmock(aos).should_receive('_send').replace_with(fake_send)
+    return urls
+
+
+def watch_event(changetype, resource_version):
+    return json.dumps({
+        'type': changetype,
+        'object': {'metadata': {'name': TEST_BUILD, 'resourceVersion': resource_version}},
+    }).encode('utf-8')
+
+
+def test_get_build(openshift):  # noqa
+    aos = AsyncOpenshift(openshift)
+    mock_send(aos)
+
+    response = run(aos.get_build(TEST_BUILD))
+    assert response.json() == openshift.get_build(TEST_BUILD).json()
+
+
+def test_get_build_error(openshift):  # noqa
+    aos = AsyncOpenshift(openshift)
+    mock_send(aos, [FakeResponse(404, [b'not found'])])
+
+    with pytest.raises(OsbsResponseException) as exc_info:
+        run(aos.get_build(TEST_BUILD))
+    assert exc_info.value.status_code == 404
+
+
+def test_list_builds(osbs):  # noqa
+    aosbs = AsyncOSBS(osbs)
+    mock_send(aosbs.os)
+
+    builds = run(aosbs.list_builds())
+    assert all(isinstance(build, BuildResponse) for build in builds)
+    assert ([build.get_build_name() for build in builds] ==
+            [build.get_build_name() for build in osbs.list_builds()])
+
+
+def test_cancel_build(osbs):  # noqa
+    aosbs = AsyncOSBS(osbs)
+    mock_send(aosbs.os)
+
+    response = run(aosbs.cancel_build(TEST_CANCELLED_BUILD))
+    assert isinstance(response, BuildResponse)
+
+
+def test_create_image_stream(osbs):  # noqa
+    aosbs = AsyncOSBS(osbs)
+    sent = []
+
+    async def fake_request(method, url, data=None, **kwargs):
+        sent.append(json.loads(data))
+        return HttpResponse(201, {}, data.encode('utf-8'))
+
+    flexmock(aosbs.os).should_receive('_request').replace_with(fake_request)
+    run(aosbs.create_image_stream('fedora', 'registry/fedora', insecure_registry=True))
+    assert sent[0]['metadata']['name'] == 'fedora'
+    assert sent[0]['spec']['dockerImageRepository'] == 'registry/fedora'
+    assert (sent[0]['metadata']['annotations']['openshift.io/image.insecureRepository'] ==
+            'true')
+
+
+def test_iter_lines():
+    response = FakeResponse(chunks=[b'one\r\ntw', b'o', b'\nthree\n\nfo', b'ur'])
+    lines = run(collect(AsyncOpenshift._iter_lines(response)))
+    assert lines == [b'one', b'two', b'three', b'', b'four']
+
+
+def test_watch_resource_resumes(openshift):  # noqa
+    aos = AsyncOpenshift(openshift)
+    first = watch_event('ADDED', '1') + b'\n' + watch_event('MODIFIED', '2')
+    urls = mock_send(aos, [
+        FakeResponse(chunks=[first[:10], first[10:]]),
+        FakeResponse(chunks=[watch_event('MODIFIED', '3')]),
+    ])
+
+    events = run(collect(aos.watch_resource('builds', TEST_BUILD), 3))
+    assert [(changetype, obj['metadata']['resourceVersion'])
+            for changetype, obj in events] == [
+        (WATCH_ADDED, '1'), (WATCH_MODIFIED, '2'), (WATCH_MODIFIED, '3')]
+    assert 'resourceVersion' not in urls[0]
+    assert 'resourceVersion=2' in urls[1]
+    assert aos.watch_reconnects == 1
+
+
+def test_watch_resource_relists_when_gone(openshift):  # noqa
+    aos = AsyncOpenshift(openshift)
+    gone = json.dumps({'type': 'ERROR', 'object': {'code': 410}}).encode('utf-8')
+    mock_send(aos, [FakeResponse(chunks=[gone])])
+
+    async def fake_list(resource_type, resource_name=None, **kwargs):
+        return '5', [{'metadata': {'name': TEST_BUILD, 'resourceVersion': '5'}}]
+
+    flexmock(aos).should_receive('_list_resource').replace_with(fake_list).once()
+    events = run(collect(aos.watch_resource('builds', TEST_BUILD, resourceVersion='1'), 1))
+    assert events == [(WATCH_MODIFIED, {'metadata': {'name': TEST_BUILD,
+                                                     'resourceVersion': '5'}})]
+
+
+def test_wait_for_build_to_finish(osbs):  # noqa
+    aosbs = AsyncOSBS(osbs)
+    complete = json.dumps({
+        'type': 'MODIFIED',
+        'object': {'metadata': {'name': TEST_BUILD, 'resourceVersion': '2'},
+                   'status': {'phase': 'Complete'}},
+    }).encode('utf-8')
+    mock_send(aosbs.os, [FakeResponse(chunks=[watch_event('ADDED', '1') + b'\n' + complete])])
+
+    build = run(aosbs.wait_for_build_to_finish(TEST_BUILD))
+    assert build.is_succeeded()
+
+
+def test_stream_logs_resumes(openshift):  # noqa
+    clock = [0]
+
+    class IdleResponse(FakeResponse):
+        async def iter_any(self):
+            async for chunk in super(IdleResponse, self).iter_any():
+                yield chunk
+            # connection closed after idle timeout
+            clock[0] += 100
+
+    aos = AsyncOpenshift(openshift)
+    urls = mock_send(aos, [
+        IdleResponse(chunks=[b'2017-06-01T12:00:00.9Z one\n2017-06-01T12:00:01.05Z two\n']),
+        FakeResponse(chunks=[b'2017-06-01T12:00:01.05Z two\n2017-06-01T12:00:02Z three\n']),
+    ])
+    flexmock(time).should_receive('time').replace_with(lambda: clock[0])
+
+    lines = run(collect(aos.stream_logs(TEST_BUILD)))
+    assert lines == [b'one', b'two', b'three']
+    assert 'sinceTime' not in urls[0]
+    assert 'sinceTime=2017-06-01T12%3A00%3A01Z' in urls[1]
+
+
+def test_get_build_logs_decode(osbs):  # noqa
+    aosbs = AsyncOSBS(osbs)
+    mock_send(aosbs.os, [FakeResponse(chunks=[u'Uňícode\n'.encode('utf-8')])])
+
+    assert run(collect(aosbs.get_build_logs(TEST_BUILD, decode=True))) == [u'Uňícode']
+
+
+def test_token_fetched_once(openshift):  # noqa
+    openshift.use_auth = True
+    openshift.token = None
+    aos = AsyncOpenshift(openshift)
+    sent_headers = []
+
+    async def fake_request(method, url, headers=None, **kwargs):
+        sent_headers.append(headers)
+        return FakeResponse.from_response(openshift._con.request(url, method.lower()))
+
+    flexmock(aos).should_receive('_get_session').and_return(flexmock(request=fake_request))
+
+    def get_oauth_token():
+        time.sleep(0.1)
+        openshift.token = 'token'
+
+    flexmock(openshift).should_receive('get_oauth_token').replace_with(get_oauth_token).once()
+
+    async def get_builds():
+        return await asyncio.gather(*[aos.get_build(TEST_BUILD) for _ in range(3)])
+
+    assert len(run(get_builds())) == 3
+    assert all(sent['Authorization'] == 'Bearer token' for sent in sent_headers)
@@ -20,9 +20,11 @@ import stat
 import copy
 import getpass
 import sys
+import threading
+import time
 from tempfile import NamedTemporaryFile
 
-from osbs.api import OSBS, osbsapi
+from osbs.api import OSBS, osbsapi, _LookupMemo, RestoreResult, BuildLoad, LogEntry
 from osbs.conf import Configuration
 from osbs.build.build_request import BuildRequest
 from osbs.build.build_response import BuildResponse
@@ -39,14 +41,15 @@ from osbs.constants import (DEFAULT_OUTER_TEMPLATE, WORKER_OUTER_TEMPLATE,
                             ORCHESTRATOR_OUTER_TEMPLATE, ORCHESTRATOR_INNER_TEMPLATE,
                             DEFAULT_ARRANGEMENT_VERSION,
                             ORCHESTRATOR_CUSTOMIZE_CONF,
-                            BUILD_TYPE_WORKER, BUILD_TYPE_ORCHESTRATOR)
+                            BUILD_TYPE_WORKER, BUILD_TYPE_ORCHESTRATOR, LIST_PAGE_SIZE,
+                            WATCH_MODIFIED)
 from osbs import utils
 from osbs.repo_utils import RepoInfo
 
 from tests.constants import (TEST_ARCH, TEST_BUILD, TEST_COMPONENT, TEST_GIT_BRANCH, TEST_GIT_REF,
                              TEST_GIT_URI, TEST_TARGET, TEST_USER, INPUTS_PATH,
                              TEST_KOJI_TASK_ID, TEST_FILESYSTEM_KOJI_TASK_ID, TEST_VERSION,
-                             TEST_ORCHESTRATOR_BUILD)
+                             TEST_ORCHESTRATOR_BUILD, REPO_INFO_CACHES)
 from osbs.core import Openshift
 # These are used as fixtures
 from tests.fake_api import openshift, osbs, osbs106, osbs_cant_orchestrate  # noqa
@@ -134,6 +137,12 @@ class TestOSBS(object):
         for build in response_list:
             assert build.get_time_created_in_seconds() != 0.0
 
+    def test_list_builds_max_results(self, osbs):  # noqa
+        builds = osbs.list_builds()
+        assert len(builds) > 1
+        limited = osbs.list_builds(max_results=1)
+        assert [build.json for build in limited] == [builds[0].json]
+
     def test_get_pod_for_build(self, osbs):  # noqa
         pod = osbs.get_pod_for_build(TEST_BUILD)
         assert isinstance(pod, PodResponse)
@@ -147,7 +156,8 @@ class TestOSBS(object):
     def test_create_build_with_deprecated_params(self, osbs):  # noqa
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         kwargs = {
@@ -182,7 +192,8 @@ class TestOSBS(object):
             baseimage = 'fedora23/python'
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
         response = osbs.create_prod_build(TEST_GIT_URI, TEST_GIT_REF,
                                           TEST_GIT_BRANCH, TEST_USER,
@@ -200,7 +211,8 @@ class TestOSBS(object):
                                              outer_template, customize_conf):
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         (flexmock(osbs)
@@ -230,7 +242,8 @@ class TestOSBS(object):
                                                raises_exception):
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         kwargs = {
@@ -314,7 +327,8 @@ class TestOSBS(object):
         branch = TEST_GIT_BRANCH
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=branch)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=branch,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         kwargs = {
@@ -373,7 +387,8 @@ class TestOSBS(object):
         """
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         invalid_version = INVALID_ARRANGEMENT_VERSION
@@ -393,7 +408,8 @@ class TestOSBS(object):
         """
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_raise(IOError))
 
         with pytest.raises(OsbsException) as ex:
@@ -434,7 +450,8 @@ class TestOSBS(object):
         branch = TEST_GIT_BRANCH
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=branch)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=branch,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         kwargs = {
@@ -483,6 +500,77 @@ class TestOSBS(object):
             response = osbs.create_orchestrator_build(**kwargs)
             assert isinstance(response, BuildResponse)
 
+    def test_repo_info_caches_per_instance(self, tmpdir):
+        def make_osbs(**kwargs):
+            conf = Configuration(conf_file=None, openshift_url='https://example.com/',
+                                 build_json_dir='inputs', **kwargs)
+            return OSBS(conf, conf)
+
+        first = make_osbs(git_cache_dir=str(tmpdir.join('git')), repo_info_cache_size=5)
+        second = make_osbs()
+        assert first._git_mirror_cache.directory == str(tmpdir.join('git'))
+        assert first._repo_info_cache.max_entries == 5
+        assert second._git_mirror_cache is None
+        assert second._repo_info_cache is not first._repo_info_cache
+
+    # osbs is a fixture here
+    def test_create_orchestrator_builds(self, osbs):  # noqa
+        def fake_do_create_prod_build(**kwargs):
+            if kwargs['git_ref'] == 'bad':
+                raise OsbsValidationException('bad ref')
+            # both builds look up the same image stream
+            osbs.get_image_stream('fedora')
+            return BuildResponse({'metadata': {'name': kwargs['git_ref']}})
+
+        (flexmock(osbs)
+            .should_receive('_do_create_prod_build')
+            .replace_with(fake_do_create_prod_build))
+        (flexmock(osbs.os)
+            .should_receive('get_image_stream')
+            .with_args('fedora')
+            .once()
+            .and_return(HttpResponse(200, {}, b'{}')))
+
+        builds = [{'git_uri': TEST_GIT_URI, 'git_ref': ref, 'git_branch': TEST_GIT_BRANCH,
+                   'user': TEST_USER, 'platforms': ['x86_64']}
+                  for ref in ('first', 'bad', 'second')]
+        results = osbs.create_orchestrator_builds(builds, workers=2)
+
+        assert [result.build.get_build_name() if result.build else None
+                for result in results] == ['first', None, 'second']
+        assert [type(result.error) for result in results] == [
+            type(None), OsbsValidationException, type(None)]
+        assert getattr(osbs._lookup_local, 'memo', None) is None
+        assert osbs.create_orchestrator_builds([]) == []
+
+    @pytest.mark.parametrize('status_code', [404, 500])  # noqa
+    def test_lookup_memo(self, osbs, status_code):
+        exc = OsbsResponseException('error', status_code)
+        (flexmock(osbs.os)
+            .should_receive('get_image_stream_tag')
+            .times(1 if status_code == 404 else 2)
+            .and_raise(exc))
+
+        osbs._lookup_local.memo = _LookupMemo()
+        for _ in range(2):
+            with pytest.raises(OsbsResponseException):
+                osbs.get_image_stream_tag('fedora:latest')
+
+    def test_lookup_memo_other_threads(self, osbs):  # noqa
+        (flexmock(osbs.os)
+            .should_receive('get_image_stream')
+            .times(2)
+            .and_return(HttpResponse(200, {}, b'{}')))
+
+        osbs._lookup_local.memo = _LookupMemo()
+        osbs.get_image_stream('fedora')
+        osbs.get_image_stream('fedora')
+
+        # lookups made outside of the batch don't share its memo
+        thread = threading.Thread(target=osbs.get_image_stream, args=('fedora',))
+        thread.start()
+        thread.join()
+
     # osbs_cant_orchestrate is a fixture here
     def test_create_orchestrator_build_cant_orchestrate(self, osbs_cant_orchestrate):  # noqa
         """
@@ -491,7 +579,8 @@ class TestOSBS(object):
         """
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         with pytest.raises(OsbsOrchestratorNotEnabled) as ex:
@@ -513,7 +602,8 @@ class TestOSBS(object):
         """
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         invalid_version = INVALID_ARRANGEMENT_VERSION
@@ -532,7 +622,8 @@ class TestOSBS(object):
             baseimage = 'fedora23/python'
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info(MockParser())))
         with pytest.raises(OsbsValidationException):
             osbs.create_prod_build(TEST_GIT_URI, TEST_GIT_REF,
@@ -552,7 +643,8 @@ class TestOSBS(object):
             baseimage = 'fedora23/python'
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info(MockParser())))
         with pytest.raises(OsbsValidationException):
             osbs.create_prod_build(TEST_GIT_URI, TEST_GIT_REF,
@@ -576,7 +668,8 @@ class TestOSBS(object):
             baseimage = 'fedora23/python'
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
         flexmock(OSBS, _create_build_config_and_build=request_as_response)
         req = osbs.create_prod_build(TEST_GIT_URI, TEST_GIT_REF,
@@ -589,7 +682,8 @@ class TestOSBS(object):
     def test_missing_component_argument_doesnt_break_build(self, osbs):  # noqa
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
         response = osbs.create_prod_build(TEST_GIT_URI, TEST_GIT_REF,
                                           TEST_GIT_BRANCH, TEST_USER)
@@ -599,7 +693,8 @@ class TestOSBS(object):
     def test_create_prod_build_set_required_version(self, osbs106):  # noqa
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
         (flexmock(BuildRequest)
             .should_receive('set_openshift_required_version')
@@ -615,7 +710,8 @@ class TestOSBS(object):
         # TODO: test situation when a buildconfig already exists
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
         response = osbs.create_prod_with_secret_build(TEST_GIT_URI, TEST_GIT_REF,
                                                       TEST_GIT_BRANCH, TEST_USER,
@@ -628,7 +724,8 @@ class TestOSBS(object):
         # TODO: test situation when a buildconfig already exists
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
         response = osbs.create_prod_without_koji_build(TEST_GIT_URI, TEST_GIT_REF,
                                                        TEST_GIT_BRANCH, TEST_USER,
@@ -640,6 +737,24 @@ class TestOSBS(object):
         build_response = osbs.wait_for_build_to_finish(TEST_BUILD)
         assert isinstance(build_response, BuildResponse)
 
+    # osbs is a fixture here
+    def test_wait_for_builds_to_finish(self, osbs):  # noqa
+        build_json = {'metadata': {'name': TEST_BUILD}, 'status': {'phase': 'Complete'}}
+
+        def fake_wait(build_ids, label_selector, callback):
+            callback(TEST_BUILD, build_json)
+            yield build_json
+
+        (flexmock(osbs.os)
+            .should_receive('wait_for_builds_to_finish')
+            .replace_with(fake_wait))
+        transitions = []
+        finished = list(osbs.wait_for_builds_to_finish(
+            [TEST_BUILD], callback=lambda build_id, build: transitions.append(build)))
+        assert [build.get_build_name() for build in finished] == [TEST_BUILD]
+        assert len(transitions) == 1
+        assert isinstance(transitions[0], BuildResponse)
+
     # osbs is a fixture here
     def test_get_build_api(self, osbs):  # noqa
         response = osbs.get_build(TEST_BUILD)
@@ -723,6 +838,32 @@ class TestOSBS(object):
         response = osbs.set_annotations_on_build(TEST_BUILD, annotations)
         assert isinstance(response, HttpResponse)
 
+    # osbs is a fixture here
+    def test_update_annotations_on_builds_api(self, osbs):  # noqa
+        error = OsbsResponseException('not found', http_client.NOT_FOUND)
+
+        def update(build_id, annotations):
+            if build_id == 'missing':
+                raise error
+            return HttpResponse(http_client.OK, {}, json.dumps(annotations).encode('utf-8'))
+
+        (flexmock(osbs.os)
+            .should_receive('update_annotations_on_build')
+            .replace_with(update)
+            .times(21))
+
+        annotations = dict(('build-%d' % n, {'n': str(n)}) for n in range(20))
+        annotations['missing'] = {'n': 'none'}
+        results = osbs.update_annotations_on_builds(annotations, workers=4)
+        assert set(results) == set(annotations)
+        assert results['missing'] == (None, error)
+        for n in range(20):
+            response, exc = results['build-%d' % n]
+            assert exc is None
+            assert response.json() == {'n': str(n)}
+
+        assert osbs.update_annotations_on_builds({}) == {}
+
     # osbs is a fixture here
     @pytest.mark.parametrize('token', [None, 'token'])  # noqa
     def test_get_token_api(self, osbs, token):
@@ -875,6 +1016,194 @@ class TestOSBS(object):
         assert orchestrator_logs == ORCHESTRATOR_LOGS
         assert worker_logs == WORKER_LOGS
 
+    # osbs is a fixture here
+    @pytest.mark.parametrize('follow', [True, False])  # noqa
+    @pytest.mark.parametrize(('platforms', 'expected'), [
+        (None, [
+            (None, u'2017-06-23 17:18:41,000 platform:- - foo - INFO - starting'),
+            (u'aarch64', u'2017-06-23 17:18:41,100 foo - INFO - relayed'),
+            (u'x86_64', u'2017-06-23 17:18:41,200 foo - DEBUG - direct'),
+            (u'x86_64', u'continued'),
+            (None, u'2017-06-23 17:18:41,300 platform:- - foo - INFO - done'),
+            (u'x86_64', u'2017-06-23 17:18:41,400 foo - DEBUG - finished'),
+        ]),
+        ([u'x86_64'], [
+            (u'x86_64', u'2017-06-23 17:18:41,200 foo - DEBUG - direct'),
+            (u'x86_64', u'continued'),
+            (u'x86_64', u'2017-06-23 17:18:41,400 foo - DEBUG - finished'),
+        ]),
+        ([None, u'aarch64'], [
+            (None, u'2017-06-23 17:18:41,000 platform:- - foo - INFO - starting'),
+            (u'aarch64', u'2017-06-23 17:18:41,100 foo - INFO - relayed'),
+            (None, u'2017-06-23 17:18:41,300 platform:- - foo - INFO - done'),
+        ]),
+    ])
+    def test_orchestrator_build_logs_api_workers(self, osbs, follow, platforms, expected):
+        orchestrator_logs = [
+            u'2017-06-23 17:18:41,000 platform:- - foo - INFO - starting',
+            u'2017-06-23 17:18:41,100 platform:aarch64 - foo - INFO - '
+            u'2017-06-23 17:18:41,100 platform:- foo - INFO - relayed',
+            u'2017-06-23 17:18:41,200 platform:x86_64 - foo - INFO - '
+            u'2017-06-23 17:18:41,200 platform:- foo - DEBUG - relayed',
+            u'2017-06-23 17:18:41,300 platform:- - foo - INFO - done',
+        ]
+        worker_logs = [
+            u'2017-06-23 17:18:41,200 platform:- foo - DEBUG - direct',
+            u'continued',
+            u'2017-06-23 17:18:41,400 platform:- foo - DEBUG - finished',
+        ]
+
+        def logs(lines):
+            if follow:
+                return (line for line in lines)
+            return u'\n'.join(lines)
+
+        worker_builds = {
+            'x86_64': {'build': {'build-name': 'worker-x86_64'}},
+            'aarch64': {'build': {'build-name': 'worker-aarch64'}},
+        }
+        build_json = {'metadata': {'annotations': {'worker-builds': json.dumps(worker_builds)}},
+                      'status': {'phase': 'Complete'}}
+        flexmock(osbs).should_receive('get_build').and_return(BuildResponse(build_json))
+        (flexmock(osbs.os)
+            .should_receive('watch_resource')
+            .with_args('builds', TEST_ORCHESTRATOR_BUILD)
+            .and_return(iter([(WATCH_MODIFIED, build_json)])))
+        (flexmock(osbs)
+            .should_receive('get_build_logs')
+            .with_args(build_id=TEST_ORCHESTRATOR_BUILD, follow=follow,
+                       wait_if_missing=False, decode=True)
+            .and_return(logs(orchestrator_logs)))
+        worker = flexmock()
+        (worker
+            .should_receive('get_build_logs')
+            .with_args(build_id='worker-x86_64', follow=follow, decode=True)
+            .and_return(logs(worker_logs)))
+
+        entries = osbs.get_orchestrator_build_logs(TEST_ORCHESTRATOR_BUILD, follow=follow,
+                                                   platforms=platforms,
+                                                   workers={'x86_64': worker})
+        # when following, entries coming within the reorder window are put
+        # in time order too
+        assert [tuple(entry) for entry in entries] == expected
+
+    # osbs is a fixture here
+    def test_orchestrator_build_logs_api_workers_appear(self, osbs):  # noqa
+        relayed_first = threading.Event()
+        following_worker = threading.Event()
+
+        def orchestrator_logs():
+            yield (u'2017-06-23 17:18:41,000 platform:x86_64 - foo - INFO - '
+                   u'2017-06-23 17:18:41,000 platform:- foo - DEBUG - first')
+            relayed_first.set()
+            assert following_worker.wait(5)
+            yield (u'2017-06-23 17:18:41,100 platform:x86_64 - foo - INFO - '
+                   u'2017-06-23 17:18:41,100 platform:- foo - DEBUG - second')
+            yield u'2017-06-23 17:18:41,300 platform:- - foo - INFO - done'
+
+        def watch_resource(resource_type, build_id):
+            yield (WATCH_MODIFIED, {'metadata': {}, 'status': {'phase': 'Running'}})
+            assert relayed_first.wait(5)
+            worker_builds = {'x86_64': {'build': {'build-name': 'worker-x86_64'}}}
+            build_json = {'metadata': {'annotations': {
+                'worker-builds': json.dumps(worker_builds)}},
+                'status': {'phase': 'Running'}}
+            yield (WATCH_MODIFIED, build_json)
+            build_json['status']['phase'] = 'Complete'
+            yield (WATCH_MODIFIED, build_json)
+
+        def worker_logs(build_id, follow, decode):
+            following_worker.set()
+            return (line for line in [
+                u'2017-06-23 17:18:41,000 platform:- foo - DEBUG - first',
+                u'2017-06-23 17:18:41,100 platform:- foo - DEBUG - second',
+                u'2017-06-23 17:18:41,200 platform:- foo - DEBUG - third',
+            ])
+
+        # annotation with worker builds is not there yet
+        flexmock(osbs).should_receive('get_build').and_return(BuildResponse({'metadata': {}}))
+        flexmock(osbs.os).should_receive('watch_resource').replace_with(watch_resource)
+        (flexmock(osbs)
+            .should_receive('get_build_logs')
+            .with_args(build_id=TEST_ORCHESTRATOR_BUILD, follow=True,
+                       wait_if_missing=False, decode=True)
+            .and_return(orchestrator_logs()))
+        worker = flexmock()
+        (worker
+            .should_receive('get_build_logs')
+            .with_args(build_id='worker-x86_64', follow=True, decode=True)
+            .replace_with(worker_logs)
+            .once())
+
+        entries = [tuple(entry) for entry in osbs.get_orchestrator_build_logs(
+            TEST_ORCHESTRATOR_BUILD, follow=True, workers={'x86_64': worker})]
+        # first entry relayed by orchestrator build is not repeated
+        assert [entry for entry in entries if entry[0] == u'x86_64'] == [
+            (u'x86_64', u'2017-06-23 17:18:41,000 foo - DEBUG - first'),
+            (u'x86_64', u'2017-06-23 17:18:41,100 foo - DEBUG - second'),
+            (u'x86_64', u'2017-06-23 17:18:41,200 foo - DEBUG - third'),
+        ]
+        assert [entry for entry in entries if entry[0] is None] == [
+            (None, u'2017-06-23 17:18:41,300 platform:- - foo - INFO - done'),
+        ]
+
+    # osbs is a fixture here
+    def test_orchestrator_build_logs_api_relay_gap(self, osbs):  # noqa
+        relayed = threading.Event()
+
+        def relay(time, message):
+            return (u'2017-06-23 17:18:41,%s platform:x86_64 - foo - INFO - '
+                    u'2017-06-23 17:18:41,%s platform:- foo - DEBUG - %s' % (time, time, message))
+
+        def orchestrator_logs():
+            # "b" was not relayed
+            yield relay('000', 'a')
+            yield relay('100', 'c')
+            relayed.set()
+
+        def watch_resource(resource_type, build_id):
+            assert relayed.wait(5)
+            worker_builds = {'x86_64': {'build': {'build-name': 'worker-x86_64'}}}
+            yield (WATCH_MODIFIED, {'metadata': {'annotations': {
+                'worker-builds': json.dumps(worker_builds)}},
+                'status': {'phase': 'Complete'}})
+
+        flexmock(osbs).should_receive('get_build').and_return(BuildResponse({'metadata': {}}))
+        flexmock(osbs.os).should_receive('watch_resource').replace_with(watch_resource)
+        flexmock(osbs).should_receive('get_build_logs').and_return(orchestrator_logs())
+        worker = flexmock()
+        (worker
+            .should_receive('get_build_logs')
+            .and_return(u'2017-06-23 17:18:41,%s platform:- foo - DEBUG - %s' % item
+                        for item in [('000', 'a'), ('050', 'b'), ('100', 'c'), ('200', 'd')]))
+
+        entries = osbs.get_orchestrator_build_logs(TEST_ORCHESTRATOR_BUILD, follow=True,
+                                                   workers={'x86_64': worker})
+        # reading worker build continues after the last relayed entry
+        assert [entry.line[-1] for entry in entries] == ['a', 'c', 'd']
+
+    def test_reorder_log_entries_by_time(self):
+        idle = object()
+        now = [0]
+        flexmock(time).should_receive('time').replace_with(lambda: now[0])
+
+        def entries():
+            yield LogEntry('x86_64', u'2017-06-23 17:18:41,200 late')
+            yield LogEntry(None, u'2017-06-23 17:18:41,100 early')
+            yield LogEntry(None, u'continued')
+            now[0] = 5
+            yield idle
+            yield LogEntry('x86_64', u'2017-06-23 17:18:41,150 too late')
+
+        reordered = OSBS._reorder_log_entries_by_time(entries(), 1, idle)
+        # entry coming after the window is not held back for earlier ones
+        assert [entry.line for entry in reordered] == [
+            u'2017-06-23 17:18:41,100 early',
+            u'continued',
+            u'2017-06-23 17:18:41,200 late',
+            u'2017-06-23 17:18:41,150 too late',
+        ]
+
     # osbs is a fixture here
     def test_orchestrator_build_logs_api_badlog(self, osbs):  # noqa
         logs = osbs.get_orchestrator_build_logs(TEST_BUILD)
@@ -892,6 +1221,83 @@ class TestOSBS(object):
     def test_resume_builds(self, osbs):  # noqa
         osbs.resume_builds()
 
+    # osbs is a fixture here
+    def test_get_load_summary(self, osbs):  # noqa
+        def build(phase, node_selector=None):
+            spec = {}
+            if node_selector is not None:
+                spec['nodeSelector'] = node_selector
+            return BuildResponse({'spec': spec, 'status': {'phase': phase}})
+
+        x86 = {'platform': 'x86_64', 'zone': 'a'}
+        builds = [build('Running', x86), build('New', x86), build('Pending', dict(x86)),
+                  build('Running', {'platform': 'ppc64le'}), build('Running', {}),
+                  build('Pending')]
+        quotas = {'items': [
+            {'status': {'hard': {'pods': '10', 'memory': '4Gi'},
+                        'used': {'pods': '4', 'memory': '1Gi'}}},
+            {'status': {'hard': {'pods': '8', 'requests.cpu': '2'},
+                        'used': {'pods': '6'}}},
+        ]}
+        pods = {'items': [{'status': {'phase': 'Running'}}, {'status': {'phase': 'Running'}},
+                          {'status': {'phase': 'Succeeded'}}, {}]}
+
+        (flexmock(osbs)
+            .should_receive('list_builds')
+            .with_args(running=True, summary=True)
+            .and_return(builds)
+            .once())
+        (flexmock(osbs.os)
+            .should_receive('list_resource_quotas')
+            .and_return(flexmock(json=lambda: quotas))
+            .once())
+        (flexmock(osbs.os)
+            .should_receive('list_pods')
+            .and_return(flexmock(json=lambda: pods))
+            .once())
+
+        summary = osbs.get_load_summary()
+        assert summary.builds == {
+            'platform=x86_64,zone=a': BuildLoad(running=1, pending=2),
+            'platform=ppc64le': BuildLoad(running=1, pending=0),
+            '': BuildLoad(running=1, pending=1),
+        }
+        assert summary.quota_headroom == {'pods': 2, 'memory': 3 * 2 ** 30, 'requests.cpu': 2}
+        assert summary.pods == {'running': 2, 'succeeded': 1, 'unknown': 1}
+
+        # summary is reused until it expires
+        assert osbs.get_load_summary() is summary
+
+    # osbs is a fixture here
+    def test_get_load_summary_ttl(self, osbs):  # noqa
+        flexmock(osbs.os_conf).should_receive('get_load_summary_ttl').and_return(30)
+        flexmock(osbs).should_receive('list_builds').and_return([]).twice()
+        empty = flexmock(json=lambda: {'items': []})
+        flexmock(osbs.os).should_receive('list_resource_quotas').and_return(empty).twice()
+        flexmock(osbs.os).should_receive('list_pods').and_return(empty).twice()
+
+        now = [1000.0]
+        flexmock(time).should_receive('time').replace_with(lambda: now[0])
+
+        summary = osbs.get_load_summary()
+        assert summary.timestamp == 1000.0
+        now[0] += 29
+        assert osbs.get_load_summary() is summary
+        now[0] += 1
+        assert osbs.get_load_summary().timestamp == 1030.0
+
+    # osbs is a fixture here
+    def test_get_load_summary_error(self, osbs):  # noqa
+        flexmock(osbs).should_receive('list_builds').and_return([])
+        (flexmock(osbs.os)
+            .should_receive('list_resource_quotas')
+            .and_raise(OsbsResponseException('forbidden', 403)))
+        flexmock(osbs.os).should_receive('list_pods').and_return(flexmock(json=lambda: {}))
+
+        with pytest.raises(OsbsResponseException):
+            osbs.get_load_summary()
+        assert osbs._load_summary is None
+
     # osbs is a fixture here
     @pytest.mark.parametrize('decode_docker_logs', [True, False])  # noqa
     def test_build_logs_api_from_docker(self, osbs, decode_docker_logs):
@@ -925,6 +1331,43 @@ class TestOSBS(object):
         }
         osbs.restore_resource("builds", {"items": [build], "kind": "BuildList", "apiVersion": "v1"})
 
+    @pytest.mark.parametrize('jobs', [1, 3])  # noqa
+    @pytest.mark.parametrize('continue_on_error', [True, False])
+    def test_restore_parallel(self, osbs, jobs, continue_on_error):
+        conflict = OsbsResponseException('{"reason": "Conflict"}', 409)
+        exists = OsbsResponseException('{"reason": "AlreadyExists"}', 409)
+        outcomes = {
+            'ok': [None],
+            'conflict': [conflict, conflict, None],
+            'exists': [exists],
+        }
+        names = ['ok', 'conflict', 'exists'] + ['ok-%d' % n for n in range(50)]
+        attempts = []
+
+        def restore_resource(resource_type, resource):
+            name = resource['metadata']['name']
+            attempts.append(name)
+            assert 'resourceVersion' not in resource['metadata']
+            outcome = outcomes.get(name, [None])
+            error = outcome[min(attempts.count(name), len(outcome)) - 1]
+            if error is not None:
+                raise error
+
+        flexmock(osbs.os).should_receive('restore_resource').replace_with(restore_resource)
+        flexmock(time).should_receive('sleep')
+        items = ({'metadata': {'name': name, 'resourceVersion': '1'}} for name in names)
+
+        if continue_on_error:
+            result = osbs.restore_resource('builds', items, continue_on_error=True, jobs=jobs)
+            assert result == RestoreResult(len(names) - 1, 1)
+            assert sorted(attempts) == sorted(names + ['conflict', 'conflict'])
+        else:
+            with pytest.raises(OsbsResponseException) as exc_info:
+                osbs.restore_resource('builds', items, jobs=jobs)
+            assert exc_info.value is exists
+            # restoring stops soon after the failure
+            assert len(set(attempts)) < len(names)
+
     @pytest.mark.parametrize(('compress', 'args', 'raises', 'expected'), [
         # compress plugin not run
         (False, None, None, None),
@@ -1016,7 +1459,8 @@ class TestOSBS(object):
 
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         flexmock(OSBS, _create_build_config_and_build=request_as_response)
@@ -1084,7 +1528,8 @@ class TestOSBS(object):
 
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         flexmock(OSBS, _create_build_config_and_build=request_as_response)
@@ -1521,10 +1966,10 @@ class TestOSBS(object):
 
         if existing_bc:
             (flexmock(osbs_obj.os)
-                .should_receive('list_builds')
+                .should_receive('iter_builds')
                 .with_args(build_config_id='build')
                 .once()
-                .and_return(flexmock(json=lambda: {'items': []})))
+                .and_return([]))
             update_build_config_times += 1
 
         else:
@@ -1709,7 +2154,8 @@ class TestOSBS(object):
 
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         (flexmock(osbs_obj)
@@ -1787,7 +2233,8 @@ class TestOSBS(object):
 
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=TEST_GIT_BRANCH,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         flexmock(OSBS, _create_build_config_and_build=request_as_response)
@@ -1911,7 +2358,8 @@ class TestOSBS(object):
     def test_do_create_prod_build_branch_required(self, osbs, branch_name):
         (flexmock(utils)
             .should_receive('get_repo_info')
-            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=branch_name)
+            .with_args(TEST_GIT_URI, TEST_GIT_REF, git_branch=branch_name,
+                       **REPO_INFO_CACHES)
             .and_return(self.mock_repo_info()))
 
         inner_template = DEFAULT_INNER_TEMPLATE
@@ -1976,8 +2424,8 @@ class TestOSBS(object):
     def test_retries_disabled(self, osbs): # noqa
         (flexmock(osbs.os._con)
             .should_call('get')
-            .with_args("/oapi/v1/namespaces/default/builds/", headers={},
-                       verify_ssl=True, retries_enabled=False))
+            .with_args("/oapi/v1/namespaces/default/builds/?limit=%d" % LIST_PAGE_SIZE,
+                       headers={}, verify_ssl=True, retries_enabled=False, stream=True))
         with osbs.retries_disabled():
             response_list = osbs.list_builds()
             assert response_list is not None
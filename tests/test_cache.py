@@ -0,0 +1,162 @@
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from flexmock import flexmock
+import pytest
+import threading
+import time
+
+from osbs.build.build_response import BuildResponse
+from osbs.cache import BuildCache
+from osbs.constants import WATCH_ADDED, WATCH_MODIFIED, WATCH_DELETED
+from tests.fake_api import openshift, osbs, StreamingResponse  # noqa
+
+
+def make_build(name, phase='Running', **labels):
+    return {
+        'metadata': {'name': name, 'labels': labels},
+        'status': {'phase': phase},
+    }
+
+
+class TestBuildCache(object):
+    def test_relist(self, openshift):  # noqa
+        cache = BuildCache(openshift)
+        assert not cache.synced
+
+        resource_version = cache._relist()
+        assert cache.synced
+        assert resource_version in ('698', '2931')
+
+        builds = cache.list(build_config_id='fedora23-something')
+        assert len(builds) == 2
+        assert cache.get(builds[0]['metadata']['name']) == builds[0]
+        assert cache.list(running=True) == []
+        assert cache.list(build_config_id='unknown') == []
+
+    def test_relist_drops_stale(self, openshift):  # noqa
+        def iter_builds(members):
+            members['metadata'] = {'resourceVersion': '42'}
+            yield make_build('build-2')
+
+        flexmock(openshift).should_receive('iter_builds').replace_with(iter_builds)
+        cache = BuildCache(openshift)
+        cache._apply(WATCH_ADDED, make_build('build-1'))
+
+        assert cache._relist() == '42'
+        assert [build['metadata']['name'] for build in cache.list()] == ['build-2']
+
+    def test_events(self, openshift):  # noqa
+        cache = BuildCache(openshift)
+        cache._apply(WATCH_ADDED, make_build('build-1', buildconfig='bc', **{'koji-task-id': '1'}))
+        cache._apply(WATCH_ADDED, make_build('build-2', buildconfig='bc', **{'koji-task-id': '2'}))
+        cache._apply(WATCH_ADDED, make_build('build-3', buildconfig='other'))
+
+        def names(builds):
+            return [build['metadata']['name'] for build in builds]
+
+        assert names(cache.list(build_config_id='bc')) == ['build-1', 'build-2']
+        assert names(cache.list(koji_task_id=2)) == ['build-2']
+        assert names(cache.list(running=True, labels={'buildconfig': 'other'})) == ['build-3']
+
+        cache._apply(WATCH_MODIFIED, make_build('build-1', phase='Complete', buildconfig='bc'))
+        assert names(cache.list(running=True)) == ['build-2', 'build-3']
+        assert names(cache.list(koji_task_id=1)) == []
+
+        cache._apply(WATCH_DELETED, make_build('build-2'))
+        assert cache.get('build-2') is None
+        assert names(cache.list(build_config_id='bc')) == ['build-1']
+
+        # builds already known are not replaced by older copies
+        cache.update(make_build('build-1', phase='New'))
+        cache.update(make_build('build-4', phase='New'))
+        assert cache.get('build-1')['status']['phase'] == 'Complete'
+        assert cache.get('build-4')['status']['phase'] == 'New'
+
+    def test_copies(self, openshift):  # noqa
+        cache = BuildCache(openshift)
+        cache._apply(WATCH_ADDED, make_build('build-1'))
+        cache.get('build-1')['status']['phase'] = 'Failed'
+        cache.list()[0]['metadata']['name'] = 'spam'
+        assert cache.list() == [make_build('build-1')]
+
+    def test_resync_without_events(self, openshift):  # noqa
+        cache = BuildCache(openshift, resync_period=10)
+        relists = []
+
+        def relist(stopped):
+            relists.append(True)
+            if len(relists) == 2:
+                stopped.set()
+            return '42'
+
+        def watch_resource(resource_type, deadline, resourceVersion):
+            assert deadline <= time.time() + 10
+            assert resourceVersion == '42'
+            # quiet namespace, watch ends at the deadline
+            return iter([])
+
+        flexmock(cache).should_receive('_relist').replace_with(relist)
+        flexmock(openshift).should_receive('watch_resource').replace_with(watch_resource)
+
+        cache._run(threading.Event())
+        assert len(relists) == 2
+
+    def test_restart(self, openshift):  # noqa
+        watching = threading.Event()
+        release = threading.Event()
+
+        def watch_resource(resource_type, deadline, resourceVersion):
+            watching.set()
+            release.wait(5)
+            yield WATCH_ADDED, make_build('late')
+
+        flexmock(openshift).should_receive('iter_builds').replace_with(lambda members: iter([]))
+        flexmock(openshift).should_receive('watch_resource').replace_with(watch_resource)
+
+        cache = BuildCache(openshift)
+        cache.start()
+        assert watching.wait(5)
+        old_thread = cache._thread
+        cache.stop()
+        assert not cache.synced
+
+        # event coming to stopped thread doesn't change the cache
+        watching.clear()
+        cache.start()
+        assert cache._thread is not old_thread
+        assert watching.wait(5)
+        cache.stop()
+        release.set()
+        old_thread.join(5)
+        assert not old_thread.is_alive()
+        assert cache.get('late') is None
+
+
+@pytest.mark.parametrize('synced', [True, False])
+def test_osbs_build_cache(osbs, synced):  # noqa
+    cache = BuildCache(osbs.os)
+    cache._apply(WATCH_ADDED, make_build('build-1', **{'koji-task-id': '1'}))
+    if synced:
+        cache._synced.set()
+        flexmock(osbs.os).should_receive('get_build').never()
+        flexmock(osbs.os).should_receive('list_builds').never()
+    else:
+        (flexmock(osbs.os)
+            .should_receive('list_builds')
+            .once()
+            .and_return(StreamingResponse(content=b'{"items": []}')))
+    osbs._build_cache = cache
+
+    builds = osbs.list_builds(koji_task_id=1, running=True)
+    assert all(isinstance(build, BuildResponse) for build in builds)
+    if synced:
+        assert [build.get_build_name() for build in builds] == ['build-1']
+        assert osbs.get_build('build-1').get_build_name() == 'build-1'
+        assert osbs._get_running_builds_for_build_config('bc') == []
+    else:
+        assert builds == []
@@ -5,12 +5,22 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import contextlib
+import io
+import json
 import pytest
 import sys
 
+from flexmock import flexmock
 from textwrap import dedent
+from osbs.api import RestoreResult
+from osbs.cli import main
 from osbs.cli.main import (str_on_2_unicode_on_3, make_worker_builds_str,
-                           make_digests_str)
+                           make_digests_str, cmd_backup, cmd_restore, cmd_list_builds,
+                           print_json_list_nicely)
+from osbs.constants import BACKUP_RESOURCES
+from osbs.exceptions import OsbsException
+from osbs.utils import zstandard
 
 
 class TestStrOn2UnicodeOn3(object):
@@ -113,3 +123,164 @@ class TestGetBuild(object):
     ))
     def test_make_digests_str(self, digests, expected_str):
         assert make_digests_str(digests) == expected_str
+
+
+@pytest.mark.parametrize('items', [
+    [],
+    [{'a': 1}],
+    [{'a': [1, 2]}, {'b': {'c': 'd'}}],
+])
+def test_print_json_list_nicely(capsys, items):
+    print_json_list_nicely(iter(items))
+    assert capsys.readouterr()[0] == json.dumps(items, indent=2) + '\n'
+
+
+def test_list_builds_text(tmpdir, capsys):
+    def make(name, created):
+        return {'metadata': {'name': name, 'creationTimestamp': created},
+                'status': {'phase': 'Complete'}}
+
+    builds = [make('second', '2017-06-23T17:18:42Z'), make('first', '2017-06-23T17:18:41Z'),
+              make('third', '2017-06-23T17:18:43Z')]
+    filename = str(tmpdir.join('builds.json'))
+    with open(filename, 'w') as fp:
+        json.dump(builds, fp)
+    args = flexmock(running=False, max_results=2, from_json=filename, output='text',
+                    columns='name', FILTER=None)
+
+    cmd_list_builds(args, None)
+    assert capsys.readouterr()[0].split() == ['first', 'second']
+
+
+@pytest.mark.parametrize(('output', 'summary'), [
+    ('text', True),
+    ('json', False),
+])
+def test_list_builds_summary(capsys, output, summary):
+    osbs = flexmock()
+    (osbs
+        .should_receive('iter_builds')
+        .with_args(summary=summary)
+        .and_return(iter([]))
+        .once())
+    args = flexmock(running=False, max_results=None, from_json=None, output=output,
+                    columns='name', FILTER=None)
+
+    cmd_list_builds(args, osbs)
+
+
+@pytest.mark.parametrize('compression', [
+    'bz2',
+    'gz',
+    'xz',
+    pytest.param('zstd', marks=pytest.mark.skipif(zstandard is None,
+                                                  reason="requires zstandard")),
+])
+def test_backup_restore(tmpdir, compression):
+    resources = {
+        resource_type: [{'metadata': {'name': '%s-%d' % (resource_type, n)}} for n in range(3)]
+        for resource_type in BACKUP_RESOURCES
+    }
+
+    def iter_resource(resource_type, members=None):
+        for item in resources[resource_type]:
+            yield item
+        members['kind'] = 'List'
+
+    restored = {}
+
+    def restore_resource(resource_type, items, continue_on_error=False, jobs=1):
+        assert jobs == 4
+        restored[resource_type] = list(items)
+        return RestoreResult(len(restored[resource_type]), 0)
+
+    @contextlib.contextmanager
+    def paused_builds(*args, **kwargs):
+        yield
+
+    flexmock(main, paused_builds=paused_builds)
+    osbs = flexmock(iter_resource=iter_resource, restore_resource=restore_resource)
+    filename = str(tmpdir.join('backup'))
+    args = flexmock(instance='default', filename=filename, compression=compression,
+                    ignore_quota_errors=False, continue_on_error=False,
+                    BACKUP_ARCHIVE=[filename], jobs=4, incremental_from=None)
+
+    cmd_backup(args, osbs)
+    cmd_restore(args, osbs)
+    assert restored == resources
+
+
+def test_backup_restore_incremental(tmpdir):
+    def make(name, version):
+        return {'metadata': {'name': name, 'resourceVersion': str(version)}}
+
+    resources = {
+        resource_type: [make('%s-%d' % (resource_type, n), n) for n in range(1, 4)]
+        for resource_type in BACKUP_RESOURCES
+    }
+
+    def iter_resource(resource_type, members=None):
+        for item in resources[resource_type]:
+            yield item
+        members['metadata'] = {'resourceVersion': str(max(
+            int(item['metadata']['resourceVersion']) for item in resources[resource_type]))}
+
+    restored = {}
+
+    def restore_resource(resource_type, items, continue_on_error=False, jobs=1):
+        items = list(items)
+        restored.setdefault(resource_type, []).extend(items)
+        return RestoreResult(len(items), 0)
+
+    @contextlib.contextmanager
+    def paused_builds(*args, **kwargs):
+        yield
+
+    flexmock(main, paused_builds=paused_builds)
+    osbs = flexmock(iter_resource=iter_resource, restore_resource=restore_resource)
+    full = str(tmpdir.join('full'))
+    incremental = str(tmpdir.join('incremental'))
+    args = flexmock(instance='default', filename=full, compression='gz',
+                    ignore_quota_errors=False, continue_on_error=False,
+                    jobs=1, incremental_from=None)
+    cmd_backup(args, osbs)
+
+    # modify first object, delete the second one, add a new one
+    for resource_type, items in resources.items():
+        items[0] = make(items[0]['metadata']['name'], 10)
+        del items[1]
+        items.append(make('%s-new' % resource_type, 11))
+    args.filename = incremental
+    args.incremental_from = full
+    cmd_backup(args, osbs)
+
+    # incremental backup only holds changed objects
+    args.BACKUP_ARCHIVE = [incremental]
+    cmd_restore(args, osbs)
+    for resource_type, items in resources.items():
+        assert restored[resource_type] == [items[0], items[2]]
+
+    restored.clear()
+    args.BACKUP_ARCHIVE = [full, incremental]
+    cmd_restore(args, osbs)
+    for resource_type, items in resources.items():
+        key = lambda item: item['metadata']['name']  # noqa:E731
+        assert sorted(restored[resource_type], key=key) == sorted(items, key=key)
+
+    args.BACKUP_ARCHIVE = [incremental, full]
+    with pytest.raises(OsbsException):
+        cmd_restore(args, osbs)
+
+
+def test_dump_resource_version_from_objects():
+    objects = [{'metadata': {'name': name, 'resourceVersion': version}}
+               for name, version in [('a', '7'), ('b', '12'), ('c', None), ('d', '9')]]
+
+    def iter_resource(resource_type, members=None):
+        for obj in objects:
+            yield obj
+
+    fp = io.BytesIO()
+    count, entry = main._dump_resource(flexmock(iter_resource=iter_resource), 'builds', fp)
+    assert count == 4
+    assert entry == {'resourceVersion': '12', 'objects': ['a', 'b', 'c', 'd'], 'deleted': []}
@@ -0,0 +1,134 @@
+"""
+Copyright (c) 2017 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import print_function, unicode_literals, absolute_import
+
+import threading
+import time
+
+from flexmock import flexmock
+import pytest
+
+from osbs.api import OSBS
+from osbs.cluster_set import ClusterSet
+from osbs.exceptions import OsbsException, OsbsResponseException, OsbsTimeoutException
+from tests.constants import TEST_BUILD
+
+
+def test_from_configuration(tmpdir):
+    conf_file = tmpdir.join('osbs.conf')
+    conf_file.write("""
+[worker-x86_64]
+openshift_url = https://x86.example.com/
+namespace = x86
+
+[worker-ppc64le]
+openshift_url = https://ppc.example.com/
+namespace = ppc
+""")
+    cluster_set = ClusterSet.from_configuration(['worker-x86_64', 'worker-ppc64le'],
+                                                conf_file=str(conf_file), timeout=5)
+    assert cluster_set.timeout == 5
+    assert sorted(cluster_set.clusters) == ['worker-ppc64le', 'worker-x86_64']
+    for name, osbs in cluster_set.clusters.items():
+        assert isinstance(osbs, OSBS)
+        assert osbs.os_conf.conf_section == name
+    assert cluster_set.clusters['worker-ppc64le'].os.namespace == 'ppc'
+
+
+def test_map_runs_concurrently():
+    # each call waits for all the others, so serial calls would time out
+    barrier = {'count': 0, 'all': threading.Event()}
+    lock = threading.Lock()
+    clusters = dict((name, flexmock(name=name)) for name in ('a', 'b', 'c'))
+
+    def func(osbs):
+        with lock:
+            barrier['count'] += 1
+            if barrier['count'] == len(clusters):
+                barrier['all'].set()
+        assert barrier['all'].wait(5)
+        return osbs.name
+
+    result = ClusterSet(clusters, timeout=10).map(func)
+    assert result.results == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert result.errors == {}
+
+
+def test_map_errors_and_timeouts():
+    release = threading.Event()
+    late = []
+
+    def func(osbs):
+        if osbs.name == 'broken':
+            raise OsbsException('broken')
+        if osbs.name == 'slow':
+            release.wait(5)
+            late.append(True)
+        return osbs.name
+
+    clusters = dict((name, flexmock(name=name)) for name in ('ok', 'broken', 'slow'))
+    start = time.time()
+    result = ClusterSet(clusters, timeout=60).map(func, timeout=0.2)
+    assert time.time() - start < 5
+
+    assert result.results == {'ok': 'ok'}
+    assert sorted(result.errors) == ['broken', 'slow']
+    assert str(result.errors['broken']) == 'broken'
+    assert isinstance(result.errors['slow'], OsbsTimeoutException)
+
+    # late answer doesn't change returned result
+    release.set()
+    while not late:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert result.results == {'ok': 'ok'}
+
+
+def test_list_running_builds():
+    x86 = flexmock()
+    x86.should_receive('list_builds').with_args(running=True, summary=True).and_return(['b1'])
+    ppc = flexmock()
+    ppc.should_receive('list_builds').with_args(running=True, summary=True).and_return([])
+
+    result = ClusterSet({'x86': x86, 'ppc': ppc}).list_running_builds()
+    assert result.results == {'x86': ['b1'], 'ppc': []}
+    assert result.errors == {}
+
+
+def test_get_load_summary():
+    x86 = flexmock()
+    x86.should_receive('get_load_summary').and_return('summary')
+
+    result = ClusterSet({'x86': x86}).get_load_summary()
+    assert result.results == {'x86': 'summary'}
+
+
+def test_list_resource_quotas():
+    quotas = {'items': [{'metadata': {'name': 'pods'}}]}
+    x86 = flexmock()
+    x86.should_receive('list_resource_quotas').and_return(quotas)
+
+    result = ClusterSet({'x86': x86}).list_resource_quotas()
+    assert result.results == {'x86': quotas}
+
+
+@pytest.mark.parametrize('status_code, reported', [
+    (404, False),
+    (500, True),
+])
+def test_get_build(status_code, reported):
+    x86 = flexmock()
+    x86.should_receive('get_build').with_args(TEST_BUILD).and_return('build')
+    ppc = flexmock()
+    (ppc.should_receive('get_build')
+        .with_args(TEST_BUILD)
+        .and_raise(OsbsResponseException('error', status_code)))
+
+    result = ClusterSet({'x86': x86, 'ppc': ppc}).get_build(TEST_BUILD)
+    assert result.results == {'x86': 'build'}
+    assert ('ppc' in result.errors) == reported
@@ -13,7 +13,9 @@ from copy import deepcopy
 from osbs.conf import Configuration
 from osbs import utils
 from osbs.exceptions import OsbsValidationException
-from osbs.constants import DEFAULT_ARRANGEMENT_VERSION
+from osbs.constants import (DEFAULT_ARRANGEMENT_VERSION, HTTP_POOL_MAXSIZE,
+                            BUILD_CACHE_RESYNC_PERIOD, GIT_MIRROR_CACHE_SIZE,
+                            REPO_INFO_CACHE_SIZE, LOAD_SUMMARY_TTL)
 import pytest
 from tempfile import NamedTemporaryFile
 
@@ -298,6 +300,95 @@ class TestConfiguration(object):
         else:
             assert conf.get_arrangement_version() == expected
 
+    @pytest.mark.parametrize(('config', 'expected'), [
+        ({'default': {}}, HTTP_POOL_MAXSIZE),
+
+        ({'default': {'http_pool_maxsize': 50}}, 50),
+        ({'default': {'http_pool_maxsize': 'many'}}, OsbsValidationException),
+    ])
+    def test_http_pool_maxsize(self, config, expected):
+        with self.config_file(config) as config_file:
+            conf = Configuration(conf_file=config_file)
+
+        if isinstance(expected, type):
+            with pytest.raises(expected):
+                conf.get_http_pool_maxsize()
+        else:
+            assert conf.get_http_pool_maxsize() == expected
+
+    @pytest.mark.parametrize(('config', 'expected'), [
+        ({'default': {}}, False),
+        ({'default': {'persist_token': 'true'}}, True),
+    ])
+    def test_persist_token(self, config, expected):
+        with self.config_file(config) as config_file:
+            conf = Configuration(conf_file=config_file)
+
+        assert conf.get_persist_token() == expected
+
+    @pytest.mark.parametrize(('config', 'expected'), [
+        ({'default': {}}, (False, BUILD_CACHE_RESYNC_PERIOD)),
+        ({'default': {'build_cache': 'true', 'build_cache_resync_period': 60}}, (True, 60)),
+        ({'default': {'build_cache_resync_period': 'often'}}, OsbsValidationException),
+    ])
+    def test_build_cache(self, config, expected):
+        with self.config_file(config) as config_file:
+            conf = Configuration(conf_file=config_file)
+
+        if isinstance(expected, type):
+            with pytest.raises(expected):
+                conf.get_build_cache_resync_period()
+        else:
+            assert (conf.get_build_cache(), conf.get_build_cache_resync_period()) == expected
+
+    @pytest.mark.parametrize(('config', 'expected'), [
+        ({'default': {}}, LOAD_SUMMARY_TTL),
+        ({'default': {'load_summary_ttl': 5}}, 5),
+        ({'default': {'load_summary_ttl': 'long'}}, OsbsValidationException),
+    ])
+    def test_load_summary_ttl(self, config, expected):
+        with self.config_file(config) as config_file:
+            conf = Configuration(conf_file=config_file)
+
+        if isinstance(expected, type):
+            with pytest.raises(expected):
+                conf.get_load_summary_ttl()
+        else:
+            assert conf.get_load_summary_ttl() == expected
+
+    @pytest.mark.parametrize(('config', 'expected'), [
+        ({'default': {}}, (None, GIT_MIRROR_CACHE_SIZE)),
+        ({'default': {'git_cache_dir': '/var/cache/osbs', 'git_cache_size': 5}},
+         ('/var/cache/osbs', 5)),
+        ({'default': {'git_cache_size': 'lots'}}, OsbsValidationException),
+    ])
+    def test_git_cache(self, config, expected):
+        with self.config_file(config) as config_file:
+            conf = Configuration(conf_file=config_file)
+
+        if isinstance(expected, type):
+            with pytest.raises(expected):
+                conf.get_git_cache_size()
+        else:
+            assert (conf.get_git_cache_dir(), conf.get_git_cache_size()) == expected
+
+    @pytest.mark.parametrize(('config', 'expected'), [
+        ({'default': {}}, (None, REPO_INFO_CACHE_SIZE)),
+        ({'default': {'repo_info_cache_dir': '/var/cache/osbs', 'repo_info_cache_size': 5}},
+         ('/var/cache/osbs', 5)),
+        ({'default': {'repo_info_cache_size': 'lots'}}, OsbsValidationException),
+    ])
+    def test_repo_info_cache(self, config, expected):
+        with self.config_file(config) as config_file:
+            conf = Configuration(conf_file=config_file)
+
+        if isinstance(expected, type):
+            with pytest.raises(expected):
+                conf.get_repo_info_cache_size()
+        else:
+            assert (conf.get_repo_info_cache_dir(),
+                    conf.get_repo_info_cache_size()) == expected
+
     @pytest.mark.parametrize(('config', 'expected'), [
         ({'default': {'smtp_additional_addresses': 'user@example.com'}},
          ['user@example.com']),
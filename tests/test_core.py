@@ -13,21 +13,28 @@ import time
 import json
 import logging
 import inspect
+import itertools
 import os
+import threading
+from types import GeneratorType
 
 from osbs.http import HttpResponse
 from osbs.constants import (BUILD_FINISHED_STATES,
-                            BUILD_CANCELLED_STATE, WATCH_MODIFIED)
-from osbs.exceptions import (OsbsResponseException, OsbsException, OsbsNetworkException)
-from osbs.core import check_response, Openshift
+                            BUILD_CANCELLED_STATE, WATCH_MODIFIED, WATCH_ADDED,
+                            WATCH_RETRY_BACKOFF, WATCH_MAX_RETRIES, CONFLICT_RETRY_BACKOFF_MAX)
+from osbs.exceptions import (OsbsResponseException, OsbsException, OsbsNetworkException,
+                             OsbsWatchBuildNotFound)
+from osbs.core import check_response, Openshift, WatchState
+import osbs.core
 
 from tests.constants import (TEST_BUILD, TEST_CANCELLED_BUILD, TEST_LABEL,
                              TEST_LABEL_VALUE, TEST_IMAGESTREAM)
-from tests.fake_api import openshift, OAPI_PREFIX, API_VER  # noqa
+from tests.fake_api import openshift, OAPI_PREFIX, API_VER, StreamingResponse  # noqa
 from requests.exceptions import ConnectionError
 import pytest
 
 from six.moves import http_client
+from six.moves.urllib.parse import parse_qs, urlparse
 
 
 class Response(object):
@@ -41,6 +48,12 @@ class Response(object):
         for line in self.iterable:
             yield line
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
 
 def make_json_response(obj):
     return HttpResponse(200,
@@ -146,11 +159,150 @@ class TestOpenshift(object):
         logs = openshift.stream_logs(TEST_BUILD)
         assert len([log for log in logs]) == 1
 
+    @pytest.mark.parametrize(('first', 'second', 'since_time'), [
+        (
+            [b'2017-06-01T12:00:00.9Z one', b'2017-06-01T12:00:01.05Z two',
+             b'2017-06-01T12:00:01.05Z three'],
+            [b'2017-06-01T12:00:01.05Z two', b'2017-06-01T12:00:01.05Z three',
+             b'2017-06-01T12:00:01.5Z four', b'2017-06-01T12:00:02Z five'],
+            '2017-06-01T12:00:01Z',
+        ),
+        (
+            [b'one', b'two', b'three'],
+            [b'one', b'two', b'three', b'four', b'five'],
+            None,
+        ),
+    ])
+    @pytest.mark.parametrize('read_ahead', [0, 2])
+    def test_stream_logs_resume(self, openshift, first, second, since_time,  # noqa
+                                read_ahead):
+        urls = []
+
+        def get(url, **kwargs):
+            urls.append(url)
+            lines = second if len(urls) > 1 else first
+            return flexmock(status_code=http_client.OK, iter_lines=lambda: iter(lines))
+
+        flexmock(openshift).should_receive('_get').replace_with(get)
+        # connection closed by idle timeout first, then because build finished
+        times = itertools.chain([0] * 4, itertools.repeat(100))
+        flexmock(time).should_receive('time').replace_with(lambda: next(times))
+
+        logs = list(openshift.stream_logs(TEST_BUILD, read_ahead=read_ahead))
+        assert logs == [b'one', b'two', b'three', b'four', b'five']
+
+        queries = [parse_qs(urlparse(url).query) for url in urls]
+        assert queries[0] == {'follow': ['1'], 'timestamps': ['true']}
+        assert queries[1].get('sinceTime') == ([since_time] if since_time else None)
+
+    def test_stream_logs_close(self, openshift):  # noqa
+        unblock = threading.Event()
+
+        def iter_lines():
+            yield b'one'
+            unblock.wait(5)
+            yield b'two'
+
+        response = flexmock(status_code=http_client.OK, iter_lines=iter_lines)
+        response.should_receive('close').replace_with(unblock.set).once()
+        flexmock(openshift).should_receive('_get').and_return(response).once()
+
+        logs = openshift.stream_logs(TEST_BUILD, read_ahead=2)
+        assert next(logs) == b'one'
+        # closing generator closes connection the reader thread is blocked on
+        logs.close()
+        assert unblock.is_set()
+
+    def test_stream_logs_no_read_ahead(self, openshift):  # noqa
+        flexmock(openshift).should_receive('_get').never()
+        # nothing is requested until lines are asked for
+        assert isinstance(openshift.stream_logs(TEST_BUILD), GeneratorType)
+
     def test_list_builds(self, openshift):  # noqa
         list_builds = openshift.list_builds()
         assert list_builds is not None
         assert bool(list_builds.json())  # is there at least something
 
+    @pytest.mark.parametrize(('page_size', 'max_results', 'expected_limits'), [
+        (2, None, [2, 2, 2]),
+        (2, 3, [2, 1]),
+        (5, 3, [3, 1]),
+        (2, 0, []),
+    ])
+    def test_iter_builds(self, openshift, page_size, max_results,  # noqa
+                         expected_limits):
+        pages = [['build-1', 'build-2'], ['build-3', 'build-4'], ['build-5']]
+        limits = []
+
+        def list_builds(limit=None, continue_token=None, stream=False, **kwargs):
+            assert stream
+            limits.append(limit)
+            index = int(continue_token or 0)
+            build_list = {
+                'items': [{'metadata': {'name': name}} for name in pages[index]][:limit],
+                'metadata': {'continue': str(index + 1) if index + 1 < len(pages) else ''},
+            }
+            return StreamingResponse(content=json.dumps(build_list).encode('utf-8'))
+
+        flexmock(openshift).should_receive('list_builds').replace_with(list_builds)
+        builds = openshift.iter_builds(page_size=page_size, max_results=max_results)
+        names = [build['metadata']['name'] for build in builds]
+        expected = ['build-%d' % number for number in range(1, 6)][:max_results]
+        assert names == expected
+        assert limits == expected_limits
+
+    @pytest.mark.parametrize('summary', [True, False])  # noqa
+    def test_iter_builds_summary(self, openshift, summary):
+        annotations = {'logs': 'x' * 1000, 'dockerfile': 'FROM x', 'rpm-packages': 'a,b',
+                       'repositories': '{}'}
+        build_list = {'items': [{'metadata': {'name': 'build-1',
+                                              'annotations': annotations}},
+                                {'metadata': {'name': 'build-2'}}]}
+        response = StreamingResponse(content=json.dumps(build_list).encode('utf-8'))
+        flexmock(openshift).should_receive('list_builds').and_return(response)
+
+        builds = list(openshift.iter_builds(summary=summary))
+        if summary:
+            assert builds[0]['metadata']['annotations'] == {'repositories': '{}'}
+        else:
+            assert builds[0]['metadata']['annotations'] == annotations
+        assert builds[1] == {'metadata': {'name': 'build-2'}}
+
+    def test_iter_builds_query(self, openshift):  # noqa
+        responses = [b'{"items": [], "metadata": {"continue": "abc"}}',
+                     b'{"items": [], "metadata": {}}']
+        queries = []
+
+        def get(url, stream=False):
+            queries.append(parse_qs(urlparse(url).query))
+            return StreamingResponse(content=responses[len(queries) - 1])
+
+        flexmock(openshift).should_receive('_get').replace_with(get)
+        assert list(openshift.iter_builds(koji_task_id=123, page_size=10)) == []
+        assert queries == [
+            {'labelSelector': ['koji-task-id=123'], 'limit': ['10']},
+            {'labelSelector': ['koji-task-id=123'], 'limit': ['10'], 'continue': ['abc']},
+        ]
+
+    def test_iter_resource(self, openshift):  # noqa
+        pages = [b'{"kind": "BuildList", "metadata": {"continue": "abc"}, "items": [{"a": 1}]}',
+                 b'{"kind": "BuildList", "metadata": {"resourceVersion": "5"}, "items": []}']
+        urls = []
+
+        def get(url, stream=False):
+            assert stream
+            urls.append(url)
+            return StreamingResponse(content=pages[len(urls) - 1])
+
+        flexmock(openshift).should_receive('_get').replace_with(get)
+        members = {}
+        assert list(openshift.iter_resource('builds', page_size=1, members=members)) == [{'a': 1}]
+        assert members == {'kind': 'BuildList', 'metadata': {'resourceVersion': '5'}}
+        assert [parse_qs(urlparse(url).query) for url in urls] == [
+            {'limit': ['1']},
+            {'limit': ['1'], 'continue': ['abc']},
+        ]
+
     def test_list_pods(self, openshift):  # noqa
         response = openshift.list_pods(label="openshift.io/build.name=%s" %
                                        TEST_BUILD)
@@ -160,6 +312,108 @@ class TestOpenshift(object):
         token = openshift.get_oauth_token()
         assert token is not None
 
+    def test_get_oauth_token_expiry(self, openshift):  # noqa
+        flexmock(time).should_receive('time').and_return(1000)
+        openshift.get_oauth_token()
+        # fake server says the token expires in a day
+        assert openshift.token_refresh_at == 1000 + 86400 - 60
+
+    def test_ensure_token_cached(self, openshift):  # noqa
+        now = [1000]
+        flexmock(time).should_receive('time').replace_with(lambda: now[0])
+        flexmock(openshift).should_call('get_oauth_token').twice()
+
+        token = openshift.ensure_token()
+        assert openshift.ensure_token() == token
+        now[0] += 86400 - 30
+        assert openshift.ensure_token() == token
+
+    def test_ensure_token_single_flight(self, openshift):  # noqa
+        def get_oauth_token():
+            time.sleep(0.1)
+            openshift.token = 'token'
+            return openshift.token
+
+        (flexmock(openshift)
+            .should_receive('get_oauth_token')
+            .replace_with(get_oauth_token)
+            .once())
+
+        threads = [threading.Thread(target=openshift.ensure_token) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert openshift.token == 'token'
+
+    @pytest.mark.parametrize(('credentials', 'retried'), [  # noqa
+        ({'username': 'user', 'password': 'pass'}, True),
+        ({'use_kerberos': True}, True),
+        ({}, False),
+    ])
+    def test_retry_on_unauthorized(self, openshift, credentials, retried):
+        for key, value in credentials.items():
+            setattr(openshift, key, value)
+        openshift.use_auth = True
+        openshift.token = 'old'
+        sent = []
+
+        def fake_get(url, headers=None, **kwargs):
+            sent.append(headers['Authorization'])
+            if headers['Authorization'] == 'Bearer old':
+                return HttpResponse(http_client.UNAUTHORIZED, {}, b'')
+            return HttpResponse(http_client.OK, {}, b'{}')
+
+        def get_oauth_token():
+            openshift.token = 'new'
+            return openshift.token
+
+        flexmock(openshift._con).should_receive('get').replace_with(fake_get)
+        (flexmock(openshift)
+            .should_receive('get_oauth_token')
+            .replace_with(get_oauth_token)
+            .times(1 if retried else 0))
+
+        response = openshift._get(openshift._build_url("users/~/", _prepend_namespace=False))
+        if retried:
+            assert sent == ['Bearer old', 'Bearer new']
+            assert response.status_code == http_client.OK
+        else:
+            assert sent == ['Bearer old']
+            assert response.status_code == http_client.UNAUTHORIZED
+
+    def test_get_oauth_token_kerberos_renews_tgt(self, openshift):  # noqa
+        openshift.use_auth = True
+        openshift.use_kerberos = True
+        openshift.kerberos_keytab = '/etc/keytab'
+        openshift.kerberos_principal = 'prin@IPAL'
+        authorize = openshift._con.get
+        responses = [HttpResponse(http_client.UNAUTHORIZED, {}, b'')]
+
+        def fake_get(url, **kwargs):
+            if responses:
+                return responses.pop(0)
+            return authorize(url, **kwargs)
+
+        flexmock(openshift._con).should_receive('get').replace_with(fake_get)
+        (flexmock(osbs.core)
+            .should_receive('kerberos_ccache_init')
+            .with_args('prin@IPAL', '/etc/keytab', ccache_file=None)
+            .twice())
+        (flexmock(osbs.core)
+            .should_receive('kerberos_ccache_forget')
+            .with_args('prin@IPAL', ccache_file=None)
+            .once())
+
+        assert openshift.get_oauth_token()
+
+    def test_get_oauth_token_persisted(self, openshift, tmpdir):  # noqa
+        token_file = os.path.join(str(tmpdir), 'osbs', 'instance.token')
+        openshift.token_file = token_file
+        token = openshift.get_oauth_token()
+        with open(token_file) as f:
+            assert f.read() == token + '\n'
+
     def test_get_user(self, openshift):  # noqa
         l = openshift.get_user()
         assert l.json() is not None
@@ -172,6 +426,241 @@ class TestOpenshift(object):
         assert isinstance(TEST_BUILD, six.text_type)
         assert isinstance(status_lower, six.text_type)
 
+    def _mock_watch_responses(self, openshift, responses):
+        urls = []
+
+        def fake_get(url, **kwargs):
+            urls.append(url)
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        flexmock(openshift).should_receive('_get').replace_with(fake_get)
+        return urls
+
+    @staticmethod
+    def _watch_event(changetype, resource_version):
+        return json.dumps({
+            'type': changetype,
+            'object': {'metadata': {'name': TEST_BUILD,
+                                    'resourceVersion': resource_version}},
+        }).encode('utf-8')
+
+    def test_watch_resource_resumes(self, openshift):  # noqa
+        urls = self._mock_watch_responses(openshift, [
+            Response(200, iterable=[self._watch_event('ADDED', '1'),
+                                    self._watch_event('MODIFIED', '2')]),
+            Response(200, iterable=[self._watch_event('MODIFIED', '3')]),
+        ])
+        flexmock(time).should_receive('sleep').never()
+
+        events = list(itertools.islice(openshift.watch_resource('builds', TEST_BUILD), 3))
+        assert [(changetype, obj['metadata']['resourceVersion'])
+                for changetype, obj in events] == [
+            (WATCH_ADDED, '1'), (WATCH_MODIFIED, '2'), (WATCH_MODIFIED, '3')]
+        assert 'resourceVersion' not in urls[0]
+        assert 'resourceVersion=2' in urls[1]
+        assert openshift.watch_reconnects == 1
+
+    @pytest.mark.parametrize('summary', [True, False])  # noqa
+    def test_watch_resource_summary(self, openshift, summary):
+        event = json.dumps({
+            'type': 'MODIFIED',
+            'object': {'metadata': {'name': TEST_BUILD, 'resourceVersion': '1',
+                                    'annotations': {'logs': 'log', 'digests': '[]'}}},
+        }).encode('utf-8')
+        self._mock_watch_responses(openshift, [Response(200, iterable=[event])])
+
+        changetype, obj = next(openshift.watch_resource('builds', summary=summary))
+        expected = {'digests': '[]'} if summary else {'logs': 'log', 'digests': '[]'}
+        assert obj['metadata']['annotations'] == expected
+
+    @pytest.mark.parametrize('gone', [  # noqa
+        Response(200, iterable=[json.dumps({'type': 'ERROR',
+                                            'object': {'code': 410}}).encode('utf-8')]),
+        OsbsResponseException('gone', http_client.GONE),
+    ])
+    def test_watch_resource_gone(self, openshift, gone):
+        urls = self._mock_watch_responses(openshift, [
+            gone,
+            make_json_response({'metadata': {'name': TEST_BUILD, 'resourceVersion': '5'}}),
+            Response(200, iterable=[self._watch_event('MODIFIED', '6')]),
+        ])
+        flexmock(time).should_receive('sleep').never()
+
+        events = list(itertools.islice(
+            openshift.watch_resource('builds', TEST_BUILD, resourceVersion='1'), 2))
+        assert [(changetype, obj['metadata']['resourceVersion'])
+                for changetype, obj in events] == [(WATCH_MODIFIED, '5'), (WATCH_MODIFIED, '6')]
+        assert 'resourceVersion=1' in urls[0]
+        assert 'watch' not in urls[1]
+        assert 'resourceVersion=5' in urls[2]
+
+    def test_watch_resource_backoff(self, openshift):  # noqa
+        self._mock_watch_responses(openshift, [
+            OsbsNetworkException('http://spam.com', 'error', status_code=None),
+            Response(200, iterable=[]),
+            Response(200, iterable=[self._watch_event('ADDED', '1')]),
+        ])
+        delays = []
+        flexmock(time).should_receive('sleep').replace_with(delays.append)
+
+        events = list(itertools.islice(openshift.watch_resource('builds', TEST_BUILD), 1))
+        assert len(events) == 1
+        assert len(delays) == 2
+        assert WATCH_RETRY_BACKOFF / 2 <= delays[0] <= WATCH_RETRY_BACKOFF
+        assert WATCH_RETRY_BACKOFF <= delays[1] <= 2 * WATCH_RETRY_BACKOFF
+
+    @pytest.mark.parametrize(('duration', 'backoff'), [  # noqa
+        (60, False),
+        (0, True),
+    ])
+    def test_watch_resource_quiet_close(self, openshift, duration, backoff):
+        self._mock_watch_responses(openshift, [
+            Response(200, iterable=[self._watch_event('ADDED', '1')]),
+            Response(200, iterable=[]),
+            Response(200, iterable=[self._watch_event('MODIFIED', '2')]),
+        ])
+        clock = itertools.count(step=duration)
+        flexmock(time).should_receive('time').replace_with(lambda: next(clock))
+        delays = []
+        flexmock(time).should_receive('sleep').replace_with(delays.append)
+
+        events = list(itertools.islice(openshift.watch_resource('builds', TEST_BUILD), 2))
+        assert len(events) == 2
+        assert len(delays) == (1 if backoff else 0)
+
+    def test_watch_resource_deadline(self, openshift):  # noqa
+        urls = self._mock_watch_responses(openshift, [
+            Response(200, iterable=[self._watch_event('ADDED', '1')]),
+            Response(200, iterable=[]),
+        ])
+        now = [1000.0]
+        flexmock(time).should_receive('time').replace_with(lambda: now[0])
+
+        events = []
+        for event in openshift.watch_resource('builds', deadline=1100.5):
+            events.append(event)
+            # server closes quiet stream at timeoutSeconds
+            now[0] = 1100.5
+
+        assert len(events) == 1
+        assert len(urls) == 1
+        assert 'timeoutSeconds=101' in urls[0]
+
+    @pytest.mark.parametrize(('status_code', 'reconnect', 'gone'), [
+        (http_client.GONE, True, True),
+        (http_client.FORBIDDEN, False, False),
+        (http_client.SERVICE_UNAVAILABLE, True, False),
+    ])
+    def test_watch_state_failed(self, status_code, reconnect, gone):
+        state = WatchState('1')
+        assert state.connect({'fieldSelector': 'x'}) == {'fieldSelector': 'x',
+                                                          'resourceVersion': '1'}
+        assert state.failed(OsbsResponseException('error', status_code)) == reconnect
+        assert state.gone == gone
+
+    def test_watch_state_retries(self):
+        state = WatchState()
+        for _ in range(WATCH_MAX_RETRIES):
+            state.connect({})
+            assert state.failed(OsbsException('connection lost'))
+        state.connect({})
+        assert not state.failed(OsbsException('connection lost'))
+
+    def test_watch_resource_not_found(self, openshift):  # noqa
+        self._mock_watch_responses(openshift, [
+            Response(404, content=b'not found'),
+        ])
+
+        with pytest.raises(OsbsResponseException):
+            next(openshift.watch_resource('builds', TEST_BUILD))
+
+    @staticmethod
+    def _build_event(changetype, name, phase, resource_version):
+        return json.dumps({
+            'type': changetype,
+            'object': {'metadata': {'name': name, 'resourceVersion': resource_version},
+                       'status': {'phase': phase}},
+        }).encode('utf-8')
+
+    def test_wait_for_builds_to_finish(self, openshift):  # noqa
+        urls = self._mock_watch_responses(openshift, [
+            StreamingResponse(content=json.dumps({
+                'metadata': {'resourceVersion': '10', 'continue': 'next'},
+                'items': [
+                    {'metadata': {'name': 'build-1'}, 'status': {'phase': 'Running'}},
+                    {'metadata': {'name': 'build-2'}, 'status': {'phase': 'Complete'}},
+                ],
+            }).encode('utf-8')),
+            StreamingResponse(content=json.dumps({
+                'metadata': {'resourceVersion': '10'},
+                'items': [
+                    {'metadata': {'name': 'build-3'}, 'status': {'phase': 'New'}},
+                    {'metadata': {'name': 'other'}, 'status': {'phase': 'Running'}},
+                ],
+            }).encode('utf-8')),
+            Response(200, iterable=[
+                self._build_event('MODIFIED', 'other', 'Failed', '11'),
+                self._build_event('MODIFIED', 'build-3', 'Running', '12'),
+                self._build_event('MODIFIED', 'build-3', 'Failed', '13'),
+                self._build_event('MODIFIED', 'build-1', 'Complete', '14'),
+            ]),
+        ])
+        transitions = []
+
+        def callback(build_id, build_json):
+            transitions.append((build_id, build_json['status']['phase']))
+
+        finished = openshift.wait_for_builds_to_finish(['build-1', 'build-2', 'build-3'],
+                                                       label_selector='koji-task-id=1',
+                                                       callback=callback)
+        assert [build['metadata']['name'] for build in finished] == [
+            'build-2', 'build-3', 'build-1']
+        assert transitions == [
+            ('build-1', 'Running'), ('build-2', 'Complete'), ('build-3', 'New'),
+            ('build-3', 'Running'), ('build-3', 'Failed'), ('build-1', 'Complete')]
+        assert len(urls) == 3
+        assert 'labelSelector=koji-task-id%3D1' in urls[0]
+        assert 'limit=' in urls[0]
+        assert 'continue=next' in urls[1]
+        assert 'watch' in urls[2]
+        assert 'resourceVersion=10' in urls[2]
+        assert 'labelSelector=koji-task-id%3D1' in urls[2]
+
+    @pytest.mark.parametrize('watch_events', [  # noqa
+        None,
+        [b'{"type": "DELETED", "object": {"metadata": {"name": "build-2"}}}'],
+    ])
+    def test_wait_for_builds_to_finish_missing(self, openshift, watch_events):
+        items = [{'metadata': {'name': 'build-1'}, 'status': {'phase': 'Running'}}]
+        if watch_events is not None:
+            items.append({'metadata': {'name': 'build-2'}, 'status': {'phase': 'Running'}})
+        self._mock_watch_responses(openshift, [
+            StreamingResponse(content=json.dumps({'metadata': {}, 'items': items}
+                                                 ).encode('utf-8')),
+            Response(200, iterable=watch_events),
+        ])
+
+        with pytest.raises(OsbsWatchBuildNotFound):
+            list(openshift.wait_for_builds_to_finish(['build-1', 'build-2']))
+
+    def test_wait_for_builds_to_finish_no_status(self, openshift):  # noqa
+        # build listed before it got any status is not missing
+        self._mock_watch_responses(openshift, [
+            StreamingResponse(content=json.dumps({
+                'metadata': {'resourceVersion': '10'},
+                'items': [{'metadata': {'name': 'build-1'}}],
+            }).encode('utf-8')),
+            Response(200, iterable=[
+                self._build_event('MODIFIED', 'build-1', 'Complete', '11'),
+            ]),
+        ])
+
+        finished = openshift.wait_for_builds_to_finish(['build-1'])
+        assert [build['metadata']['name'] for build in finished] == ['build-1']
+
     def test_create_build(self, openshift):  # noqa
         response = openshift.create_build({})
         assert response is not None
@@ -284,6 +773,12 @@ class TestOpenshift(object):
         except AttributeError:
             return  # not every combination is implemented
 
+        # update uses GET and PUT only when merge-PATCH is not supported
+        (flexmock(openshift)
+            .should_receive('_patch')
+            .and_return(HttpResponse(http_client.UNSUPPORTED_MEDIA_TYPE, headers={},
+                                     content=b''))
+            .times(1 if update_or_set == 'update' else 0))
         get_expectation = (flexmock(openshift)
                            .should_receive('_get')
                            .times(len(status_codes)))
@@ -298,9 +793,8 @@ class TestOpenshift(object):
             get_expectation = get_expectation.and_return(get_response)
             put_expectation = put_expectation.and_return(put_response)
 
-        (flexmock(time)
-            .should_receive('sleep')
-            .with_args(0.5))
+        sleeps = []
+        flexmock(time).should_receive('sleep').replace_with(sleeps.append)
 
         args = ('any-object-id', {'key': 'value'})
         if should_raise:
@@ -309,6 +803,67 @@ class TestOpenshift(object):
         else:
             fn(*args)
 
+        # jittered exponential backoff between attempts
+        assert len(sleeps) == min(len(status_codes), 10) - 1
+        for attempt, sleep in enumerate(sleeps, 1):
+            backoff = min(0.5 * 2 ** (attempt - 1), CONFLICT_RETRY_BACKOFF_MAX)
+            assert backoff / 2 <= sleep <= backoff
+
+    @pytest.mark.parametrize(('method', 'collection', 'things'), [  # noqa
+        ('update_labels_on_build', 'builds', 'labels'),
+        ('update_labels_on_build_config', 'buildconfigs', 'labels'),
+        ('update_annotations_on_build', 'builds', 'annotations'),
+    ])
+    def test_update_attributes_merge_patch(self, openshift, method, collection, things):
+        patches = []
+
+        def fake_patch(url, data=None, headers=None, **kwargs):
+            patches.append((url, json.loads(data), headers['Content-Type']))
+            return HttpResponse(http_client.OK, headers={}, content=b'{}')
+
+        flexmock(openshift).should_receive('_patch').replace_with(fake_patch)
+        flexmock(openshift).should_receive('_get').never()
+        flexmock(openshift).should_receive('_put').never()
+
+        getattr(openshift, method)('object-id', {'key': 'value'})
+        assert patches == [(openshift._build_url('%s/object-id' % collection),
+                            {'metadata': {things: {'key': 'value'}}},
+                            'application/merge-patch+json')]
+
+    def test_update_attributes_merge_patch_unsupported(self, openshift):  # noqa
+        (flexmock(openshift)
+            .should_receive('_patch')
+            .and_return(HttpResponse(http_client.METHOD_NOT_ALLOWED, headers={},
+                                     content=b''))
+            .once())
+        (flexmock(openshift)
+            .should_receive('_get')
+            .and_return(make_json_response({'metadata': {'labels': {'a': 'b'}}}))
+            .twice())
+        puts = []
+
+        def fake_put(url, data=None, **kwargs):
+            puts.append(json.loads(data))
+            return HttpResponse(http_client.OK, headers={}, content=b'{}')
+
+        flexmock(openshift).should_receive('_put').replace_with(fake_put)
+
+        # unsupported PATCH is not tried again
+        openshift.update_labels_on_build('build-1', {'key': 'value'})
+        openshift.update_labels_on_build('build-2', {'key': 'value'})
+        assert puts == [{'metadata': {'labels': {'a': 'b', 'key': 'value'}}}] * 2
+
+    def test_update_attributes_merge_patch_error(self, openshift):  # noqa
+        (flexmock(openshift)
+            .should_receive('_patch')
+            .and_return(HttpResponse(http_client.NOT_FOUND, headers={}, content=b''))
+            .once())
+        flexmock(openshift).should_receive('_get').never()
+
+        with pytest.raises(OsbsResponseException):
+            openshift.update_annotations_on_build('build-1', {'key': 'value'})
+        assert not openshift.merge_patch_unsupported
+
     def test_put_image_stream_tag(self, openshift):  # noqa
         tag_name = 'spam'
         tag_id = 'maps:' + tag_name
@@ -5,6 +5,7 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import json
 import logging
 import sys
 
@@ -13,7 +14,7 @@ import pytest
 import requests
 
 from requests.packages.urllib3.util import Retry
-from osbs.http import HttpSession, HttpStream, http_client
+from osbs.http import HttpSession, HttpStream, http_client, iter_json_items, _JsonReader
 from osbs.exceptions import OsbsNetworkException, OsbsException, OsbsResponseException
 from osbs.constants import HTTP_RETRIES_STATUS_FORCELIST
 
@@ -39,6 +40,101 @@ def has_connection():
         return False
 
 
+@pytest.mark.parametrize(('first', 'second', 'shared'), [
+    (('https://openshift.example.com/oapi/v1/builds/', {}),
+     ('https://openshift.example.com/api/v1/pods/', {}),
+     True),
+    (('https://openshift.example.com/oapi/v1/builds/', {}),
+     ('https://other.example.com/oapi/v1/builds/', {}),
+     False),
+    (('https://openshift.example.com/oapi/v1/builds/', {}),
+     ('http://openshift.example.com/oapi/v1/builds/', {}),
+     False),
+    (('https://openshift.example.com/oapi/v1/builds/', {}),
+     ('https://openshift.example.com/oapi/v1/builds/', {'verify_ssl': False}),
+     False),
+    (('https://openshift.example.com/oapi/v1/builds/', {}),
+     ('https://openshift.example.com/oapi/v1/builds/', {'retries_enabled': False}),
+     False),
+    (('https://openshift.example.com/oapi/v1/builds/', {'ca': '/ca.crt'}),
+     ('https://openshift.example.com/oapi/v1/builds/', {'client_cert': '/cert',
+                                                        'client_key': '/key'}),
+     False),
+])
+def test_session_pooling(first, second, shared):
+    s = HttpSession()
+    first_url, first_kwargs = first
+    second_url, second_kwargs = second
+    first_session = s.get_session(first_url, **first_kwargs)
+    assert s.get_session(first_url, **first_kwargs) is first_session
+    assert (s.get_session(second_url, **second_kwargs) is first_session) == shared
+
+
+def test_session_close():
+    s = HttpSession()
+    session = s.get_session('https://openshift.example.com/oapi/v1/builds/')
+    flexmock(session).should_receive('close').once()
+    s.close()
+    assert s.get_session('https://openshift.example.com/oapi/v1/builds/') is not session
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 16, 4096])
+def test_iter_json_items(chunk_size):
+    document = {
+        'kind': 'BuildList',
+        'metadata': {'resourceVersion': '1234', 'continue': ''},
+        'items': [{'metadata': {'name': 'build-%d' % n}, 'size': n * 1000, 'ok': n % 2 == 0,
+                   'note': None, 'text': '\u017elu\u0165ou\u010dk\u00fd "k\u016f\u0148"'}
+                  for n in range(10)],
+        'total': 10,
+    }
+    content = json.dumps(document, ensure_ascii=False).encode('utf-8')
+    chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+    members = {}
+    items = iter_json_items(chunks, members=members)
+    assert next(items) == document['items'][0]
+    assert list(items) == document['items'][1:]
+    assert members == {'kind': 'BuildList', 'metadata': document['metadata'], 'total': 10}
+
+
+def test_iter_json_items_large_item(monkeypatch):
+    document = {'items': [{'logs': 'x' * 1000000, 'n': 12345}, {'n': 1}]}
+    content = json.dumps(document).encode('utf-8')
+    chunks = [content[i:i + 64] for i in range(0, len(content), 64)]
+
+    attempts = []
+
+    class CountingDecoder(json.JSONDecoder):
+        def raw_decode(self, s, idx=0):
+            attempts.append(idx)
+            return super(CountingDecoder, self).raw_decode(s, idx)
+
+    monkeypatch.setattr(_JsonReader, '_decoder', CountingDecoder())
+    assert list(iter_json_items(chunks)) == document['items']
+    # decoding is retried only after the buffered input doubles
+    assert len(attempts) < 40
+
+
+@pytest.mark.parametrize(('content', 'expected'), [
+    (b'{}', []),
+    (b' { "items" : [ ] } ', []),
+    (b'{"items": null}', []),
+    (b'{"other": [1], "items": [1, [2], {"3": 3}]}', [1, [2], {'3': 3}]),
+    (b'', ValueError),
+    (b'[1, 2]', ValueError),
+    (b'{"items": [1, 2', ValueError),
+    (b'{"items": [1 2]}', ValueError),
+    (b'{"items": [1], "metadata": {', ValueError),
+    (b'{"items": [1]} {}', ValueError),
+])
+def test_iter_json_items_edge_cases(content, expected):
+    if isinstance(expected, type):
+        with pytest.raises(expected):
+            list(iter_json_items([content]))
+    else:
+        assert list(iter_json_items([content])) == expected
+
+
 @pytest.mark.skipif(not has_connection(),
                     reason="requires internet connection")
 class TestHttpSession(object):
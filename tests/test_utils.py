@@ -6,12 +6,19 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 from flexmock import flexmock
+import itertools
+import json
 import os
 import os.path
+import shutil
+import tarfile
 import pytest
 import datetime
 import re
 import sys
+import threading
+import time
+from io import BytesIO
 from time import tzset
 from pkg_resources import parse_version
 
@@ -21,8 +28,11 @@ from osbs.utils import (buildconfig_update,
                         get_time_from_rfc3339, strip_registry_from_image,
                         TarWriter, TarReader, make_name_from_git, wrap_name_from_git,
                         get_instance_token_file_name, Labels, sanitize_version,
-                        has_triggers)
-from osbs.exceptions import OsbsException
+                        has_triggers, load_json_template, get_repo_info, run_command,
+                        GitMirrorCache, RepoInfoCache, write_json_list, iter_read_ahead,
+                        MergedIterator, parse_quantity)
+from osbs import utils
+from osbs.exceptions import OsbsException, OsbsValidationException
 import osbs.kerberos_ccache
 
 
@@ -151,6 +161,26 @@ def test_get_time_from_rfc3339_valid(rfc3339, seconds, tz):
     assert get_time_from_rfc3339(rfc3339) == seconds
 
 
+@pytest.mark.parametrize(('quantity', 'value'), [
+    ('10', 10),
+    (3, 3),
+    ('1.5', 1.5),
+    ('500m', 0.5),
+    ('2k', 2000),
+    ('1Gi', 2 ** 30),
+    ('1e3', 1000),
+    ('2Gb', None),
+    ('xMi', None),
+    ('', None),
+])
+def test_parse_quantity(quantity, value):
+    if value is None:
+        with pytest.raises(OsbsValidationException):
+            parse_quantity(quantity)
+    else:
+        assert parse_quantity(quantity) == value
+
+
 @pytest.mark.parametrize(('repo', 'branch', 'limit', 'separator', 'expected'), [
     ('spam', 'bacon', 10, '-', 'spam-bacon'),
     ('spam', 'bacon', 5, '-', 'sp-ba'),
@@ -280,6 +310,12 @@ CCACHE_PATH = '/tmp/krb5cc_thing'
 PRINCIPAL = 'prin@IPAL'
 
 
+@pytest.fixture(autouse=True)
+def forget_tgts():
+    # TGTs seen by one test must not be remembered in others
+    osbs.kerberos_ccache._tgt_expires.clear()
+
+
 @pytest.mark.parametrize("custom_ccache", [True, False])
 def test_kinit_nocache(custom_ccache):
     flexmock(osbs.kerberos_ccache).should_receive('run') \
@@ -366,14 +402,133 @@ def test_kinit_fails(custom_ccache):
                                                   CCACHE_PATH if custom_ccache else None)
 
 
+def test_kinit_cached():
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+    klist_out = tomorrow.strftime(KLIST_TEMPLATE)
+
+    flexmock(osbs.kerberos_ccache).should_receive('run') \
+                                  .with_args(['klist'], extraenv=object) \
+                                  .and_return(0, klist_out, "") \
+                                  .times(2)
+
+    for _ in range(3):
+        osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH, CCACHE_PATH)
+    # other ccache has to be inspected
+    osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH, None)
+
+    osbs.kerberos_ccache.kerberos_ccache_forget(PRINCIPAL, CCACHE_PATH)
+    flexmock(osbs.kerberos_ccache).should_receive('run') \
+                                  .with_args(['klist'], extraenv=object) \
+                                  .and_return(0, klist_out, "") \
+                                  .once()
+    osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH, CCACHE_PATH)
+
+
+def test_kinit_cached_expiring():
+    soon = datetime.datetime.now() + datetime.timedelta(hours=1, seconds=1)
+    klist_out = soon.strftime(KLIST_TEMPLATE)
+    flexmock(osbs.kerberos_ccache).should_receive('run') \
+                                  .with_args(['klist'], extraenv=object) \
+                                  .and_return(0, klist_out, "") \
+                                  .once()
+    osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH, CCACHE_PATH)
+
+    # cached ticket is valid for less than an hour now
+    flexmock(osbs.kerberos_ccache).should_receive('run') \
+                                  .with_args(['klist'], extraenv=object) \
+                                  .and_return(1, "", "") \
+                                  .once()
+    flexmock(osbs.kerberos_ccache).should_receive('run') \
+                                  .with_args(['kinit', '-k', '-t',
+                                              KEYTAB_PATH, PRINCIPAL],
+                                             extraenv=object) \
+                                  .and_return(0, "", "") \
+                                  .once()
+    time.sleep(1)
+    osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH, CCACHE_PATH)
+
+
+def test_kinit_concurrent():
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+    calls = []
+
+    def fake_run(cmd, extraenv=None):
+        calls.append(cmd[0])
+        if cmd[0] == 'klist':
+            if 'kinit' in calls:
+                return 0, tomorrow.strftime(KLIST_TEMPLATE), ""
+            return 1, "", ""
+        time.sleep(0.1)
+        return 0, "", ""
+
+    flexmock(osbs.kerberos_ccache).should_receive('run').replace_with(fake_run)
+    threads = [threading.Thread(target=osbs.kerberos_ccache.kerberos_ccache_init,
+                                args=(PRINCIPAL, KEYTAB_PATH))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # others waited for the first thread to get TGT, then found it valid
+    assert calls.count('kinit') == 1
+    assert calls.count('klist') == 2
+    osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH)
+    assert calls.count('klist') == 2
+
+
+def test_kinit_concurrent_ccaches():
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+    release = threading.Event()
+    released = []
+
+    def fake_run(cmd, extraenv=None):
+        if cmd[0] == 'klist':
+            return 1, "", ""
+        if extraenv.get('KRB5CCNAME') == CCACHE_PATH:
+            released.append(release.wait(5))
+        return 0, "", ""
+
+    flexmock(osbs.kerberos_ccache).should_receive('run').replace_with(fake_run)
+    slow = threading.Thread(target=osbs.kerberos_ccache.kerberos_ccache_init,
+                            args=(PRINCIPAL, KEYTAB_PATH, CCACHE_PATH))
+    slow.start()
+    try:
+        osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH)
+        osbs.kerberos_ccache.kerberos_ccache_forget(PRINCIPAL)
+    finally:
+        release.set()
+        slow.join()
+    # slow kinit didn't block the default ccache
+    assert released == [True]
+
+    flexmock(osbs.kerberos_ccache).should_receive('run') \
+                                  .and_return(0, tomorrow.strftime(KLIST_TEMPLATE), "") \
+                                  .once()
+    osbs.kerberos_ccache.kerberos_ccache_init(PRINCIPAL, KEYTAB_PATH, CCACHE_PATH)
+
+
+def test_subprocess_calls_counted():
+    calls = osbs.kerberos_ccache.subprocess_calls['true']
+    osbs.kerberos_ccache.run(['true'])
+    assert osbs.kerberos_ccache.subprocess_calls['true'] == calls + 1
+
+
 @pytest.mark.parametrize("prefix", ["", "some/thing"])
-def test_tarfile(tmpdir, prefix):
-    filename = str(tmpdir.join("archive.tar.bz2"))
+@pytest.mark.parametrize("compression", [
+    "bz2",
+    "gz",
+    "xz",
+    pytest.param("zstd", marks=pytest.mark.skipif(utils.zstandard is None,
+                                                  reason="requires zstandard")),
+])
+def test_tarfile(tmpdir, prefix, compression):
+    filename = str(tmpdir.join("archive.tar"))
 
-    with TarWriter(filename, directory=prefix) as t:
+    with TarWriter(filename, directory=prefix, compression=compression) as t:
         t.write_file("a/b.c", b"foobar")
 
-    assert os.path.exists(filename)
+    assert os.path.getsize(filename) == t.bytes_written
 
     for f in TarReader(filename):
         assert f.filename == os.path.join(prefix, "a/b.c")
@@ -381,6 +536,166 @@ def test_tarfile(tmpdir, prefix):
         assert content == b"foobar"
 
 
+class ReadOnlyStream(object):
+    # like file of py2, no peek()
+    def __init__(self, data):
+        self._data = BytesIO(data)
+
+    def read(self, size=-1):
+        return self._data.read(size)
+
+
+@pytest.mark.parametrize("compression", [
+    "gz",
+    "xz",
+    pytest.param("zstd", marks=pytest.mark.skipif(utils.zstandard is None,
+                                                  reason="requires zstandard")),
+])
+def test_tarfile_stream(compression):
+    archive = BytesIO()
+    with TarWriter(archive, compression=compression) as t:
+        t.write_file("a.b", b"foobar")
+
+    files = [(f.filename, f.fileobj.read())
+             for f in TarReader(ReadOnlyStream(archive.getvalue()))]
+    assert files == [("a.b", b"foobar")]
+
+
+def test_tarfile_xz_unsupported(monkeypatch):
+    archive = BytesIO()
+    with TarWriter(archive, compression="xz") as t:
+        t.write_file("a.b", b"foobar")
+
+    open_meth = dict(tarfile.TarFile.OPEN_METH)
+    del open_meth["xz"]
+    monkeypatch.setattr(tarfile.TarFile, "OPEN_METH", open_meth)
+
+    with pytest.raises(OsbsException) as exc:
+        TarWriter(BytesIO(), compression="xz")
+    assert "xz" in str(exc.value)
+    with pytest.raises(OsbsException) as exc:
+        TarReader(ReadOnlyStream(archive.getvalue()))
+    assert "xz" in str(exc.value)
+
+
+def test_write_json_list():
+    members = {}
+
+    def items():
+        yield {'name': 'spam'}
+        yield {'name': '\u0161unka'}
+        members.update({'kind': 'List', 'items': None})
+
+    fp = BytesIO()
+    assert write_json_list(fp, items(), members=members) == 2
+    assert json.loads(fp.getvalue().decode('ascii')) == {
+        'kind': 'List',
+        'items': [{'name': 'spam'}, {'name': '\u0161unka'}],
+    }
+
+
+def test_iter_read_ahead():
+    read = []
+
+    def items():
+        for item in range(10):
+            read.append(item)
+            yield item
+        raise OsbsException("connection lost")
+
+    it = iter_read_ahead(items(), 3, poll_interval=0.01)
+    assert next(it) == 0
+    # producer is stopped by the full buffer, not by the consumer
+    for _ in range(100):
+        if len(read) == 5:
+            break
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert len(read) == 5
+
+    assert list(itertools.islice(it, 9)) == list(range(1, 10))
+    with pytest.raises(OsbsException):
+        next(it)
+
+
+def test_iter_read_ahead_lazy():
+    read = []
+
+    def items():
+        read.append(True)
+        yield 1
+
+    it = iter_read_ahead(items(), 3, poll_interval=0.01)
+    time.sleep(0.05)
+    # nothing is read until asked for
+    assert read == []
+    del it
+    assert not [thread for thread in threading.enumerate() if thread.name == 'read-ahead']
+
+
+def test_iter_read_ahead_close():
+    unblock = threading.Event()
+    closed = []
+
+    def items():
+        yield 1
+        # reader is blocked, e.g. waiting for the server
+        unblock.wait(5)
+        yield 2
+
+    def close():
+        closed.append(True)
+        unblock.set()
+
+    it = iter_read_ahead(items(), 3, poll_interval=0.01, close=close)
+    assert next(it) == 1
+    it.close()
+    assert closed == [True]
+    for _ in range(100):
+        if not [thread for thread in threading.enumerate() if thread.name == 'read-ahead']:
+            break
+        time.sleep(0.01)
+    else:
+        raise AssertionError("read-ahead thread still running")
+
+
+def test_merged_iterator_add():
+    merged = MergedIterator(3, poll_interval=0.01)
+
+    def first():
+        yield 1
+        # streams added by other streams are read too
+        merged.add(iter([3, 4]))
+        yield 2
+
+    merged.add(first())
+    assert sorted(merged) == [1, 2, 3, 4]
+
+
+def test_merged_iterator_run():
+    idle = object()
+    merged = MergedIterator(3, poll_interval=0.01, idle=idle)
+    started = threading.Event()
+
+    def watch():
+        started.set()
+        time.sleep(0.05)
+        merged.add(iter([1, 2]))
+
+    merged.run(watch)
+    assert not started.wait(0.05)
+    items = list(merged)
+    assert started.is_set()
+    # time passing without items is reported
+    assert idle in items
+    assert [item for item in items if item is not idle] == [1, 2]
+
+    failing = MergedIterator(3, poll_interval=0.01)
+    failing.run(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        list(failing)
+
+
 def test_get_instance_token_file_name():
     expected = os.path.join(os.path.expanduser('~'), '.osbs', 'spam.token')
 
@@ -471,3 +786,124 @@ def test_sanitize_version(version, valid):
             pass
         with pytest.raises(ValueError):
             sanitize_version(parse_version(version))
+
+
+def test_load_json_template(tmpdir):
+    path = str(tmpdir.join('template.json'))
+    with open(path, 'w') as fp:
+        json.dump({'metadata': {'name': 'spam'}}, fp)
+
+    template = load_json_template(path)
+    assert template == {'metadata': {'name': 'spam'}}
+
+    # cached template is not parsed again and callers get their own copies
+    template['metadata']['name'] = 'eggs'
+    flexmock(json).should_receive('load').never()
+    assert load_json_template(path) == {'metadata': {'name': 'spam'}}
+    flexmock(json).should_call('load').once()
+
+    with open(path, 'w') as fp:
+        json.dump({'metadata': {'name': 'ham'}}, fp)
+    os.utime(path, (0, 0))
+    assert load_json_template(path) == {'metadata': {'name': 'ham'}}
+
+
+def test_load_json_template_missing(tmpdir):
+    path = str(tmpdir.join('missing.json'))
+    with pytest.raises(IOError) as exc_info:
+        load_json_template(path)
+    assert exc_info.value.filename == path
+
+
+@pytest.fixture
+def git_repo(tmpdir):
+    """
+    Create git repository with two commits on master branch
+
+    :return: tuple, URI of the repository and hash of the first commit
+    """
+    path = str(tmpdir.join('remote'))
+    git = ['git', '-c', 'user.name=John Doe', '-c', 'user.email=jdoe@example.com']
+    run_command(['git', 'init', '--quiet', path])
+    run_command(['git', 'checkout', '--quiet', '-b', 'master'], cwd=path)
+    with open(os.path.join(path, 'Dockerfile'), 'w') as fp:
+        fp.write('FROM fedora\nLABEL name=spam\n')
+    with open(os.path.join(path, 'additional-tags'), 'w') as fp:
+        fp.write('bacon\n')
+    run_command(git + ['add', '.'], cwd=path)
+    run_command(git + ['commit', '--quiet', '-m', 'first'], cwd=path)
+    commit = run_command(['git', 'rev-parse', 'HEAD'], cwd=path).decode('ascii').strip()
+
+    with open(os.path.join(path, 'Dockerfile'), 'w') as fp:
+        fp.write('FROM fedora\nLABEL name=eggs\n')
+    run_command(git + ['commit', '--quiet', '-a', '-m', 'second'], cwd=path)
+    return 'file://' + path, commit
+
+
+@pytest.mark.parametrize('mirror', [False, True])
+@pytest.mark.parametrize(('use_commit', 'name'), [
+    (True, 'spam'),
+    (False, 'eggs'),
+])
+def test_get_repo_info(tmpdir, git_repo, mirror, use_commit, name):
+    git_uri, commit = git_repo
+    git_ref = commit if use_commit else 'master'
+    cache = GitMirrorCache(str(tmpdir.join('mirrors'))) if mirror else None
+    flexmock(utils).should_receive('checkout_git_repo').never()
+
+    repo_info = get_repo_info(git_uri, git_ref, git_branch='master', git_mirror_cache=cache)
+    assert repo_info.dockerfile_parser.labels == {'name': name}
+    assert repo_info.additional_tags.tags == ['bacon']
+    assert not repo_info.configuration.is_autorebuild_enabled()
+
+
+def test_get_repo_info_mirror(tmpdir, git_repo):
+    git_uri, commit = git_repo
+    cache = GitMirrorCache(str(tmpdir.join('mirrors')), max_repos=1)
+
+    get_repo_info(git_uri, commit, git_branch='master', git_mirror_cache=cache)
+    # commit already mirrored doesn't need the remote repository
+    shutil.rmtree(git_uri[len('file://'):])
+    repo_info = get_repo_info(git_uri, commit, git_branch='master', git_mirror_cache=cache)
+    assert repo_info.dockerfile_parser.labels == {'name': 'spam'}
+
+    with cache.mirror('file:///other/repo'):
+        pass
+    mirrors = [name for name in os.listdir(cache.directory) if name.endswith('.git')]
+    assert mirrors == [os.path.basename(cache._path('file:///other/repo')) + '.git']
+
+
+def test_get_repo_info_fallback(git_repo):
+    git_uri, commit = git_repo
+    (flexmock(utils)
+        .should_receive('fetch_git_ref')
+        .and_raise(OsbsException('fetch not allowed')))
+    flexmock(utils).should_call('checkout_git_repo').once()
+
+    repo_info = get_repo_info(git_uri, commit, git_branch='master')
+    assert repo_info.dockerfile_parser.labels == {'name': 'spam'}
+
+
+@pytest.mark.parametrize('persistent', [False, True])
+def test_repo_info_cache(tmpdir, git_repo, persistent):
+    git_uri, commit = git_repo
+    directory = str(tmpdir.join('repo-info')) if persistent else None
+    cache = RepoInfoCache(directory, max_entries=1)
+
+    repo_info = get_repo_info(git_uri, commit, git_branch='master', repo_info_cache=cache)
+    # branches may move, they are not cached
+    get_repo_info(git_uri, 'master', git_branch='master', repo_info_cache=cache)
+    flexmock(utils).should_receive('checkout_repo_info_files').never()
+    assert get_repo_info(git_uri, commit.upper(), git_branch='master',
+                         repo_info_cache=cache) is repo_info
+
+    cache = RepoInfoCache(directory, max_entries=1)
+    assert (cache.get(git_uri, commit) is not None) == persistent
+    if persistent:
+        repo_info = cache.get(git_uri, commit)
+        assert repo_info.dockerfile_parser.labels == {'name': 'spam'}
+        assert repo_info.additional_tags.tags == ['bacon']
+
+        cache.put(git_uri, '0' * 40, str(tmpdir), repo_info)
+        assert os.listdir(directory) == [os.path.basename(cache._path((git_uri, '0' * 40)))]
+        assert RepoInfoCache(directory).get(git_uri, commit) is None